@@ -0,0 +1,178 @@
+""" Load tests /confirm_login on the sync app (app.py) and on the async app (aio_app.py) against a slow tokeninfo.
+
+A local stub stands in for Google tokeninfo and answers after --delay seconds. The sync app is served the way a
+threaded worker serves it, by a fixed pool of --threads threads; the async app runs in one process with its default
+settings. Both read a SQLite database seeded with the sample data, the async app through aiosqlite. Each
+concurrency level sends --requests requests with that many in flight and reports throughput and latency.
+
+Run from the repository root with, for example:
+    python benchmarks/async_bench.py --concurrency 1 10 50 200 --delay 0.2 --threads 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+HR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr')
+EMAIL = 'jxc4577@g.rit.edu'  # An employee in Sales in the sample data
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def serve_sync(port, threads):
+    """ Serves app.py with a fixed pool of threads, like a gthread worker
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from werkzeug.serving import BaseWSGIServer
+    import app
+
+    class PooledWSGIServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(max_workers=threads)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    PooledWSGIServer('127.0.0.1', port, app.application).serve_forever()
+
+
+def serve_async(port):
+    from aiohttp import web
+    import aio_app
+    web.run_app(aio_app.application, host='127.0.0.1', port=port, print=None)
+
+
+async def serve_stub_tokeninfo(port, delay):
+    from aiohttp import web
+
+    async def tokeninfo(request):
+        data = await request.post()
+        await asyncio.sleep(delay)
+        return web.json_response({'email': data['access_token']})
+
+    stub = web.Application()
+    stub.router.add_post('/tokeninfo', tokeninfo)
+    runner = web.AppRunner(stub, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def wait_until_up(session, url):
+    for _ in range(200):
+        try:
+            async with session.get(url) as response:
+                await response.read()
+                return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError('%s did not start' % url)
+
+
+async def load(session, url, requests, concurrency):
+    latencies = []
+    failures = [0]
+    queue = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(url)
+
+    async def client():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.time()
+            async with session.get(url) as response:
+                await response.read()
+                if response.status != 200:
+                    failures[0] += 1
+            latencies.append(time.time() - start)
+
+    start = time.time()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.time() - start
+    latencies.sort()
+    return {'requests_per_second': requests / elapsed,
+            'p50_ms': latencies[len(latencies) // 2] * 1000,
+            'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+            'failures': failures[0]}
+
+
+async def run(arguments):
+    import aiohttp
+
+    directory = tempfile.mkdtemp()
+    database = os.path.join(directory, 'bench.db')
+    stub_port = free_port()
+    environment = dict(os.environ, HR_DATABASE_URL='sqlite:///' + database,
+                       HR_ASYNC_DATABASE_URL='sqlite+aiosqlite:///' + database,
+                       HR_TOKENINFO_URL='http://127.0.0.1:%s/tokeninfo' % stub_port,
+                       HR_LOG_FILE=os.path.join(directory, 'log.txt'), HR_LOG_LEVEL='WARNING')
+    subprocess.check_call([sys.executable, '-c', 'import databasesetup; databasesetup.default_info()'],
+                          env=environment, cwd=HR_DIRECTORY, stdout=subprocess.DEVNULL)
+    stub = await serve_stub_tokeninfo(stub_port, arguments.delay)
+
+    report = {'delay_seconds': arguments.delay, 'threads': arguments.threads, 'requests': arguments.requests,
+              'results': {}}
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        for mode in ('sync', 'async'):
+            port = free_port()
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', mode, str(port),
+                                       str(arguments.threads)], env=environment, cwd=HR_DIRECTORY)
+            try:
+                url = 'http://127.0.0.1:%s/confirm_login/Sales/%s' % (port, EMAIL)
+                await wait_until_up(session, url)
+                report['results'][mode] = {}
+                for concurrency in arguments.concurrency:
+                    result = await load(session, url, max(arguments.requests, concurrency), concurrency)
+                    report['results'][mode][concurrency] = result
+                    print("  %-5s concurrency %4s  %8.1f requests/s  p50 %8.1f ms  p99 %8.1f ms  %s failed"
+                          % (mode, concurrency, result['requests_per_second'], result['p50_ms'], result['p99_ms'],
+                             result['failures']))
+            finally:
+                server.terminate()
+                server.wait()
+    await stub.cleanup()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50, 200],
+                        help='requests in flight at the same time')
+    parser.add_argument('--requests', type=int, default=200, help='requests per concurrency level')
+    parser.add_argument('--delay', type=float, default=0.2, help='seconds the stub tokeninfo takes to answer')
+    parser.add_argument('--threads', type=int, default=8, help='threads serving the sync app')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    report = asyncio.run(run(arguments))
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+        print("wrote %s" % arguments.output)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        sys.path.insert(0, HR_DIRECTORY)
+        mode, port, threads = sys.argv[2], int(sys.argv[3]), int(sys.argv[4])
+        if mode == 'sync':
+            serve_sync(port, threads)
+        else:
+            serve_async(port)
+    else:
+        main()
@@ -0,0 +1,33 @@
+""" Compares two result files written by benchmarks/controllers_bench.py
+
+Run with: python benchmarks/compare.py before.json after.json
+"""
+import json
+import sys
+
+METRICS = ('p50_ms', 'p99_ms', 'sql_statements_per_call', 'peak_memory_kb')
+
+
+def main(before_path, after_path):
+    with open(before_path) as before_file:
+        before = json.load(before_file)
+    with open(after_path) as after_file:
+        after = json.load(after_file)
+
+    print("before: %s  after: %s" % (before.get('commit'), after.get('commit')))
+    for size in sorted(set(before['sizes']) & set(after['sizes']), key=int):
+        print("== %s employees ==" % size)
+        for operation in sorted(set(before['sizes'][size]) & set(after['sizes'][size])):
+            changes = []
+            for metric in METRICS:
+                old = before['sizes'][size][operation][metric]
+                new = after['sizes'][size][operation][metric]
+                change = (new - old) * 100.0 / old if old else 0.0
+                changes.append("%s %.1f -> %.1f (%+.0f%%)" % (metric, old, new, change))
+            print("  %-24s %s" % (operation, '  '.join(changes)))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    main(sys.argv[1], sys.argv[2])
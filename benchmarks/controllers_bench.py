@@ -0,0 +1,199 @@
+""" Times every controller against a local SQLite database seeded at a realistic size.
+
+Needs no MySQL and no network: inventory and Google tokeninfo are replaced by stubs. Each operation reports
+latency percentiles, SQL statements per call and the peak memory of one traced call. Results are saved as JSON
+so two commits can be compared with benchmarks/compare.py.
+
+Run from the repository root with, for example:
+    python benchmarks/controllers_bench.py --employees 1000 10000 --output bench_results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr')
+DEPARTMENTS = ['Sales', 'Manufacturing', 'Inventory', 'Human Resources', 'Customer Support', 'Accounting']
+
+
+class StubResponse(object):
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+        self.text = json.dumps(payload)
+
+    def json(self):
+        return self._payload
+
+
+class StubRequests(object):
+    """ Stands in for the requests session of http_helper, which the rewards and authentication controllers call
+    """
+
+    def __init__(self, email_for_token):
+        self.email_for_token = email_for_token
+
+    def get(self, url, *args, **kwargs):
+        serial_id = int(url.rstrip('/').rsplit('/', 1)[-1])
+        return StubResponse(200, [{'fields': {'modelId': serial_id % 4}}])
+
+    def post(self, url, data=None, *args, **kwargs):
+        return StubResponse(200, {'email': self.email_for_token(data['access_token'])})
+
+    def request(self, method, url, **kwargs):
+        return self.get(url, **kwargs) if method == 'GET' else self.post(url, **kwargs)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(name, operation, iterations, statement_counter):
+    """ Calls operation(iteration) the given number of times, then once more under tracemalloc
+    """
+    latencies = []
+    statements = []
+    for iteration in range(iterations):
+        before = statement_counter[0]
+        start = time.time()
+        operation(iteration)
+        latencies.append(time.time() - start)
+        statements.append(statement_counter[0] - before)
+
+    tracemalloc.start()
+    operation(iterations)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    result = {'iterations': iterations,
+              'mean_ms': sum(latencies) * 1000 / len(latencies),
+              'p50_ms': percentile(latencies, 0.50) * 1000,
+              'p90_ms': percentile(latencies, 0.90) * 1000,
+              'p99_ms': percentile(latencies, 0.99) * 1000,
+              'max_ms': latencies[-1] * 1000,
+              'sql_statements_per_call': float(sum(statements)) / len(statements),
+              'peak_memory_kb': peak_bytes / 1024.0}
+    print("  %-24s p50 %9.2f ms  p99 %9.2f ms  %7.1f statements  %10.0f KB peak"
+          % (name, result['p50_ms'], result['p99_ms'], result['sql_statements_per_call'], result['peak_memory_kb']))
+    return result
+
+
+def run_size(employee_count, history_count, iterations, roster_iterations, seed_value):
+    from sqlalchemy import event, select
+    from controllers import employees, employee, rewards, authentication
+    from helpers import http_helper
+    from databasesetup import engine, Employee
+    from generate_data import generate
+
+    rng = random.Random(seed_value)
+    start = time.time()
+    generate(engine, employee_count, seed_value, max_history=history_count)
+    print("seeded %s employees with up to %s history entries each in %.1f s"
+          % (employee_count, history_count, time.time() - start))
+
+    statement_counter = [0]
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def count_statement(*args):
+        statement_counter[0] += 1
+
+    # Tokens are employee ids, the stub tokeninfo answers with that employee's email
+    emails = dict(engine.execute(select([Employee.id, Employee.email]).where(Employee.id <= 1000)).fetchall())
+    stub = StubRequests(lambda token: emails[int(token)])
+    http_helper.get_session = lambda: stub
+
+    def new_employee(iteration):
+        return {'address': '%s Test Dr, Rochester, New York 14623' % iteration, 'birth_date': '1990-01-01',
+                'department': 'Sales', 'fname': 'Bench', 'is_active': False, 'lname': 'Mark%s' % iteration,
+                'role': 'Developer', 'start_date': '2017-01-23', 'email': 'bench%s@krutz.site' % iteration}
+
+    def random_id():
+        return rng.randint(1, employee_count)
+
+    posted = []
+
+    def post(iteration):
+        employees.post(new_employee(len(posted)))
+        posted.append(len(posted))
+
+    deletable = list(range(employee_count, 0, -1))
+
+    operations = [
+        ('employees.get', lambda i: employees.get(), roster_iterations),
+        ('employees.get[ids]', lambda i: employees.get([random_id() for _ in range(10)]), iterations),
+        ('employee.get', lambda i: employee.get(random_id()), iterations),
+        ('employees.post', post, iterations),
+        ('employees.patch', lambda i: employees.patch({'employee_id': random_id(), 'salary': 70000 + i,
+                                                       'department': rng.choice(DEPARTMENTS)}), iterations),
+        ('employees.delete', lambda i: employees.delete(deletable.pop(0)), iterations),
+        ('rewards.get', lambda i: rewards.get(), roster_iterations),
+        ('rewards.post', lambda i: rewards.post({'employeeId': random_id(), 'replace': False, 'orderId': i,
+                                                 'serialIds': [i, i + 1]}), iterations),
+        ('authentication.get', lambda i: authentication.get(rng.choice(DEPARTMENTS).replace(' ', ''),
+                                                            str(rng.choice(list(emails)))), roster_iterations),
+    ]
+
+    results = {}
+    for name, operation, count in operations:
+        results[name] = measure(name, operation, count, statement_counter)
+    event.remove(engine, 'after_cursor_execute', count_statement)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=HR_DIRECTORY).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, nargs='+', default=[1000], help='dataset sizes, e.g. 1000 10000 100000')
+    parser.add_argument('--history', type=int, default=4, help='most history entries per employee and table')
+    parser.add_argument('--iterations', type=int, default=50, help='calls per single-employee operation')
+    parser.add_argument('--roster-iterations', type=int, default=5, help='calls per whole-roster operation')
+    parser.add_argument('--seed', type=int, default=343)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    report = {'commit': git_commit(), 'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+              'history': arguments.history, 'sizes': {}}
+
+    # Every size runs in a fresh process so the module level engine points at a fresh database
+    for employee_count in arguments.employees:
+        directory = tempfile.mkdtemp()
+        environment = dict(os.environ, HR_DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'),
+                           HR_LOG_FILE=os.path.join(directory, 'log.txt'), HR_LOG_LEVEL='WARNING')
+        output = os.path.join(directory, 'result.json')
+        print("== %s employees ==" % employee_count)
+        subprocess.check_call([sys.executable, os.path.abspath(__file__), '--run-size', str(employee_count),
+                               str(arguments.history), str(arguments.iterations), str(arguments.roster_iterations),
+                               str(arguments.seed), output], env=environment, cwd=HR_DIRECTORY)
+        with open(output) as result_file:
+            report['sizes'][str(employee_count)] = json.load(result_file)
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+        print("wrote %s" % arguments.output)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--run-size':
+        sys.path.insert(0, HR_DIRECTORY)
+        size, history, iterations, roster_iterations, seed_value, output_path = sys.argv[2:8]
+        size_results = run_size(int(size), int(history), int(iterations), int(roster_iterations), int(seed_value))
+        with open(output_path, 'w') as size_file:
+            json.dump(size_results, size_file)
+    else:
+        main()
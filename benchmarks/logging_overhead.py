@@ -0,0 +1,61 @@
+""" Measures how long the log calls on the employees GET path keep a request busy.
+
+"before" is the old setup: a synchronous FileHandler and an info line concatenated for every employee.
+"after" is helpers.log_helper: a queue handler, lazy arguments and a single summary line.
+
+Run from the repository root with: python benchmarks/logging_overhead.py [employee count] [requests]
+"""
+import logging
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr'))
+
+
+def fake_roster(count):
+    return [(employee_id, 'First%s' % employee_id, 'Last%s' % employee_id, 'e%s@krutz.site' % employee_id,
+             '1992-02-12', 'Sales', 'Developer') for employee_id in range(count)]
+
+
+def before(logger, roster):
+    info = "Get Employees - Found the following employees - "
+    for row in roster:
+        info += "Employee ID: %s, Name: %s, Email: %s, Birth date: %s, Department: %s, Role: %s " % \
+                (row[0], row[1] + ' ' + row[2], row[3], row[4], row[5], row[6])
+    logger.warning(info)
+
+
+def after(logger, roster):
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Get Employees - Found the following employees - %s",
+                     ', '.join('Employee ID: %s, Name: %s %s' % (row[0], row[1], row[2]) for row in roster))
+    else:
+        logger.info("Get Employees - Found %s employees", len(roster))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    roster = fake_roster(count)
+    directory = tempfile.mkdtemp()
+
+    legacy = logging.getLogger('benchmark.before')
+    legacy.propagate = False
+    legacy.addHandler(logging.FileHandler(os.path.join(directory, 'before.txt')))
+    before_seconds = timeit.timeit(lambda: before(legacy, roster), number=requests)
+
+    os.environ['HR_LOG_FILE'] = os.path.join(directory, 'after.txt')
+    from helpers import log_helper
+    current = log_helper.get_logger('benchmark.after')
+    after_seconds = timeit.timeit(lambda: after(current, roster), number=requests)
+    log_helper.stop_logging()
+
+    print("employees per request: %s, requests: %s" % (count, requests))
+    print("before: %.3f ms per request" % (before_seconds * 1000 / requests))
+    print("after:  %.3f ms per request" % (after_seconds * 1000 / requests))
+
+
+if __name__ == '__main__':
+    main()
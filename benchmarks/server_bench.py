@@ -0,0 +1,81 @@
+""" Compares the throughput of the Flask development server (python app.py) with gunicorn (gunicorn.conf.py).
+
+Both serve app.py from a SQLite database seeded with generated employees. The development server runs the way
+app.py starts it, with debug on and a thread per request; gunicorn runs with --workers processes of --threads
+threads. Each concurrency level sends --requests requests for single employees with that many in flight.
+
+Run from the repository root with, for example:
+    python benchmarks/server_bench.py --employees 2000 --workers 4 --threads 4 --concurrency 1 8 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from async_bench import HR_DIRECTORY, free_port, load, wait_until_up
+
+DEV_SERVER = "import app; app.app.run(host='127.0.0.1', port=%s, debug=True, use_reloader=False)"
+
+
+async def run(arguments):
+    import aiohttp
+
+    directory = tempfile.mkdtemp()
+    environment = dict(os.environ, HR_DATABASE_URL='sqlite:///' + os.path.join(directory, 'bench.db'),
+                       HR_LOG_FILE=os.path.join(directory, 'log.txt'), HR_LOG_LEVEL='WARNING',
+                       HR_WORKERS=str(arguments.workers), HR_THREADS=str(arguments.threads))
+    subprocess.check_call([sys.executable, '-c', 'import databasesetup, generate_data; '
+                           'generate_data.generate(databasesetup.engine, %s, 343)' % arguments.employees],
+                          env=environment, cwd=HR_DIRECTORY, stdout=subprocess.DEVNULL)
+
+    report = {'employees': arguments.employees, 'workers': arguments.workers, 'threads': arguments.threads,
+              'cpus': os.cpu_count(), 'results': {}}
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0)) as session:
+        for name in ('dev server', 'gunicorn'):
+            port = free_port()
+            if name == 'gunicorn':
+                command = [sys.executable, '-m', 'gunicorn', 'app:application',
+                           '--bind', '127.0.0.1:%s' % port, '--log-level', 'warning']
+            else:
+                command = [sys.executable, '-c', DEV_SERVER % port]
+            server = subprocess.Popen(command, env=environment, cwd=HR_DIRECTORY,
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            try:
+                url = 'http://127.0.0.1:%s/employee/%s' % (port, arguments.employees // 2)
+                await wait_until_up(session, url)
+                report['results'][name] = {}
+                for concurrency in arguments.concurrency:
+                    result = await load(session, url, max(arguments.requests, concurrency), concurrency)
+                    report['results'][name][concurrency] = result
+                    print("  %-10s concurrency %4s  %8.1f requests/s  p50 %8.1f ms  p99 %8.1f ms  %s failed"
+                          % (name, concurrency, result['requests_per_second'], result['p50_ms'],
+                             result['p99_ms'], result['failures']))
+            finally:
+                server.terminate()
+                server.wait()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, default=2000)
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                        help='requests in flight at the same time')
+    parser.add_argument('--requests', type=int, default=500, help='requests per concurrency level')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    report = asyncio.run(run(arguments))
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+        print("wrote %s" % arguments.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+""" Measures how long a fresh process takes to import app.py, and fails when that is over a budget.
+
+Every run starts a new interpreter with python -X importtime, the way a new worker starts. The cold cache runs start
+with an empty spec cache (the first start of a release), the warm cache runs reuse it (a restart or another worker).
+The report has the median start, the phases logged by startup_helper and the packages that took longest to import.
+The database URL points into a directory that does not exist, so a start that tries to connect fails.
+
+Run from the repository root with, for example:
+    python benchmarks/startup_bench.py --runs 5 --budget 2
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+HR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr')
+START = "import app, json; from helpers import startup_helper; print(json.dumps(startup_helper.phases()))"
+
+
+def start_once(environment):
+    """
+    :return: seconds until app.py was imported, the startup_helper phases and the import time per top level package
+    """
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', START], env=environment, cwd=HR_DIRECTORY,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    seconds = time.perf_counter() - started
+
+    packages = defaultdict(float)
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, _, name = line[len('import time:'):].split('|')
+        # Each module's own time goes to its package, so the time of sqlalchemy is not hidden inside whatever
+        # happened to import it first
+        packages[name.strip().split('.')[0]] += int(self_time) / 1e6
+    return seconds, json.loads(process.stdout.strip().splitlines()[-1]), packages
+
+
+def run(arguments):
+    directory = tempfile.mkdtemp()
+    environment = dict(os.environ, HR_DATABASE_URL='sqlite:///' + os.path.join(directory, 'missing', 'hr.db'),
+                       HR_LOG_FILE=os.path.join(directory, 'log.txt'),
+                       HR_SPEC_CACHE_DIR=os.path.join(directory, 'spec-cache'))
+    report = {'budget_seconds': arguments.budget, 'runs': {}}
+    for name, clear_cache in (('cold cache', True), ('warm cache', False)):
+        starts, phases, packages = [], defaultdict(list), defaultdict(list)
+        for _ in range(arguments.runs):
+            if clear_cache and os.path.isdir(environment['HR_SPEC_CACHE_DIR']):
+                for file_name in os.listdir(environment['HR_SPEC_CACHE_DIR']):
+                    os.remove(os.path.join(environment['HR_SPEC_CACHE_DIR'], file_name))
+            seconds, run_phases, run_packages = start_once(environment)
+            starts.append(seconds)
+            for phase, phase_seconds in run_phases:
+                phases[phase].append(phase_seconds)
+            for package, package_seconds in run_packages.items():
+                packages[package].append(package_seconds)
+
+        result = {'median_seconds': statistics.median(starts), 'max_seconds': max(starts),
+                  'phases': dict((phase, statistics.median(values)) for phase, values in phases.items()),
+                  'slowest_imports': sorted(((package, statistics.median(values))
+                                             for package, values in packages.items()),
+                                            key=lambda item: -item[1])[:arguments.top]}
+        report['runs'][name] = result
+        print("%s: median %.0f ms, slowest %.0f ms" % (name, result['median_seconds'] * 1000,
+                                                       result['max_seconds'] * 1000))
+        print("  phases:  %s" % ', '.join('%s %.0f ms' % (phase, seconds * 1000)
+                                          for phase, seconds in result['phases'].items()))
+        print("  imports: %s" % ', '.join('%s %.0f ms' % (package, seconds * 1000)
+                                          for package, seconds in result['slowest_imports']))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='starts measured with a cold and with a warm cache')
+    parser.add_argument('--budget', type=float, default=2.0, help='seconds the median warm start may take')
+    parser.add_argument('--top', type=int, default=8, help='packages listed in the import breakdown')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    report = run(arguments)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+        print("wrote %s" % arguments.output)
+
+    warm_start = report['runs']['warm cache']['median_seconds']
+    if warm_start > arguments.budget:
+        print("over budget: a warm start took %.2f s, the budget is %.2f s" % (warm_start, arguments.budget))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
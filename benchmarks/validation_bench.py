@@ -0,0 +1,93 @@
+""" Times checking and parsing one request body, the way connexion and the controllers used to and with the
+compiled validators of payload_helper.
+
+The jsonschema column is connexion's default body validator followed by the parsing the controllers did by hand:
+strptime for every date and the address regex. The compiled column is what a request costs now: the check
+CompiledBodyValidator makes in front of the controller plus load_payload in the controller, which hands out the
+Payload the validator built. Both run in a Flask app context like in a request, but nothing is served, so only
+the validation is timed.
+
+Run from the repository root with, for example:
+    python benchmarks/validation_bench.py --iterations 20000
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+from datetime import datetime
+
+HR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr')
+
+BODIES = {
+    'EmployeePost': {'is_active': True, 'fname': 'Laura', 'lname': 'King', 'email': 'lxk3301@g.rit.edu',
+                     'birth_date': '1992-02-12', 'address': '1 Lomb Memorial Drive, Rochester, New York 14623',
+                     'department': 'Inventory', 'role': 'Developer', 'start_date': '2017-01-23'},
+    'EmployeePatch': {'employee_id': 14, 'fname': 'Laura', 'birth_date': '1992-02-12',
+                      'address': '1 Lomb Memorial Drive, Rochester, New York 14623',
+                      'address_start_date': '2018-05-01', 'department': 'Sales', 'department_start_date': '2018-05-01',
+                      'role': 'Manager', 'role_start_date': '2018-05-01', 'salary': 7500000,
+                      'salary_start_date': '2018-05-01'},
+    'Reward': {'employeeId': 14, 'replace': False, 'orderId': 3, 'serialIds': list(range(10))},
+}
+DATE_FIELDS = ('birth_date', 'start_date', 'address_start_date', 'department_start_date', 'role_start_date',
+               'salary_start_date')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    arguments = parser.parse_args()
+
+    os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+    os.environ.setdefault('HR_LOG_FILE', os.devnull)
+    sys.path.insert(0, HR_DIRECTORY)
+    from connexion.decorators.validation import draft4_format_checker
+    from flask import Flask
+    from connexion.json_schema import Draft4RequestValidator, resolve_refs
+    from helpers import payload_helper, spec_helper
+    from helpers.regex_helper import validate_address
+
+    with open(payload_helper.SPEC_FILE, 'rb') as spec_file:
+        definitions = resolve_refs(spec_helper.parse(spec_file.read()))['definitions']
+    payload_helper.init_api()
+
+    def by_hand(body):
+        for field in DATE_FIELDS:
+            if field in body:
+                datetime.strptime(body[field], '%Y-%m-%d').date()
+        if 'address' in body:
+            validate_address(body['address'])
+
+    # load_payload takes the validator's Payload from flask.g
+    Flask(__name__).app_context().push()
+    report = {}
+    for name, body in BODIES.items():
+        schema_validator = Draft4RequestValidator(definitions[name], format_checker=draft4_format_checker)
+        body_validator = payload_helper.CompiledBodyValidator(definitions[name], ['application/json'], None)
+
+        def jsonschema_path():
+            schema_validator.validate(body)
+            by_hand(body)
+
+        def compiled_path():
+            body_validator.validate_schema(body, name)
+            payload_helper.load_payload(name, body)
+
+        report[name] = {}
+        for path_name, path in (('jsonschema', jsonschema_path), ('compiled', compiled_path)):
+            seconds = min(timeit.repeat(path, number=arguments.iterations, repeat=3)) / arguments.iterations
+            report[name][path_name] = seconds * 1e6
+        print("  %-14s jsonschema %7.1f us  compiled %6.1f us  %5.1fx" % (
+            name, report[name]['jsonschema'], report[name]['compiled'],
+            report[name]['jsonschema'] / report[name]['compiled']))
+
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            json.dump(report, output_file, indent=2, sort_keys=True)
+        print("wrote %s" % arguments.output)
+
+
+if __name__ == '__main__':
+    main()
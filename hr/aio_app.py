@@ -0,0 +1,45 @@
+"""Run of the HR API in the async serving mode
+
+The same API as app.py, served by aiohttp. /confirm_login and POST /rewards await Google tokeninfo, inventory and
+the database instead of holding a worker while they wait; every other operation runs on a thread pool. The html
+pages are only served by app.py.
+
+Run it from the hr directory with: python aio_app.py, or in production with
+    gunicorn aio_app:application --worker-class aiohttp.GunicornWebWorker
+"""
+import connexion
+from aiohttp import web
+
+from helpers.log_helper import get_logger
+from helpers import async_helper, metrics_helper, spec_helper, payload_helper
+
+logger = get_logger(__name__)
+
+# One API only, so it is served from / like in app.py instead of under a base path
+app = connexion.AioHttpApp(
+    __name__,
+    specification_dir='./specs/',
+    only_one_api=True
+)
+logger.info("Adding API")
+spec_helper.add_api(
+    app,
+    'swagger.yaml',
+    arguments={'title': 'HR API'},
+    resolver=async_helper.AsyncResolver(),
+    validator_map={'body': payload_helper.CompiledBodyValidator}
+)
+payload_helper.init_api()
+
+# Expose application var for aiohttp workers
+application = app.app
+application.on_cleanup.append(async_helper.close)
+
+
+async def metrics(request):
+    return web.Response(text=metrics_helper.render(), content_type='text/plain')
+application.router.add_get('/metrics', metrics)
+
+if __name__ == '__main__':
+    logger.warning('Async app starting up.')
+    app.run(port=8080)
@@ -1,13 +1,18 @@
 """Run of the HR application """
+from helpers import startup_helper
 import connexion
-from flask import send_file
+from flask import Response, request
 
-import logging
+import config
+from helpers.log_helper import get_logger
+from helpers import metrics_helper, query_inspector_helper, static_asset_helper, search_helper, webhook_helper, \
+    spec_helper, payload_helper, replica_helper
+from controllers import roster
 
 # from flask_cors import CORS
 
-logging.basicConfig(filename='./log.txt',format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
+startup_helper.mark('imports')
 
 # Create connexion app and add the HR API
 app = connexion.App(
@@ -15,10 +20,14 @@ app = connexion.App(
     specification_dir='./specs/'
 )
 logger.info("Adding API")
-app.add_api(
+api = spec_helper.add_api(
+    app,
     'swagger.yaml',
-    arguments={'title': 'HR API'}
+    arguments={'title': 'HR API'},
+    validator_map={'body': payload_helper.CompiledBodyValidator}
 )
+payload_helper.init_api(api)
+startup_helper.mark('api')
 '''
 # Configure cross origin request sources.
 CORS(
@@ -33,24 +42,51 @@ CORS(
 # Expose application var for WSGI support
 application = app.app
 
+metrics_helper.init_app(application)
+query_inspector_helper.init_app(application)
+replica_helper.init_app(application)
+static_asset_helper.init_app(application)
+startup_helper.mark('middleware')
+
+
+def start_background_tasks():
+    """ Starts the threads this process runs next to the requests. A forking server has to call this in every
+    worker after the fork instead, threads do not survive it (see gunicorn.conf.py).
+    """
+    if config.SEARCH_WARM_UP:
+        search_helper.warm_up()
+    if config.WEBHOOKS_ENABLED:
+        webhook_helper.start()
+
+
+if not config.FORKING_SERVER:
+    start_background_tasks()
+    startup_helper.mark('background tasks')
+startup_helper.report()
 
 
 @app.route('/oauth')
 def oauth():
-    return send_file('html/oauth.html')
+    return static_asset_helper.send_page('oauth.html')
 @app.route('/')
+def index():
+    return static_asset_helper.send_page('viewemployees.html')
 @app.route('/view')
 def view():
-    return send_file('html/viewemployees.html')
+    return roster.get(page=request.args.get('page', 1, type=int),
+                      per_page=request.args.get('per_page', roster.PER_PAGE, type=int))
 @app.route('/add')
 def add():
-    return send_file('html/addemployee.html')
+    return static_asset_helper.send_page('addemployee.html')
 @app.route('/edit/<int:eId>')
 def edit(eId=-1):
-    return send_file('html/editemployee.html')
+    return static_asset_helper.send_page('editemployee.html')
 @app.route('/viewrewards')
 def rewards():
-    return send_file('html/rewards.html')
+    return static_asset_helper.send_page('rewards.html')
+@app.route('/metrics')
+def metrics():
+    return Response(metrics_helper.render(), mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
     logger.warning('App starting up.')
@@ -0,0 +1,96 @@
+""" Settings for the HR application, read once from the environment.
+
+Every setting has a default that matches how the application has always run, so nothing needs to be set
+for a development machine.
+"""
+import os
+
+
+def _get_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _get_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _get_levels(name):
+    """ Parses "module=LEVEL,other.module=LEVEL" into a dictionary
+    """
+    levels = {}
+    for entry in os.environ.get(name, '').split(','):
+        if '=' in entry:
+            module, level = entry.split('=', 1)
+            levels[module.strip()] = level.strip().upper()
+    return levels
+
+
+# LOGGING
+LOG_FILE = os.environ.get('HR_LOG_FILE', './log.txt')
+LOG_LEVEL = os.environ.get('HR_LOG_LEVEL', 'INFO').upper()
+LOG_LEVELS = _get_levels('HR_LOG_LEVELS')  # e.g. HR_LOG_LEVELS="controllers.employees=DEBUG,sqlalchemy.engine=INFO"
+LOG_MAX_BYTES = _get_int('HR_LOG_MAX_BYTES', 10 * 1024 * 1024)
+LOG_BACKUP_COUNT = _get_int('HR_LOG_BACKUP_COUNT', 5)
+LOG_ROTATE_WHEN = os.environ.get('HR_LOG_ROTATE_WHEN', '')  # e.g. "midnight" rotates by time instead of by size
+
+# DATABASE
+DATABASE_URL = os.environ.get('HR_DATABASE_URL')  # e.g. sqlite:///hr.db, defaults to the local MySQL 343DB
+SQL_ECHO = _get_bool('HR_SQL_ECHO', False)
+# e.g. "mysql+mysqldb://hr@replica1/343DB,mysql+mysqldb://hr@replica2/343DB", empty to read from DATABASE_URL only
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('HR_DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+READ_YOUR_WRITES_SECONDS = _get_int('HR_READ_YOUR_WRITES_SECONDS', 300)  # longest a client reads from the primary after a write
+
+# STARTUP
+SPEC_CACHE_DIR = os.environ.get('HR_SPEC_CACHE_DIR', './specs/.cache')  # parsed swagger.yaml, empty to parse every start
+STARTUP_BUDGET_SECONDS = float(os.environ.get('HR_STARTUP_BUDGET_SECONDS', '2'))  # a slower start is logged as a warning
+
+# QUERY INSPECTOR (development and staging only)
+QUERY_INSPECTOR = _get_bool('HR_QUERY_INSPECTOR', False)
+QUERY_INSPECTOR_STRICT = _get_bool('HR_QUERY_INSPECTOR_STRICT', False)
+QUERY_REPEAT_THRESHOLD = _get_int('HR_QUERY_REPEAT_THRESHOLD', 5)
+SLOW_QUERY_SECONDS = float(os.environ.get('HR_SLOW_QUERY_SECONDS', '0.25'))
+
+# EMPLOYEE SEARCH
+SEARCH_INDEX_MAX_AGE = _get_int('HR_SEARCH_INDEX_MAX_AGE', 300)  # seconds before the index is rebuilt in the background
+# Build the index when the application starts, by default in every worker of gunicorn.conf.py (after the fork)
+SEARCH_WARM_UP = _get_bool('HR_SEARCH_WARM_UP', _get_bool('HR_FORKING_SERVER', False))
+
+# WEBHOOKS
+WEBHOOKS_ENABLED = _get_bool('HR_WEBHOOKS_ENABLED', False)  # run the dispatcher in this process, enable it in one only
+WEBHOOK_WORKERS = _get_int('HR_WEBHOOK_WORKERS', 4)  # subscribers delivered to at the same time
+WEBHOOK_BATCH_SIZE = _get_int('HR_WEBHOOK_BATCH_SIZE', 100)  # most changes sent in one request
+WEBHOOK_POLL_SECONDS = _get_int('HR_WEBHOOK_POLL_SECONDS', 5)  # how often changes made by other processes are looked for
+WEBHOOK_TIMEOUT_SECONDS = _get_int('HR_WEBHOOK_TIMEOUT_SECONDS', 5)
+WEBHOOK_RETRIES = _get_int('HR_WEBHOOK_RETRIES', 3)  # quick retries of one request before the subscriber backs off
+
+# OTHER SERVICES
+TOKENINFO_URL = os.environ.get('HR_TOKENINFO_URL', 'https://www.googleapis.com/oauth2/v3/tokeninfo')
+INVENTORY_URL = os.environ.get('HR_INVENTORY_URL', 'http://vm343b.se.rit.edu:5000/inventory')
+
+# OUTBOUND HTTP (helpers/http_helper.py)
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('HR_HTTP_CONNECT_TIMEOUT_SECONDS', '3'))
+HTTP_READ_TIMEOUT_SECONDS = float(os.environ.get('HR_HTTP_READ_TIMEOUT_SECONDS', '10'))
+HTTP_RETRIES = _get_int('HR_HTTP_RETRIES', 2)  # times a failed idempotent call is made again
+HTTP_RETRY_BACKOFF_SECONDS = float(os.environ.get('HR_HTTP_RETRY_BACKOFF_SECONDS', '0.2'))  # doubled per retry, jittered
+HTTP_POOL_HOSTS = _get_int('HR_HTTP_POOL_HOSTS', 10)  # hosts kept a connection pool for
+HTTP_POOL_SIZE = _get_int('HR_HTTP_POOL_SIZE', 10)  # open connections kept per host
+HTTP_BREAKER_FAILURES = _get_int('HR_HTTP_BREAKER_FAILURES', 5)  # failed calls in a row before a host is refused
+HTTP_BREAKER_RESET_SECONDS = _get_int('HR_HTTP_BREAKER_RESET_SECONDS', 30)  # how long a failing host is refused
+
+# ASYNC SERVING (aio_app.py)
+ASYNC_DATABASE_URL = os.environ.get('HR_ASYNC_DATABASE_URL')  # defaults to DATABASE_URL with its async driver
+ASYNC_HTTP_CONNECTIONS = _get_int('HR_ASYNC_HTTP_CONNECTIONS', 100)  # open connections to other services
+ASYNC_HTTP_TIMEOUT_SECONDS = _get_int('HR_ASYNC_HTTP_TIMEOUT_SECONDS', 10)
+ASYNC_THREADS = _get_int('HR_ASYNC_THREADS', 8)  # threads running the controllers that have no async version
+
+# SERVER (gunicorn.conf.py)
+FORKING_SERVER = _get_bool('HR_FORKING_SERVER', False)  # set by gunicorn.conf.py, background threads start after fork
+BIND = os.environ.get('HR_BIND', '0.0.0.0:80')
+WORKERS = _get_int('HR_WORKERS', 2 * (os.cpu_count() or 1) + 1)
+THREADS = _get_int('HR_THREADS', 4)  # threads per worker, requests one worker serves at the same time
+MAX_REQUESTS = _get_int('HR_MAX_REQUESTS', 10000)  # a worker is replaced after this many requests, 0 never
+GRACEFUL_TIMEOUT = _get_int('HR_GRACEFUL_TIMEOUT', 30)  # seconds a worker may finish its requests on reload
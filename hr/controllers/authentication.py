@@ -1,29 +1,94 @@
 """ This is the controller of the /confirm_login endpoint
 
 The following functions are called from here: GET
+get_async is the same endpoint for the async serving mode, see aio_app.py.
 """
-import logging
+import asyncio
+from sqlalchemy import and_, select
+from sqlalchemy.exc import SQLAlchemyError
+import config
+from databasesetup import create_session, Employee, Department, DepartmentRef
+from helpers import async_helper, http_helper
+from helpers.log_helper import get_logger
 import requests
-import employees
 
 
-logging.basicConfig(filename='./log.txt',format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
+UNAVAILABLE = {'error_message': 'Sign in with Google is unavailable right now, please try again later'}, 503
 
-def get(department="",token=""):
+
+def employee_query(email, department):
+    """
+    :return: the query of the id of the employee with this email working in the department or on the Board
+    """
+    # Looked up through the email index, the department by its code instead of reading every employee
+    return select([Employee.id]) \
+        .join(Department, and_(Department.employee_id == Employee.id, Department.is_active == True)) \
+        .join(DepartmentRef, DepartmentRef.id == Department.department_ref_id) \
+        .where(and_(Employee.email == email, DepartmentRef.code.in_([department, "Board"]))) \
+        .limit(1)
+
+
+def get(department="",token="", session=None):
     """ This is the GET function that will return an object with an employee id if they are authenticated.
     :param token:
     :return: an object with employee_id
     """
 
-    response = requests.post('https://www.googleapis.com/oauth2/v3/tokeninfo',{'access_token': token})
-    logger.info(response)
+    try:
+        # tokeninfo only reads, so it is safe to ask again after a timeout
+        response = http_helper.post(config.TOKENINFO_URL, 'google_tokeninfo', data={'access_token': token},
+                                    idempotent=True)
+    except requests.RequestException as error:
+        logger.warning("Authentication - tokeninfo could not be reached: %s", error)
+        return UNAVAILABLE
+    logger.info("Authentication - tokeninfo responded with %s", response.status_code)
     if response.status_code == 200:
         email = response.json()["email"]
-        emps = employees.get()
-        for e in emps["employee_array"]:
-            employee_department = e["department"].replace(" ","")
-            if e["email"] == email and (employee_department == department or employee_department == "Board"):
-                return {"employee_id": e["employee_id"]}
+        if session is None:
+            session = create_session()
+        try:
+            employee_id = session.execute(employee_query(email, department)).scalar()
+        except SQLAlchemyError:
+            session.rollback()
+            logger.warning("Authentication - Error while looking up %s", email)
+            return {'error_message': 'User is not authenticated'}, 400
+        finally:
+            session.close()
+        if employee_id is not None:
+            return {"employee_id": employee_id}
+    return {'error_message': 'User is not authenticated'}, 400
+
+
+async def get_async(department="", token="", session=None):
+    """ get for the async serving mode, the tokeninfo call and the lookup are awaited instead of blocking
+    :param token:
+    :return: an object with employee_id
+    """
+    # Imported here so the sync application does not need aiohttp
+    import aiohttp
+    try:
+        with http_helper.circuit(config.TOKENINFO_URL, 'google_tokeninfo') as call:
+            async with async_helper.get_http().post(config.TOKENINFO_URL, data={'access_token': token}) as response:
+                status = call.status = response.status
+                token_info = await response.json(content_type=None) if status == 200 else None
+    except (requests.RequestException, aiohttp.ClientError, asyncio.TimeoutError) as error:
+        logger.warning("Authentication - tokeninfo could not be reached: %s", error)
+        return UNAVAILABLE
+    logger.info("Authentication - tokeninfo responded with %s", status)
+    if status == 200:
+        email = token_info["email"]
+        if session is None:
+            session = async_helper.create_session()
+        try:
+            employee_id = (await session.execute(employee_query(email, department))).scalar()
+        except SQLAlchemyError:
+            await session.rollback()
+            logger.warning("Authentication - Error while looking up %s", email)
+            return {'error_message': 'User is not authenticated'}, 400
+        finally:
+            await session.close()
+        if employee_id is not None:
+            return {"employee_id": employee_id}
     return {'error_message': 'User is not authenticated'}, 400
@@ -0,0 +1,40 @@
+""" This is the controller of the /changes endpoint
+
+The following functions are called from here: GET
+"""
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session
+from helpers.change_feed_helper import read_changes, serialize
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+LIMIT = 100
+MAX_LIMIT = 1000
+
+
+def get(since=0, limit=LIMIT, session=None):
+    """ This is the GET function that will return the employee changes committed after a cursor.
+    :param since: the next_cursor of the previous response, 0 to read from the beginning
+    :param limit: most changes to return
+    :return: the changes in the order they were made, the cursor to read the next ones and whether there are more
+    """
+    limit = min(max(limit, 1), MAX_LIMIT)
+
+    if session is None:
+        session = create_session()
+
+    try:
+        changes, has_more = read_changes(session, max(since, 0), limit)
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while retrieving the changes after %s' % since
+        logger.warning("Changes.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    logger.info("Get Changes - Found %s changes after %s", len(changes), since)
+    return {'change_array': [serialize(change) for change in changes],
+            'next_cursor': changes[-1].id if changes else since,
+            'has_more': has_more}
@@ -2,57 +2,81 @@
 
 The following functions are called from here: GET
 """
+from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
-from databasesetup import create_session, Employee
-from models.employee_api_model import EmployeeApiModel
+from databasesetup import create_read_session, Employee
 from models.employee_response import EmployeeResponse
-from helpers.db_object_helper import get_all_children_objects
-import logging
+from helpers.db_object_helper import get_all_children_objects, get_children_objects_as_of
+from controllers.employees import build_employee
+from helpers.log_helper import get_logger
 
-logging.basicConfig(filename='./log.txt', format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
-def get(employee_id, session=None):
+def get(employee_id, session=None, as_of=None):
     """ This is the GET function that will return one or more employee objects within the system.
     :param employee_id:
+    :param as_of: date (YYYY-MM-DD) to rebuild the employee as they were on
     :return: a set of Employee Objects
     """
     if session == None:
-        session = create_session()
+        session = create_read_session()
+
+    if as_of is not None:
+        return get_as_of(employee_id, as_of, session)
 
     try:
         employee_object = session.query(Employee).get(employee_id)
     except SQLAlchemyError:
         session.rollback()
         logger.error("Employee.py Get - Failed to retrieve employee number %s. "
-                     "Invalid statement." % str(employee_id))
+                     "Invalid statement.", employee_id)
         return {'error_message': 'Error while retrieving employee %s' % employee_id}, 400
 
     try:
         children = get_all_children_objects(employee_object)
     except AttributeError:
-        logger.error("Employee.py Get - failed to retrieve employee number %s. Employee does not exist." % str(employee_id))
+        logger.error("Employee.py Get - failed to retrieve employee number %s. Employee does not exist.", employee_id)
         return {'error_message': 'Error while retrieving employee %s' % employee_id}, 400
-    employee = EmployeeApiModel(is_active=employee_object.is_active,
-                                employee_id=employee_object.id,
-                                name=employee_object.first_name + ' ' + employee_object.last_name,
-                                birth_date=employee_object.birth_date,
-                                email=employee_object.email,
-                                address=children['address'].to_str(),
-                                department=children['department'].to_str(),
-                                role=children['title'].to_str(),
-                                team_start_date=children['department'].start_date,
-                                start_date=employee_object.start_date,
-                                salary=children['salary'].to_str())
+    # An offboarded employee may have no active entries left
+    employee = build_employee(employee_object, children)
+
+    session.close()
+    logger.info("Employee.py Get - Retrieved Employee ID %s"
+                " (Name: %s %s, Email: %s, Birth date: %s, Department: %s, Role: %s)",
+                employee_id, employee_object.first_name, employee_object.last_name, employee_object.email,
+                employee_object.birth_date, employee.department, employee.role)
+    return EmployeeResponse(employee).to_dict()
+
+
+def get_as_of(employee_id, as_of, session):
+    """ Returns the employee as they were on a particular date.
+    :param employee_id:
+    :param as_of: date (YYYY-MM-DD) to rebuild the employee as they were on
+    :param session:
+    :return: a set of Employee Objects
+    """
+    try:
+        as_of_date = datetime.strptime(as_of, '%Y-%m-%d').date()
+    except ValueError:
+        logger.error("Employee.py Get - The as_of date %s is not formatted as YYYY-MM-DD", as_of)
+        return {'error_message': 'The as_of date %s is not formatted as YYYY-MM-DD' % as_of}, 400
+
+    try:
+        employee_object = session.query(Employee).get(employee_id)
+        if employee_object is None or employee_object.start_date is None or employee_object.start_date > as_of_date:
+            session.rollback()
+            logger.error("Employee.py Get - Employee number %s did not exist on %s.", employee_id, as_of)
+            return {'error_message': 'Error while retrieving employee %s as of %s' % (employee_id, as_of)}, 400
+
+        children = get_children_objects_as_of(session, as_of_date, [employee_id]).get(
+            employee_id, dict.fromkeys(('address', 'title', 'department', 'salary')))
+    except SQLAlchemyError:
+        session.rollback()
+        logger.error("Employee.py Get - Failed to retrieve employee number %s as of %s. "
+                     "Invalid statement.", employee_id, as_of)
+        return {'error_message': 'Error while retrieving employee %s as of %s' % (employee_id, as_of)}, 400
 
+    employee = build_employee(employee_object, children)
     session.close()
-    logger.warning("Employee.py Get - Retrieved Employee ID %s"
-                   " (Name: %s, Email: %s, Birth date: %s, Department: %s, Role: %s)" %
-                   (str(employee_id),
-                    employee_object.first_name + ' ' + employee_object.last_name,
-                    employee_object.email,
-                    employee_object.birth_date,
-                    children['department'].to_str(),
-                    children['title'].to_str()))
     return EmployeeResponse(employee).to_dict()
@@ -6,25 +6,53 @@ import json
 import os
 from datetime import datetime
 from random import randrange
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import exists, and_
-from databasesetup import create_session, Employee, Salary, Address, Title, Department
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from flask import has_request_context, request
+from sqlalchemy import and_
+from databasesetup import create_session, create_read_session, get_reference, employee_fingerprint, Employee, \
+    Salary, Address, Title, Department, TitleRef, DepartmentRef
 from helpers.db_object_helper import \
-    get_all_children_objects, get_active_address, \
-    get_active_title, get_active_department, get_active_salary
-from helpers.regex_helper import validate_address
+    get_active_address, get_active_title, get_active_department, \
+    get_active_children_objects, get_children_objects_as_of
+from helpers.payload_helper import load_payload
+from helpers.cache_helper import mark_changed
+from helpers.change_feed_helper import record_changes, CREATE, UPDATE, DELETE
 from models.employee_api_model import EmployeeApiModel
 from models.employee_response import EmployeeResponse
+from helpers.log_helper import get_logger
 import logging
 
-logging.basicConfig(filename='./log.txt', format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
 
-def get(employee_id=None, static_flag=False, session=None):
+# PATCH fields stored in the employee row, and the columns they go to
+EMPLOYEE_COLUMNS = (('is_active', 'is_active'), ('fname', 'first_name'), ('lname', 'last_name'), ('email', 'email'),
+                    ('birth_date', 'birth_date'), ('start_date', 'start_date'))
+# PATCH fields the fingerprint is made of
+IDENTITY_FIELDS = ('fname', 'lname', 'email', 'birth_date', 'start_date')
+
+SORT_COLUMNS = {
+    'employee_id': lambda: (Employee.id,),
+    'name': lambda: (Employee.last_name, Employee.first_name),
+    'start_date': lambda: (Employee.start_date,),
+    'salary': lambda: (Salary.amount,),
+    'department': lambda: (DepartmentRef.name,),
+    'role': lambda: (TitleRef.name,),
+}
+
+
+def get(employee_id=None, static_flag=False, session=None, as_of=None, department=None, role=None,
+        is_active=None, min_salary=None, max_salary=None, sort=None):
     """ This is the GET function that will return one or more employee objects within the system.
     :param employee_id:
     :param static_flag:
+    :param as_of: date (YYYY-MM-DD) to rebuild the employees as they were on
+    :param department: only return employees currently in this department
+    :param role: only return employees currently in this role
+    :param is_active: only return active or only return inactive employees
+    :param min_salary: only return employees currently paid at least this much
+    :param max_salary: only return employees currently paid at most this much
+    :param sort: employee_id, name, start_date, salary, department or role, prefixed with - for descending order
     :return: a set of Employee Objects
     """
     if static_flag:
@@ -37,204 +65,335 @@ def get(employee_id=None, static_flag=False, session=None):
             return obj["employee_array"][employee_id[0]-1]
         return obj["employee_array"]
 
+    if sort is not None and sort.lstrip('-') not in SORT_COLUMNS:
+        error_message = 'Employees cannot be sorted by %s' % sort
+        logger.warning("Employees.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
     if session is None:
-        session = create_session()
-    employee_collection = []
-    info = "Get Employees - Found the following employees - "
+        session = create_read_session()
 
-    if employee_id is None:
-        try:
-            if not session.query(Employee).first():
+    if as_of is not None:
+        return get_as_of(employee_id, as_of, session)
+
+    filtered = any(value is not None for value in (department, role, is_active, min_salary, max_salary))
+
+    try:
+        if employee_id is not None:
+            existing = set(row[0] for row in session.query(Employee.id).filter(Employee.id.in_(employee_id)))
+            missing = [e_id for e_id in employee_id if e_id not in existing]
+            if missing:
                 session.rollback()
-                logger.warning("Get Employees - No employees exist in the system")
-                return {'error message': 'No employees exist in the system'}, 400
-
-            all_employee_objects = session.query(Employee).all()
-
-            for employee_object in all_employee_objects:
-                children = get_all_children_objects(employee_object)
-                employee = EmployeeApiModel(is_active=employee_object.is_active,
-                                            employee_id=employee_object.id,
-                                            name=employee_object.first_name + ' ' + employee_object.last_name,
-                                            birth_date=employee_object.birth_date,
-                                            email=employee_object.email,
-                                            address=children['address'].to_str(),
-                                            department=children['department'].to_str(),
-                                            role=children['title'].to_str(),
-                                            team_start_date=children['department'].start_date,
-                                            start_date=employee_object.start_date,
-                                            salary=children['salary'].to_str())
-                employee_collection.append(employee)
-
-        except SQLAlchemyError:
+                error_message = 'An employee with the id of %s does not exist' % missing[0]
+                logger.warning("Get Employees - %s", error_message)
+                return {'error message': error_message}, 400
+
+        employee_objects = filtered_query(session, employee_id, department, role, is_active, min_salary,
+                                          max_salary, sort).all()
+
+        if not employee_objects and employee_id is None and not filtered:
             session.rollback()
+            logger.warning("Get Employees - No employees exist in the system")
+            return {'error message': 'No employees exist in the system'}, 400
+
+        if employee_id is not None and sort is None:
+            # Without a sort order the employees come back in the order they were asked for
+            by_id = dict((employee_object.id, employee_object) for employee_object in employee_objects)
+            employee_objects = [by_id[e_id] for e_id in employee_id if e_id in by_id]
+
+        all_children = get_active_children_objects(session, [employee_object.id for employee_object
+                                                             in employee_objects])
+        employee_collection = [build_employee(employee_object, all_children[employee_object.id])
+                               for employee_object in employee_objects]
+
+    except SQLAlchemyError:
+        session.rollback()
+        if employee_id is None:
             error_message = 'Error while retrieving all employees'
-            logger.warning("Employees.py Get - " + error_message)
-            return {'error_message': error_message}, 400
+        else:
+            error_message = 'Error while retrieving employee %s' % employee_id
+        logger.warning("Employees.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
 
+    # CLOSE
+    session.close()
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Get Employees - Found the following employees - %s",
+                     ', '.join('Employee ID: %s, Name: %s' % (e.employee_id, e.name) for e in employee_collection))
     else:
-        for e_id in employee_id:
-            try:
-                if not session.query(exists().where(Employee.id == e_id)).scalar():
-                    session.rollback()
-                    error_message = 'An employee with the id of %s does not exist' % e_id
-                    logger.warning("Get Employees - " + error_message)
-                    return {'error message': error_message}, 400
-
-                employee_object = session.query(Employee).get(e_id)
-                children = get_all_children_objects(employee_object)
-                employee = EmployeeApiModel(is_active=employee_object.is_active,
-                                            employee_id=employee_object.id,
-                                            name=employee_object.first_name + ' ' + employee_object.last_name,
-                                            birth_date=employee_object.birth_date,
-                                            email=employee_object.email,
-                                            address=children['address'].to_str(),
-                                            department=children['department'].to_str(),
-                                            role=children['title'].to_str(),
-                                            team_start_date=children['department'].start_date,
-                                            start_date=employee_object.start_date,
-                                            salary=children['salary'].to_str())
-                employee_collection.append(employee)
-                info += "Employee ID: %s, Name: %s, Email: %s, Birth date: %s, Department: %s, Role: %s " % \
-                        (employee_object.id,
-                         employee_object.first_name + ' ' + employee_object.last_name,
-                         employee_object.email,
-                         employee_object.birth_date,
-                         children['department'].to_str(),
-                         children['title'].to_str())
-
-            except SQLAlchemyError:
-                session.rollback()
-                error_message = 'Error while retrieving employee %s' % employee_id
-                logger.warning("Employees.py Get - " + error_message)
-                return {'error_message': error_message}, 400
+        logger.info("Get Employees - Found %s employees", len(employee_collection))
+    return EmployeeResponse(employee_collection).to_dict()
+
+
+def filtered_query(session, employee_id=None, department=None, role=None, is_active=None, min_salary=None,
+                   max_salary=None, sort=None):
+    """ Builds the employee query for the roster filters. Only the history tables that are filtered or sorted on
+    are joined, and only on their active rows.
+    :return: a query of Employee objects
+    """
+    query = session.query(Employee)
+    sort_key = sort.lstrip('-') if sort is not None else 'employee_id'
+
+    # Names are matched in the small reference tables, the history rows are then found by integer key
+    if department is not None or sort_key == 'department':
+        query = query.outerjoin(Department, and_(Department.employee_id == Employee.id, Department.is_active == True)) \
+            .outerjoin(DepartmentRef, DepartmentRef.id == Department.department_ref_id)
+        if department is not None:
+            query = query.filter(DepartmentRef.name == department)
+    if role is not None or sort_key == 'role':
+        query = query.outerjoin(Title, and_(Title.employee_id == Employee.id, Title.is_active == True)) \
+            .outerjoin(TitleRef, TitleRef.id == Title.title_ref_id)
+        if role is not None:
+            query = query.filter(TitleRef.name == role)
+    if min_salary is not None or max_salary is not None or sort_key == 'salary':
+        query = query.outerjoin(Salary, and_(Salary.employee_id == Employee.id, Salary.is_active == True))
+        if min_salary is not None:
+            query = query.filter(Salary.amount >= min_salary)
+        if max_salary is not None:
+            query = query.filter(Salary.amount <= max_salary)
+
+    if employee_id is not None:
+        query = query.filter(Employee.id.in_(employee_id))
+    if is_active is not None:
+        query = query.filter(Employee.is_active == is_active)
+
+    descending = sort is not None and sort.startswith('-')
+    columns = [column.desc() if descending else column for column in SORT_COLUMNS[sort_key]()]
+    if sort_key != 'employee_id':
+        # The id breaks ties so equal values always come back in the same order
+        columns.append(Employee.id)
+    return query.order_by(*columns)
+
+
+def get_as_of(employee_id, as_of, session):
+    """ Returns employees as they were on a particular date, leaving out anyone who had not started yet.
+    :param employee_id: list of employee ids, or None for every employee
+    :param as_of: date (YYYY-MM-DD) to rebuild the employees as they were on
+    :param session:
+    :return: a set of Employee Objects
+    """
+    try:
+        as_of_date = datetime.strptime(as_of, '%Y-%m-%d').date()
+    except ValueError:
+        error_message = 'The as_of date %s is not formatted as YYYY-MM-DD' % as_of
+        logger.warning("Employees.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    employee_collection = []
+    try:
+        query = session.query(Employee).filter(Employee.start_date <= as_of_date)
+        if employee_id is not None:
+            query = query.filter(Employee.id.in_(employee_id))
+        employee_objects = query.order_by(Employee.id).all()
+
+        if employee_id is not None and len(employee_objects) != len(set(employee_id)):
+            missing = sorted(set(employee_id) - set(e.id for e in employee_objects))
+            session.rollback()
+            error_message = 'An employee with the id of %s did not exist on %s' % (missing[0], as_of)
+            logger.warning("Get Employees - %s", error_message)
+            return {'error message': error_message}, 400
+
+        all_children = get_children_objects_as_of(session, as_of_date, employee_id)
+        for employee_object in employee_objects:
+            children = all_children.get(employee_object.id,
+                                        dict.fromkeys(('address', 'title', 'department', 'salary')))
+            employee_collection.append(build_employee(employee_object, children))
+
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while retrieving employees as of %s' % as_of
+        logger.warning("Employees.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
 
-    # CLOSE
     session.close()
-    logger.warning(info)
     return EmployeeResponse(employee_collection).to_dict()
 
 
-def post(employee, session=None):
+def build_employee(employee_object, children):
+    """ Builds the api model from child objects, any of which may be missing, e.g. on a date before they started
+    :param employee_object:
+    :param children: dictionary of this employee's child objects, from get_active_children_objects or
+            get_children_objects_as_of
+    :return: an EmployeeApiModel
+    """
+    def to_str(child):
+        return child.to_str() if child is not None else None
+
+    return EmployeeApiModel(is_active=employee_object.is_active,
+                            employee_id=employee_object.id,
+                            name=employee_object.first_name + ' ' + employee_object.last_name,
+                            birth_date=employee_object.birth_date,
+                            email=employee_object.email,
+                            address=to_str(children['address']),
+                            department=to_str(children['department']),
+                            role=to_str(children['title']),
+                            team_start_date=children['department'].start_date if children['department'] else None,
+                            start_date=employee_object.start_date,
+                            salary=to_str(children['salary']),
+                            version=employee_object.version)
+
+
+def post(employee, upsert=False, session=None):
     """
     :param employee:
+    :param upsert: update the employee when they already exist instead of answering 400
     :return:
     """
+    employee = load_payload('EmployeePost', employee)
+    if isinstance(employee, tuple):
+        return employee
     if session is None:
         session = create_session()
 
     # ADD EMPLOYEE
     try:
-        # Check if Employee Already exists
-        if session.query(exists().where(and_(
-                Employee.first_name == employee['fname'],
-                Employee.last_name == employee['lname'],
-                Employee.email == employee['email'],
-                Employee.birth_date == datetime.strptime(employee['birth_date'], '%Y-%m-%d').date(),
-                Employee.start_date == datetime.strptime(employee['start_date'], '%Y-%m-%d').date()))).scalar():
-            session.rollback()
-            logger.warning("The following employee was attempted to add with POST but already exists. "
-                           "Please use PATCH to modify the employee's data or enter a new employee. "
-                           "A new employee has a unique first name, last name, birth date, and start date. "
-                           "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                           (employee['fname'] + ' ' + employee['lname'],
-                            employee['birth_date'],
-                            employee['start_date']))
-            return {'error_message':
-                    'This employee already exists in the system. Please use PATCH to modify them or enter a new '
-                    'employee. A new employee has a unique first name, last name, birth date, and start date'}, 400
-
-        birthday = datetime.strptime(employee['birth_date'], '%Y-%m-%d').date()  # e.g. 1993-12-17
-        start_date = datetime.strptime(employee['start_date'], '%Y-%m-%d').date()  # e.g. 2017-03-28
+        birthday = employee['birth_date']  # e.g. 1993-12-17
+        start_date = employee['start_date']  # e.g. 2017-03-28
         if employee['is_active']:
             logger.warning("The start date input (%s) is greater than today's date, but the employee is said to be "
                            "active. So the start date for the employee is marked as now. To change either of these "
                            "things, Use PATCH", start_date)
             start_date = datetime.now()
+        fingerprint = employee_fingerprint(employee['fname'], employee['lname'], employee['email'], birthday,
+                                           start_date)
         new_employee = Employee(is_active=employee['is_active'], first_name=employee['fname'],
                                 last_name=employee['lname'], birth_date=birthday, email=employee['email'],
-                                phones=0, orders=0, start_date=start_date)
-        session.add(new_employee)
+                                phones=0, orders=0, start_date=start_date, fingerprint=fingerprint)
+        try:
+            # The unique fingerprint turns a duplicate into a failed INSERT, so no search is needed first and two
+            # requests posting the same employee at once cannot both add them
+            with session.begin_nested():
+                session.add(new_employee)
+        except IntegrityError:
+            existing_id = session.query(Employee.id).filter(Employee.fingerprint == fingerprint).scalar()
+            if existing_id is None:
+                raise
+            if upsert:
+                return _upsert(session, existing_id, employee)
+            session.rollback()
+            logger.warning("The following employee was attempted to add with POST but already exists. "
+                           "Please use PATCH to modify the employee's data or enter a new employee. "
+                           "A new employee has a unique first name, last name, birth date, and start date. "
+                           "Employee Name: %s %s, Birth Date: %s, Start Date: %s.",
+                           employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
+            return {'error_message':
+                    'This employee already exists in the system. Please use PATCH to modify them or enter a new '
+                    'employee. A new employee has a unique first name, last name, birth date, and start date'}, 400
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while importing employee base'
-        logger.warning("Employees.py Post - " + error_message +
-                       ". Unable to add the following employee: "
-                       "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                       (employee['fname'] + ' ' + employee['lname'],
-                        employee['birth_date'],
-                        employee['start_date']))
+        logger.warning("Employees.py Post - %s. Unable to add the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
         return {'error_message': error_message}, 400
 
     # ADD ADDRESS
     # Use regex to check that the format is "0200 StreetAddress St., City, State 11111"
     try:
-        address = validate_address(employee['address'])
-        address_date = datetime.strptime(employee['start_date'], '%Y-%m-%d').date()  # e.g. 2017-03-28
+        address = employee['address']
+        address_date = employee['start_date']  # e.g. 2017-03-28
         session.add(Address(is_active=True, street_address=address['street_address'], city=address['city'],
                             state=address['state'], zip=address['zip'], start_date=address_date, employee=new_employee))
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while importing employee address'
-        logger.warning("Employees.py Post - " + error_message +
-                       ". Unable to add the address for the following employee: "
-                       "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                       (employee['fname'] + ' ' + employee['lname'],
-                        employee['birth_date'],
-                        employee['start_date']))
+        logger.warning("Employees.py Post - %s. Unable to add the address for the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
         return {'error_message': error_message}, 400
 
     # ADD DEPARTMENT
     try:
-        department_start_date = datetime.strptime(employee['start_date'], '%Y-%m-%d').date()  # e.g. 2017-03-28
-        session.add(Department(is_active=True, start_date=department_start_date, name=employee['department'],
+        department_start_date = employee['start_date']  # e.g. 2017-03-28
+        session.add(Department(is_active=True, start_date=department_start_date,
+                               ref=get_reference(session, DepartmentRef, employee['department']),
                                employee=new_employee))
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while importing employee department'
-        logger.warning("Employees.py Post - " + error_message +
-                       ". Unable to add the department and role for the following employee: "
-                       "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                       (employee['fname'] + ' ' + employee['lname'],
-                        employee['birth_date'],
-                        employee['start_date']))
+        logger.warning("Employees.py Post - %s. Unable to add the department and role for the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
         return {'error_message': error_message}, 400
 
     # ADD TITLE
     # Note: This should be the same as the team_start_date for POST'ing a new employee
     try:
-        session.add(Title(is_active=True, name=employee['role'], start_date=department_start_date,
-                          employee=new_employee))
+        session.add(Title(is_active=True, ref=get_reference(session, TitleRef, employee['role']),
+                          start_date=department_start_date, employee=new_employee))
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while importing employee title'
-        logger.warning("Employees.py Post - " + error_message +
-                       ". Unable to add the position title for the following employee: "
-                       "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                       (employee['fname'] + ' ' + employee['lname'],
-                        employee['birth_date'],
-                        employee['start_date']))
+        logger.warning("Employees.py Post - %s. Unable to add the position title for the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
         return {'error_message': error_message}, 400
 
     # ADD SALARY
     try:
-        session.add(Salary(is_active=True, amount=randrange(50000, 100000, 1000), employee=new_employee))
+        session.add(Salary(is_active=True, amount=randrange(50000, 100000, 1000), start_date=department_start_date,
+                           employee=new_employee))
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while importing employee salary'
-        logger.warning("Employees.py Post - " + error_message +
-                       ". Unable to add the salary for the following employee: "
-                       "Employee Name: %s, Birth Date: %s, Start Date: %s." %
-                       (employee['fname'] + ' ' + employee['lname'],
-                        employee['birth_date'],
-                        employee['start_date']))
+        logger.warning("Employees.py Post - %s. Unable to add the salary for the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
+        return {'error_message': error_message}, 400
+
+    # RECORD CHANGE
+    try:
+        session.flush()
+        employee_id = new_employee.id
+        record_changes(session, CREATE, [employee_id])
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while recording the new employee'
+        logger.warning("Employees.py Post - %s. Unable to add the following employee: "
+                       "Employee Name: %s %s, Birth Date: %s, Start Date: %s.", error_message,
+                       employee['fname'], employee['lname'], employee['birth_date'], employee['start_date'])
         return {'error_message': error_message}, 400
 
     # COMMIT & CLOSE
     session.commit()
     session.close()
 
-    return {'employee': employee}, 200
+    return {'employee': employee.body, 'employee_id': employee_id}, 200
+
+
+def _upsert(session, employee_id, employee):
+    """ Brings an employee POST found again up to date with the POST, through PATCH so the changed address,
+    department and role start new history entries
+    :param session: closed by patch
+    :param employee_id: the employee with the same fingerprint
+    :param employee: the POST payload
+    :return: the POST response
+    """
+    employee_object = session.query(Employee).get(employee_id)
+    changes = {'employee_id': employee_id}
+    if employee_object.is_active != employee['is_active']:
+        changes['is_active'] = employee['is_active']
+    address = get_active_address(employee_object)
+    if address is None or (address.street_address, address.city, address.state, address.zip) != tuple(
+            employee['address'][part] for part in ('street_address', 'city', 'state', 'zip')):
+        changes['address'] = employee.body['address']
+    department = get_active_department(employee_object)
+    if department is None or department.ref.name != employee['department']:
+        changes['department'] = employee['department']
+    title = get_active_title(employee_object)
+    if title is None or title.ref.name != employee['role']:
+        changes['role'] = employee['role']
+
+    if len(changes) > 1:
+        response = _apply_patch(load_payload('EmployeePatch', changes), None, session=session)
+        if response[1] != 200:
+            return response
+    else:
+        session.rollback()
+        session.close()
+    logger.info("Employees.py Post - employee %s already existed and was updated with %s", employee_id,
+                sorted(changes))
+    return {'employee': employee.body, 'employee_id': employee_id}, 200
 
 
 def patch(employee, session=None):
@@ -242,172 +401,185 @@ def patch(employee, session=None):
     :param employee:
     :return:
     """
+    employee = load_payload('EmployeePatch', employee)
+    if isinstance(employee, tuple):
+        return employee
+    versions = expected_versions(employee)
+    if isinstance(versions, tuple):
+        return versions
+    return _apply_patch(employee, versions, session)
+
+
+def expected_versions(employee):
+    """ The versions a PATCH may change, from the If-Match header or else the version in the body. The async app
+    runs controllers outside of a Flask request, so there only the body can carry it.
+    :param employee: the PATCH payload
+    :return: list of versions, None to change whatever version the employee has, or the error response
+    """
+    if has_request_context() and 'If-Match' in request.headers:
+        if_match = request.if_match
+        if if_match.star_tag:
+            return None
+        try:
+            return [int(tag) for tag in if_match.as_set()]
+        except ValueError:
+            error_message = 'If-Match has to hold the version of the employee, e.g. "3"'
+            logger.warning("Employees.py Patch - %s, not %s", error_message, request.headers['If-Match'])
+            return {'error_message': error_message}, 400
+    if 'version' in employee:
+        return [employee['version']]
+    return None
+
+
+def _apply_patch(employee, versions, session=None):
+    """ Changes the employee with one conditional UPDATE of their row, which also raises their version, and one
+    statement per changed history table, without loading the employee or their history first
+    :param employee: the PATCH payload
+    :param versions: see expected_versions
+    :return: the PATCH response, with the new version in the body and the ETag header
+    """
     if session is None:
         session = create_session()
+    employee_id = employee['employee_id']
+    table = Employee.__table__
 
+    # MODIFY EMPLOYEE
     try:
-        # Check if Employee exists
-        if not session.query(exists().where(Employee.id == employee['employee_id'])).scalar():
-            error_message = 'This employee does not exist in the system yet. ' \
-                           'Please use POST to add them as a new employee'
-            logger.warning("Employees.py Patch - "
-                           "The following employee does not exist in the system" +
-                           "Employee ID: {0}.".format(employee['employee_id']))
-            return {'error_message': error_message}, 400
-
-        employee_object = session.query(Employee).get(employee['employee_id'])
-
-        old_employee = 'Employee ID: %s, Name: %s, Birth Date: %s, Start Date: %s,' \
-                       ' Email: %s, Active Status: %s' \
-                       % (employee_object.id,
-                          employee_object.first_name + ' ' + employee_object.last_name,
-                          employee_object.birth_date,
-                          employee_object.start_date,
-                          employee_object.email,
-                          employee_object.is_active)
-
-        # MODIFY EMPLOYEE
-        if 'is_active' in employee:
-            employee_object.is_active = employee['is_active']
-        if 'fname' in employee:
-            employee_object.first_name = employee['fname']
-        if 'lname' in employee:
-            employee_object.last_name = employee['lname']
-        if 'email' in employee:
-            employee_object.email = employee['email']
-        if 'birth_date' in employee:
-            employee_object.birth_date = datetime.strptime(employee['birth_date'], '%Y-%m-%d').date()
-        if 'start_date' in employee:
-            employee_object.start_date = datetime.strptime(employee['start_date'], '%Y-%m-%d').date()
-
+        values = dict((column, employee[field]) for field, column in EMPLOYEE_COLUMNS if field in employee)
+        condition = table.c.id == employee_id
+        if versions is not None:
+            condition = and_(condition, table.c.version.in_(versions))
+        if any(field in employee for field in IDENTITY_FIELDS):
+            # The fingerprint needs the fields that are not changed too. The UPDATE only applies to the version
+            # they were read from, so the fingerprint cannot be computed from names someone else just changed.
+            current = session.query(Employee.first_name, Employee.last_name, Employee.email, Employee.birth_date,
+                                    Employee.start_date, Employee.version).filter(condition).first()
+            if current is not None:
+                identity = dict(zip(('first_name', 'last_name', 'email', 'birth_date', 'start_date'), current))
+                identity.update((column, value) for column, value in values.items() if column in identity)
+                values['fingerprint'] = employee_fingerprint(**identity)
+                condition = and_(table.c.id == employee_id, table.c.version == current.version)
+                versions = [current.version]
+
+        updated = session.execute(table.update().where(condition).values(version=table.c.version + 1, **values))
+        if updated.rowcount != 1:
+            current_version = session.query(Employee.version).filter(Employee.id == employee_id).scalar()
+            session.rollback()
+            if current_version is None:
+                error_message = 'This employee does not exist in the system yet. ' \
+                                'Please use POST to add them as a new employee'
+                logger.warning("Employees.py Patch - "
+                               "The following employee does not exist in the system. Employee ID: %s.", employee_id)
+                return {'error_message': error_message}, 400
+            error_message = 'This employee was changed since version %s was read, they are at version %s now. ' \
+                            'Please GET them again and repeat the change if it still applies' \
+                            % (', '.join(str(version) for version in versions), current_version)
+            logger.warning("Employees.py Patch - %s. Employee ID: %s", error_message, employee_id)
+            return {'error_message': error_message, 'version': current_version}, 409
+        if versions is not None and len(versions) == 1:
+            version = versions[0] + 1
+        else:
+            version = session.query(Employee.version).filter(Employee.id == employee_id).scalar()
+
+    except IntegrityError:
+        session.rollback()
+        error_message = 'Another employee already has this first name, last name, email, birth date, and start date'
+        logger.warning("Employees.py Patch - %s. Employee ID: %s", error_message, employee_id)
+        return {'error_message': error_message}, 400
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while modifying employee base'
         logger.warning("Employees.py Patch - "
-                       "Error while modifying the employee %s", employee['employee_id'])
+                       "Error while modifying the employee %s", employee_id)
         return {'error_message': error_message}, 400
 
     # MODIFY ADDRESS
     try:
-        if 'address' or 'address_start_date' in employee:
-            address_object = get_active_address(employee_object)
-
-            if 'address_start_date' in employee and 'address' not in employee:
-                address_object.start_date = datetime.strptime(employee['address_start_date'], '%Y-%m-%d').date()
-
-            elif 'address' in employee and 'address_start_date' not in employee:
-                address = validate_address(employee['address'])
-                address_object.is_active = False
-                now_date = datetime.strptime(str(datetime.now().year) + '-' +
-                                             str(datetime.now().month) + '-' +
-                                             str(datetime.now().day), '%Y-%m-%d').date()
-                session.add(Address(is_active=True, street_address=address['street_address'], city=address['city'],
-                                    state=address['state'], zip=address['zip'], employee=employee_object,
-                                    start_date=now_date))
-
-            elif 'address' in employee and 'address_start_date' in employee:
-                address = validate_address(employee['address'])
-                address_object.is_active = False
-                start_date = datetime.strptime(employee['address_start_date'], '%Y-%m-%d').date()
-                session.add(Address(is_active=True, street_address=address['street_address'], city=address['city'],
-                                    state=address['state'], zip=address['zip'], employee=employee_object,
-                                    start_date=start_date))
-
+        if 'address' in employee:
+            address = employee['address']
+            _change_history(session, Address, employee_id, employee.get('address_start_date'),
+                            dict((part, address[part]) for part in ('street_address', 'city', 'state', 'zip')))
+        elif 'address_start_date' in employee:
+            _change_history(session, Address, employee_id, employee['address_start_date'])
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while modifying employee address'
-        logger.warning("Employees.py Patch - " 
-                       "Error while modifying the address for the employee %s", employee['employee_id'])
+        logger.warning("Employees.py Patch - "
+                       "Error while modifying the address for the employee %s", employee_id)
         return {'error_message': error_message}, 400
 
     # MODIFY SALARY
     try:
-
         if 'salary' in employee:
-            salary_object = get_active_salary(employee_object)
-            salary_object.is_active = False
-            session.add(Salary(is_active=True, amount=employee['salary'], employee=employee_object))
+            _change_history(session, Salary, employee_id, employee.get('salary_start_date'),
+                            {'amount': employee['salary']})
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while modifying employee salary'
         logger.warning("Employees.py Patch - "
-                       "Error while modifying the salary for the employee %s", employee['employee_id'])
+                       "Error while modifying the salary for the employee %s", employee_id)
         return {'error_message': error_message}, 400
 
     # MODIFY TITLE
     try:
-        if 'role' or 'role_start_date' in employee:
-            title_object = get_active_title(employee_object)
-
-            if 'role_start_date' in employee and 'role' not in employee:
-                title_object.start_date = datetime.strptime(employee['role_start_date'], '%Y-%m-%d').date()
-
-            elif 'role' in employee and 'role_start_date' not in employee:
-                title_object.is_active = False
-                now_date = datetime.strptime(str(datetime.now().year) + '-' +
-                                             str(datetime.now().month) + '-' +
-                                             str(datetime.now().day), '%Y-%m-%d').date()
-                session.add(Title(is_active=True, name=employee['role'], start_date=now_date,
-                                  employee=employee_object))
-
-            elif 'role' in employee and 'role_start_date' in employee:
-                title_object.is_active = False
-                start_date = datetime.strptime(employee['role_start_date'], '%Y-%m-%d').date()
-                session.add(Title(is_active=True, name=employee['role'], start_date=start_date,
-                                  employee=employee_object))
-
+        if 'role' in employee:
+            _change_history(session, Title, employee_id, employee.get('role_start_date'),
+                            {'title_ref_id': get_reference(session, TitleRef, employee['role']).id})
+        elif 'role_start_date' in employee:
+            _change_history(session, Title, employee_id, employee['role_start_date'])
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while modifying employee role & title'
         logger.warning("Emplyees.py Patch - "
-                       "Error while modifying the role/title for the employee %s", employee['employee_id'])
+                       "Error while modifying the role/title for the employee %s", employee_id)
         return {'error_message': error_message}, 400
 
     # MODIFY DEPARTMENT
     try:
-        if 'department' or 'department_start_date' in employee:
-            department_object = get_active_department(employee_object)
-
-            if 'department_start_date' in employee and 'department' not in employee:
-                department_object.start_date = datetime.strptime(employee['department_start_date'], '%Y-%m-%d').date()
-
-            elif 'department' in employee and 'department_start_date' not in employee:
-                department_object.is_active = False
-                now_date = datetime.strptime(str(datetime.now().year) + '-' +
-                                             str(datetime.now().month) + '-' +
-                                             str(datetime.now().day), '%Y-%m-%d').date()
-                session.add(Department(is_active=True, name=employee['department'], start_date=now_date,
-                                       employee=employee_object))
-
-            elif 'department' in employee and 'department_start_date' in employee:
-                department_object.is_active = False
-                start_date = datetime.strptime(employee['department_start_date'], '%Y-%m-%d').date()
-                session.add(Department(is_active=True, name=employee['department'], start_date=start_date,
-                                       employee=employee_object))
-
+        if 'department' in employee:
+            _change_history(session, Department, employee_id, employee.get('department_start_date'),
+                            {'department_ref_id': get_reference(session, DepartmentRef, employee['department']).id})
+        elif 'department_start_date' in employee:
+            _change_history(session, Department, employee_id, employee['department_start_date'])
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while modifying employee department & team'
-        logger.warning("Employees.py Patch - " 
-                       "Error while modifying the department for the employee %s", employee['employee_id'])
+        logger.warning("Employees.py Patch - "
+                       "Error while modifying the department for the employee %s", employee_id)
         return {'error_message': error_message}, 400
 
-    new_employee = 'Employee ID: %s, Name: %s, Birth Date: %s, Start Date: %s,' \
-                   ' Email: %s, Active Status: %s' \
-                   % (employee_object.id,
-                      employee_object.first_name + ' ' + employee_object.last_name,
-                      employee_object.birth_date,
-                      employee_object.start_date,
-                      employee_object.email,
-                      employee_object.is_active)
+    try:
+        mark_changed(session, [employee_id])
+        record_changes(session, UPDATE, [employee_id])
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while recording the employee change'
+        logger.warning("Employees.py Patch - %s %s", error_message, employee_id)
+        return {'error_message': error_message}, 400
 
     # COMMIT & CLOSE
     session.commit()
     session.close()
 
-    logger.warning('Successfully modified an employee. Old information: '
-                   + old_employee + " New information: " + new_employee)
-    return {'new_employee': employee}, 200
+    logger.info('Successfully modified employee %s to version %s, changed: %s', employee_id, version,
+                ', '.join(sorted(field for field in employee.body if field not in ('employee_id', 'version'))))
+    return {'new_employee': employee.body, 'version': version}, 200, {'ETag': '"%s"' % version}
+
+
+def _change_history(session, model, employee_id, start_date, values=None):
+    """ Starts a new active address, salary, title or department, or moves the start of the active one
+    :param model: Address, Salary, Title or Department
+    :param start_date: when the new entry starts, None for today
+    :param values: columns of the new entry, None to only change the start date of the active entry to start_date
+    """
+    table = model.__table__
+    active = and_(table.c.employee_id == employee_id, table.c.is_active == True)
+    if values is None:
+        session.execute(table.update().where(active).values(start_date=start_date))
+        return
+    session.execute(table.update().where(active).values(is_active=False))
+    session.execute(table.insert().values(is_active=True, employee_id=employee_id,
+                                          start_date=start_date or datetime.now().date(), **values))
 
 
 def delete(employee_id, session=None):
@@ -418,25 +590,27 @@ def delete(employee_id, session=None):
     if session is None:
         session = create_session()
 
+    # The response and the log show the deleted employee, get() also answers when they do not exist
+    found = get(employee_id=[employee_id], session=session)
+    if isinstance(found, tuple):
+        return found
+    employee = found['employee_array'][0]
+
     try:
-        if not session.query(exists().where(Employee.id == employee_id)).scalar():
-            session.rollback()
-            return {'error message': 'An employee with the id of %s does not exist' % employee_id}, 400
-        employee = get(employee_id=[employee_id],session=session)['employee_array'][0]
-        session.query(Employee).filter_by(id=employee_id).delete()
+        # The database removes the history rows through their ondelete='CASCADE' foreign keys
+        session.execute(Employee.__table__.delete().where(Employee.__table__.c.id == employee_id))
+        mark_changed(session, [employee_id])
+        record_changes(session, DELETE, [employee_id])
     except SQLAlchemyError:
         session.rollback()
         error_message = "Error while deleting employee %s" % employee_id
-        logger.warning("Employees.py - " + error_message)
+        logger.warning("Employees.py - %s", error_message)
         return {'error_message': error_message}, 400
 
     # COMMIT & CLOSE
-    logger.warning("Successfully deleted the following employee: "
-                   "Employee ID: %s, Name %s, Birth Date %s, Department: %s"
-                   % (employee['employee_id'],
-                      employee['name'],
-                      datetime.strptime(str(employee['birth_date']), '%Y-%m-%d').date(),
-                      employee['department']))
+    logger.info("Successfully deleted the following employee: "
+                "Employee ID: %s, Name %s, Birth Date %s, Department: %s",
+                employee['employee_id'], employee['name'], employee['birth_date'], employee['department'])
 
     session.commit()
     session.close()
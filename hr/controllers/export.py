@@ -0,0 +1,140 @@
+""" This is the controller of the /employee/export endpoint
+
+The following functions are called from here: GET
+The roster is read with one query through a server-side cursor, BATCH_SIZE rows at a time, and written to the
+response as it is read (see helpers/export_helper.py), so exporting every employee takes the same memory as
+exporting a few.
+"""
+from flask import Response, has_request_context, request
+from sqlalchemy import and_, cast, func, literal, union_all, select, String
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_read_session, Employee, Address, Title, Department, Salary, TitleRef, \
+    DepartmentRef
+from helpers import export_helper
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+BATCH_SIZE = 1000
+ROSTER_COLUMNS = ('employee_id', 'name', 'email', 'birth_date', 'start_date', 'is_active', 'address', 'department',
+                  'role', 'team_start_date', 'salary')
+HISTORY_COLUMNS = ('employee_id', 'name', 'email', 'field', 'value', 'start_date', 'is_active')
+
+
+def get(format='csv', include_history=False, session=None):
+    """ This is the GET function that streams the whole roster as a download
+    :param format: csv or ndjson
+    :param include_history: false for a row per employee with their current details, true for a row per address,
+    title, department and salary entry each employee ever had
+    :return: the streamed response, gzip encoded when the client accepts it
+    """
+    export_format = format
+    if export_format not in export_helper.FORMATS:
+        error_message = 'The roster cannot be exported as %s' % export_format
+        logger.warning("Export.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    if session is None:
+        session = create_read_session()
+
+    try:
+        if include_history:
+            columns, rows = HISTORY_COLUMNS, iter(history_query(session).yield_per(BATCH_SIZE))
+        else:
+            columns, rows = ROSTER_COLUMNS, (roster_row(row) for row in
+                                             iter(roster_query(session).yield_per(BATCH_SIZE)))
+    except SQLAlchemyError:
+        session.rollback()
+        session.close()
+        error_message = 'Error while exporting the roster'
+        logger.warning("Export.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    chunks = export_helper.encode(_stream(session, rows), columns, export_format)
+    headers = {'Content-Disposition': 'attachment; filename="roster%s.%s"' % ('_history' if include_history else '',
+                                                                             export_format),
+               'Vary': 'Accept-Encoding'}
+    if has_request_context() and request.accept_encodings['gzip'] > 0:
+        chunks = export_helper.compress(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    logger.info("Export.py Get - Streaming the roster as %s%s", export_format,
+                ' with history' if include_history else '')
+    return Response(chunks, content_type=export_helper.FORMATS[export_format], headers=headers)
+
+
+async def get_async(format='csv', include_history=False):
+    """ The async serving mode has no streamed responses, the export is served by app.py
+    """
+    return {'error_message': 'The roster export is only served by app.py'}, 501
+
+
+def roster_query(session):
+    """
+    :return: query of every employee with their active address, department, title and salary, in id order
+    """
+    return session.query(Employee.id, Employee.first_name, Employee.last_name, Employee.email, Employee.birth_date,
+                         Employee.start_date, Employee.is_active, Address.street_address, Address.city,
+                         Address.state, Address.zip, DepartmentRef.name, TitleRef.name, Department.start_date,
+                         Salary.amount) \
+        .outerjoin(Address, and_(Address.employee_id == Employee.id, Address.is_active == True)) \
+        .outerjoin(Department, and_(Department.employee_id == Employee.id, Department.is_active == True)) \
+        .outerjoin(DepartmentRef, DepartmentRef.id == Department.department_ref_id) \
+        .outerjoin(Title, and_(Title.employee_id == Employee.id, Title.is_active == True)) \
+        .outerjoin(TitleRef, TitleRef.id == Title.title_ref_id) \
+        .outerjoin(Salary, and_(Salary.employee_id == Employee.id,
+                                # Not a plain comparison, so salaries are found by employee rather than by
+                                # scanning ix_salary_active_amount for every employee
+                                func.coalesce(Salary.is_active, False) == True)) \
+        .order_by(Employee.id)
+
+
+def roster_row(row):
+    """
+    :param row: a row of roster_query
+    :return: the values of ROSTER_COLUMNS, formatted like GET /employee formats them
+    """
+    (employee_id, first_name, last_name, email, birth_date, start_date, is_active, street_address, city, state,
+     zip_code, department, role, team_start_date, salary) = row
+    address = '%s, %s, %s %s' % (street_address, city, state, zip_code) if street_address is not None else None
+    return (employee_id, first_name + ' ' + last_name, email, birth_date, start_date, is_active, address, department,
+            role, team_start_date, salary)
+
+
+def history_query(session):
+    """
+    :return: query of every address, title, department and salary entry with the employee's id, name and email,
+    ordered by employee, field and start date
+    """
+    history = union_all(
+        select([Address.employee_id, literal('address').label('field'),
+                (Address.street_address + ', ' + Address.city + ', ' + Address.state + ' ' + Address.zip)
+                .label('value'), Address.start_date, Address.is_active]),
+        select([Title.employee_id, literal('role'), TitleRef.name, Title.start_date, Title.is_active])
+        .select_from(Title.__table__.join(TitleRef.__table__, TitleRef.id == Title.title_ref_id)),
+        select([Department.employee_id, literal('department'), DepartmentRef.name, Department.start_date,
+                Department.is_active])
+        .select_from(Department.__table__.join(DepartmentRef.__table__,
+                                               DepartmentRef.id == Department.department_ref_id)),
+        select([Salary.employee_id, literal('salary'), cast(Salary.amount, String), Salary.start_date,
+                Salary.is_active])).subquery()
+    return session.query(Employee.id, (Employee.first_name + ' ' + Employee.last_name).label('name'),
+                         Employee.email, history.c.field, history.c.value, history.c.start_date,
+                         history.c.is_active) \
+        .join(history, history.c.employee_id == Employee.id) \
+        .order_by(Employee.id, history.c.field, history.c.start_date)
+
+
+def _stream(session, rows):
+    """ Hands on the rows and closes the session once they were all sent, or the client went away
+    """
+    count = 0
+    try:
+        for row in rows:
+            count += 1
+            yield row
+    except SQLAlchemyError:
+        # The status was sent with the first chunk, all that can be done is to end the download early
+        logger.error("Export.py Get - Error while streaming the roster after %s rows", count, exc_info=True)
+    finally:
+        session.close()
+    logger.info("Export.py Get - Exported %s rows", count)
@@ -0,0 +1,108 @@
+""" This is the controller of the /employee/offboard endpoint
+
+The following functions are called from here: POST
+Employees are offboarded in chunks with set based statements, one transaction per chunk, instead of one
+request and several statements per employee.
+"""
+from sqlalchemy import and_
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, Employee, Address, Title, Department, Salary, DepartmentRef
+from helpers.cache_helper import mark_changed
+from helpers.change_feed_helper import record_changes, DELETE, DEACTIVATE
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 500
+HISTORY_MODELS = (Address, Title, Department, Salary)
+
+
+def post(offboard, session=None):
+    """ This is the POST function that deactivates or deletes many employees at once.
+    :param offboard: dictionary with either employee_ids or department, and optionally mode (deactivate or delete)
+            and chunk_size
+    :return: a report of how many employees were matched and changed
+    """
+    employee_ids = offboard.get('employee_ids')
+    department = offboard.get('department')
+    mode = offboard.get('mode', 'deactivate')
+    chunk_size = offboard.get('chunk_size', CHUNK_SIZE)
+
+    if (employee_ids is None) == (department is None):
+        error_message = 'Either employee_ids or department has to be given'
+        logger.warning("Offboard.py Post - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    if session is None:
+        session = create_session()
+
+    report = {'mode': mode, 'matched': 0, 'changed': 0, 'missing_ids': [], 'chunks': 0}
+    try:
+        if employee_ids is not None:
+            requested = sorted(set(employee_ids))
+            found = set()
+            for chunk in _chunks(requested, chunk_size):
+                found.update(row[0] for row in session.query(Employee.id).filter(Employee.id.in_(chunk)))
+            report['missing_ids'] = [e_id for e_id in requested if e_id not in found]
+            target_ids = sorted(found)
+        else:
+            target_ids = [row[0] for row in session.query(Employee.id)
+                          .join(Department, and_(Department.employee_id == Employee.id, Department.is_active == True))
+                          .join(DepartmentRef, DepartmentRef.id == Department.department_ref_id)
+                          .filter(DepartmentRef.name == department)
+                          .order_by(Employee.id)]
+        session.rollback()
+        report['matched'] = len(target_ids)
+
+        for chunk in _chunks(target_ids, chunk_size):
+            if mode == 'delete':
+                report['changed'] += _delete(session, chunk)
+                record_changes(session, DELETE, chunk)
+            else:
+                report['changed'] += _deactivate(session, chunk)
+                record_changes(session, DEACTIVATE, chunk)
+            mark_changed(session, chunk)
+            session.commit()
+            report['chunks'] += 1
+
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while offboarding employees, %s of %s were offboarded' \
+                        % (report['changed'], report['matched'])
+        logger.warning("Offboard.py Post - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    logger.info("Offboard.py Post - %s: %s employees matched, %s changed in %s chunks",
+                mode, report['matched'], report['changed'], report['chunks'])
+    return report, 200
+
+
+def _chunks(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _deactivate(session, employee_ids):
+    """ Marks the employees and their active address, title, department and salary inactive
+    :return: the number of employees that were still active
+    """
+    employee = Employee.__table__
+    changed = session.execute(employee.update()
+                              .where(and_(employee.c.id.in_(employee_ids), employee.c.is_active == True))
+                              .values(is_active=False, version=employee.c.version + 1)).rowcount
+    for model in HISTORY_MODELS:
+        history = model.__table__
+        session.execute(history.update()
+                        .where(and_(history.c.employee_id.in_(employee_ids), history.c.is_active == True))
+                        .values(is_active=False))
+    return changed
+
+
+def _delete(session, employee_ids):
+    """ Deletes the employees, the database removes their history rows through the ondelete='CASCADE' keys
+    :return: the number of employees deleted
+    """
+    employee = Employee.__table__
+    return session.execute(employee.delete().where(employee.c.id.in_(employee_ids))).rowcount
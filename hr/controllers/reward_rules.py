@@ -0,0 +1,130 @@
+""" This is the controller of the /rewards/rules endpoint
+
+The following functions are called from here: GET, POST, and PATCH.
+Every change to a rule recomputes the stored phones and orders of all employees in the same transaction, see
+helpers/rewards_helper.py.
+"""
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, RewardRule
+from helpers.payload_helper import load_payload
+from helpers.change_feed_helper import record_changes, REWARD
+from helpers.rewards_helper import store_totals
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+RULE_FIELDS = ('name', 'event_type', 'model_ids', 'counter', 'points', 'starts_on', 'ends_on', 'is_active')
+
+
+def to_dict(rule):
+    return dict(('rule_id' if field == 'id' else field, getattr(rule, field)) for field in ('id',) + RULE_FIELDS)
+
+
+def get(session=None):
+    """
+    :return: every reward rule, active or not
+    """
+    if session is None:
+        session = create_session()
+    try:
+        rules = [to_dict(rule) for rule in session.query(RewardRule).order_by(RewardRule.id)]
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while retrieving the reward rules'
+        logger.warning("Reward_rules.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+    session.close()
+    return {'rule_array': rules}
+
+
+def post(rule, session=None):
+    """ Adds a rule and recomputes every employee's totals with it
+    :param rule:
+    :return: the new rule
+    """
+    rule = load_payload('RewardRulePost', rule)
+    if isinstance(rule, tuple):
+        return rule
+    if session is None:
+        session = create_session()
+
+    new_rule = RewardRule(**dict((field, rule[field]) for field in RULE_FIELDS if field in rule))
+    error = _check(new_rule)
+    if error is not None:
+        return error
+    try:
+        session.add(new_rule)
+        session.flush()
+        _store(session)
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while adding the reward rule'
+        logger.warning("Reward_rules.py Post - %s %s", error_message, rule.body)
+        return {'error_message': error_message}, 400
+
+    response = to_dict(new_rule)
+    session.commit()
+    session.close()
+    logger.info("Reward_rules.py Post - Added reward rule %s", response)
+    return {'rule': response}, 200
+
+
+def patch(rule, session=None):
+    """ Changes a rule, e.g. ends it with ends_on, and recomputes every employee's totals
+    :param rule:
+    :return: the changed rule
+    """
+    rule = load_payload('RewardRulePatch', rule)
+    if isinstance(rule, tuple):
+        return rule
+    if session is None:
+        session = create_session()
+
+    try:
+        rule_object = session.query(RewardRule).get(rule['rule_id'])
+        if rule_object is None:
+            session.rollback()
+            error_message = 'A reward rule with the id of %s does not exist' % rule['rule_id']
+            logger.warning("Reward_rules.py Patch - %s", error_message)
+            return {'error_message': error_message}, 400
+        for field in RULE_FIELDS:
+            if field in rule:
+                setattr(rule_object, field, rule[field])
+        error = _check(rule_object)
+        if error is not None:
+            session.rollback()
+            return error
+        session.flush()
+        _store(session)
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while changing the reward rule'
+        logger.warning("Reward_rules.py Patch - %s %s", error_message, rule['rule_id'])
+        return {'error_message': error_message}, 400
+
+    response = to_dict(rule_object)
+    session.commit()
+    session.close()
+    logger.info("Reward_rules.py Patch - Changed reward rule %s", response)
+    return {'rule': response}, 200
+
+
+def _check(rule_object):
+    """
+    :return: the error response when the rule cannot be scored, otherwise None
+    """
+    error_message = None
+    if any(not model_id.strip().isdigit() for model_id in (rule_object.model_ids or '').split(',')
+             if model_id.strip()):
+        error_message = 'model_ids has to be a comma separated list of phone model ids, e.g. 2,3'
+    elif rule_object.starts_on is not None and rule_object.ends_on is not None \
+            and rule_object.ends_on <= rule_object.starts_on:
+        error_message = 'ends_on has to be after starts_on'
+    if error_message is None:
+        return None
+    logger.warning("Reward_rules.py - %s", error_message)
+    return {'error_message': error_message}, 400
+
+
+def _store(session):
+    record_changes(session, REWARD, store_totals(session)[1])
@@ -1,23 +1,26 @@
 """ This is the controller of the /rewards endpoint
 
-The following functions are called from here: GET, POST.
+The following functions are called from here: GET, POST, and GET /rewards/totals.
+post_async is the same POST for the async serving mode, see aio_app.py.
 """
+import asyncio
+from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import exists
-from databasesetup import create_session, Employee
+from sqlalchemy import exists, select
+from databasesetup import create_session, create_read_session, Employee
 from models.employee_reward_api_model import EmployeeRewardApiModel
 from models.employee_response import EmployeeResponse
-import requests
-import logging
-
-logging.basicConfig(filename='./log.txt', format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+import config
+from helpers import async_helper, http_helper, rewards_helper
+from helpers.log_helper import get_logger
+from helpers.change_feed_helper import record_changes, REWARD
+from helpers.payload_helper import load_payload
 
+logger = get_logger(__name__)
 
 def get():
-    session = create_session()
+    session = create_read_session()
     employee_collection = []
-    info = "Get Employees - Found the following employees - "
 
     try:
         if not session.query(Employee).first():
@@ -38,12 +41,12 @@ def get():
     except SQLAlchemyError:
         session.rollback()
         error_message = 'Error while retrieving all employee rewards'
-        logger.warning("Employees.py Get - " + error_message)
+        logger.warning("Rewards.py Get - %s", error_message)
         return {'error_message': error_message}, 400
 
     # CLOSE
     session.close()
-    logger.warning(info)
+    logger.info("Get Rewards - Found %s employees that can receive rewards", len(employee_collection))
     if not employee_collection:
         logger.warning("Get Employees - No employees that can receive rewards are in the system")
         return {'error message': 'No employees that can receive rewards are in the system'}, 400
@@ -56,12 +59,14 @@ def post(employee):
     :param employee:
     :return:
 
-    1. check employee exists and grab it
-    2. add information to that employee
-    3. for each id in the array check for status from manufacturing
-    4. if low/medium increment
-    5. increment by 1.
+    1. check employee exists
+    2. for each id in the array look up the phone model in manufacturing
+    3. store the order and its phones as reward events
+    4. recompute the employee's phones and orders from their events with the reward rules
     """
+    employee = load_payload('Reward', employee)
+    if isinstance(employee, tuple):
+        return employee
     session = create_session()
 
     try:
@@ -73,23 +78,22 @@ def post(employee):
                            "The employee does not exist in the system")
             return {'error_message': error_message}, 400
 
-        employee_object = session.query(Employee).get(employee['employeeId'])
         if employee['replace']:
             return {'message': 'No rewards were counted for the employee {0}'.format(employee['employeeId'])}
         else:
+            model_ids = []
             for serial_id in employee['serialIds']:
                 try:
-                    phone_payload = requests.get("http://vm343b.se.rit.edu:5000/inventory/phones/{0}".format(str(serial_id)))
+                    phone_payload = http_helper.get("{0}/phones/{1}".format(config.INVENTORY_URL, serial_id), 'inventory')
                     phone = phone_payload.json()
                 except:
                     session.rollback()
                     error_message = 'Error while information from inventory with phone_serial_id: {0}'.format(str(serial_id))
-                    logger.warning(error_message)
+                    logger.warning("rewards.py POST - %s", error_message)
                     return {'error_message': error_message}, 400
+                model_ids.append((serial_id, phone[0]['fields']['modelId']))
 
-                if phone[0]['fields']['modelId'] == 2 or phone[0]['fields']['modelId'] == 3:
-                    employee_object.phones += + 1
-            employee_object.orders += 1
+            totals = _record(session, employee, model_ids)
 
     except:
         session.rollback()
@@ -99,8 +103,114 @@ def post(employee):
         return {'error_message': error_message}, 400
 
     return_message = "Employee {0}'s count for phones has incremented now is {1} and now has {2} " \
-                     "eligible orders".format(employee['employeeId'], employee_object.phones, employee_object.orders)
+                     "eligible orders".format(employee['employeeId'], totals['phones'], totals['orders'])
 
     session.commit()
     session.close()
     return {'message': return_message}, 200
+
+
+def _record(session, employee, model_ids):
+    """ Stores the order of a POST as reward events and recomputes the employee's totals
+    :param employee: the POST payload
+    :param model_ids: list of (serial id, phone model id)
+    :return: the employee's new totals, a dictionary with the keys phones and orders
+    """
+    employee_id = employee['employeeId']
+    rewards_helper.record_sale(session, employee_id, employee['orderId'], model_ids)
+    employee_totals = rewards_helper.store_totals(session, [employee_id])[0][employee_id]
+    record_changes(session, REWARD, [employee_id])
+    return employee_totals
+
+
+def totals(start=None, end=None, session=None):
+    """ Scores the reward events of a period with the current rules, e.g. to pay out a past month again
+    :param start: first day counted (YYYY-MM-DD), none for since the first event
+    :param end: first day no longer counted (YYYY-MM-DD), none for up to now
+    :return: the phones and orders of every employee with events in the period
+    """
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start is not None else None
+        end_date = datetime.strptime(end, '%Y-%m-%d').date() if end is not None else None
+    except ValueError:
+        error_message = 'start and end have to be formatted as YYYY-MM-DD'
+        logger.warning("Rewards.py Totals - %s", error_message)
+        return {'error_message': error_message}, 400
+    if session is None:
+        session = create_read_session()
+
+    try:
+        period_totals = rewards_helper.compute_totals(session, start_date, end_date)
+        names = dict((row.id, row.first_name + ' ' + row.last_name) for row in
+                     session.query(Employee.id, Employee.first_name, Employee.last_name)
+                     .filter(Employee.id.in_(list(period_totals))))
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while computing reward totals'
+        logger.warning("Rewards.py Totals - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    session.close()
+    employee_collection = [EmployeeRewardApiModel(employee_id=employee_id, name=names.get(employee_id),
+                                                  phones=period_totals[employee_id]['phones'],
+                                                  orders=period_totals[employee_id]['orders'])
+                           for employee_id in sorted(period_totals)]
+    logger.info("Rewards.py Totals - Scored %s employees from %s to %s", len(employee_collection), start, end)
+    return EmployeeResponse(employee_collection).to_dict()
+
+
+async def post_async(employee, session=None):
+    """ post for the async serving mode. The phones are looked up in inventory at the same time and the
+    database is awaited, so a slow inventory does not hold a thread.
+    :param employee:
+    :return:
+    """
+    employee = load_payload('Reward', employee)
+    if isinstance(employee, tuple):
+        return employee
+    if session is None:
+        session = async_helper.create_session()
+
+    try:
+        if (await session.execute(select(Employee.id).where(Employee.id == employee['employeeId']))).first() is None:
+            error_message = 'This employee does not exist in the system yet. ' \
+                            'Please use employees POST to add them as a new employee'
+            logger.warning("rewards.py POST - "
+                           "The employee does not exist in the system")
+            return {'error_message': error_message}, 400
+
+        if employee['replace']:
+            return {'message': 'No rewards were counted for the employee {0}'.format(employee['employeeId'])}
+
+        phones = await asyncio.gather(*[_get_phone(serial_id) for serial_id in employee['serialIds']],
+                                      return_exceptions=True)
+        model_ids = []
+        for serial_id, phone in zip(employee['serialIds'], phones):
+            if isinstance(phone, Exception):
+                error_message = 'Error while information from inventory with phone_serial_id: {0}'.format(serial_id)
+                logger.warning("rewards.py POST - %s", error_message)
+                return {'error_message': error_message}, 400
+            model_ids.append((serial_id, phone[0]['fields']['modelId']))
+        totals = await session.run_sync(_record, employee, model_ids)
+
+        return_message = "Employee {0}'s count for phones has incremented now is {1} and now has {2} " \
+                         "eligible orders".format(employee['employeeId'], totals['phones'], totals['orders'])
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        error_message = 'Error while modifying employee base in rewards.py'
+        logger.warning("rewards.py employees POST - "
+                       "Error while modifying the employee:")
+        return {'error_message': error_message}, 400
+    finally:
+        await session.close()
+
+    return {'message': return_message}, 200
+
+
+async def _get_phone(serial_id):
+    url = "{0}/phones/{1}".format(config.INVENTORY_URL, serial_id)
+    with http_helper.circuit(url, 'inventory') as call:
+        async with async_helper.get_http().get(url) as response:
+            call.status = response.status
+            return await response.json(content_type=None)
@@ -0,0 +1,73 @@
+""" This is the controller of the server rendered /view page
+
+The roster is shown a page at a time. Each page is read with a paginated query and the rendered html for it is
+cached until an employee changes.
+"""
+from flask import render_template
+from markupsafe import Markup
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, Employee
+from helpers.cache_helper import ResultCache
+from helpers.db_object_helper import get_active_children_objects
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+PER_PAGE = 50
+MAX_PER_PAGE = 500
+
+page_cache = ResultCache('roster pages', max_entries=512)
+
+
+def get(page=1, per_page=PER_PAGE, session=None):
+    """ This is the GET function that renders one page of the roster
+    :param page: 1 based page number
+    :param per_page: employees per page
+    :return: the html of the page
+    """
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    try:
+        fragment = page_cache.get_or_create((page, per_page), lambda: render_page(page, per_page, session))
+    except SQLAlchemyError:
+        logger.warning("Roster.py Get - Error while rendering page %s of the roster", page)
+        return render_template('view2.html', roster='Error while retrieving employees'), 500
+
+    return render_template('view2.html', roster=Markup(fragment))
+
+
+def render_page(page, per_page, session=None):
+    """
+    :return: the html of the roster table and pager for one page
+    """
+    if session is None:
+        session = create_session()
+
+    try:
+        total = session.query(func.count(Employee.id)).scalar()
+        # Page through the primary key alone, then load the full rows for just that page
+        page_ids = [row[0] for row in session.query(Employee.id).order_by(Employee.id)
+                    .limit(per_page).offset((page - 1) * per_page)]
+        employee_objects = session.query(Employee).filter(Employee.id.in_(page_ids)).order_by(Employee.id).all() \
+            if page_ids else []
+        children = get_active_children_objects(session, page_ids)
+
+        rows = []
+        for employee_object in employee_objects:
+            active = children[employee_object.id]
+            rows.append({'employee_id': employee_object.id,
+                         'name': employee_object.first_name + ' ' + employee_object.last_name,
+                         'department': active['department'].name if active['department'] else '',
+                         'role': active['title'].name if active['title'] else '',
+                         'is_active': employee_object.is_active})
+    except SQLAlchemyError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    pages = max((total + per_page - 1) // per_page, 1)
+    return render_template('roster_page.html', employees=rows, page=page, pages=pages, per_page=per_page,
+                           total=total)
@@ -0,0 +1,56 @@
+""" This is the controller of the /employee/search endpoint
+
+The following functions are called from here: GET
+"""
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, Employee
+from helpers.db_object_helper import get_active_children_objects
+from helpers import search_helper
+from controllers.employees import build_employee
+from models.employee_response import EmployeeResponse
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+def get(q, page=1, per_page=PER_PAGE, session=None):
+    """ This is the GET function that will return the employees best matching a search, a page at a time.
+    :param q: text matched against the start or any part of the words in names, emails, departments and roles
+    :param page: 1 based page number
+    :param per_page: employees per page
+    :return: a set of Employee Objects with the total number of matches
+    """
+    if not search_helper.words(q):
+        error_message = 'The search %s does not contain any letters or numbers' % q
+        logger.warning("Search.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    if session is None:
+        session = create_session()
+
+    try:
+        total, page_ids = search_helper.search(session, q, (page - 1) * per_page, per_page)
+        employee_objects = dict((employee_object.id, employee_object) for employee_object in
+                                session.query(Employee).filter(Employee.id.in_(page_ids))) if page_ids else {}
+        children = get_active_children_objects(session, list(employee_objects))
+        # Kept in ranked order, an employee deleted by another process since the index was built is left out
+        employee_collection = [build_employee(employee_objects[employee_id], children[employee_id])
+                               for employee_id in page_ids if employee_id in employee_objects]
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while searching for %s' % q
+        logger.warning("Search.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    logger.info("Search Employees - %s employees match %s", total, q)
+    response = EmployeeResponse(employee_collection).to_dict()
+    response.update(total=total, page=page, per_page=per_page)
+    return response
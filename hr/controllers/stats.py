@@ -0,0 +1,138 @@
+""" This is the controller of the /stats endpoints
+
+The following functions are called from here: GET /stats/departments and GET /stats/roles
+Headcounts count every employee by their current department or role. Salary figures are over the current
+salaries of the active employees. Results are cached until an employee changes.
+"""
+from sqlalchemy import and_, or_, case, func
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, Employee, Salary, Title, Department, TitleRef, DepartmentRef
+from helpers.cache_helper import ResultCache
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+PERCENTILES = [10, 25, 75, 90]
+
+stats_cache = ResultCache('stats', max_entries=64)
+
+
+def departments(percentiles=None, session=None):
+    """ This is the GET function that will return headcount and salary statistics per department.
+    :param percentiles: salary percentiles to report, defaults to 10, 25, 75 and 90
+    :return: a set of department statistics
+    """
+    return get_statistics('department', Department, DepartmentRef, percentiles, session)
+
+
+def roles(percentiles=None, session=None):
+    """ This is the GET function that will return headcount and salary statistics per role.
+    :param percentiles: salary percentiles to report, defaults to 10, 25, 75 and 90
+    :return: a set of role statistics
+    """
+    return get_statistics('role', Title, TitleRef, percentiles, session)
+
+
+def get_statistics(key, group_model, reference_model, percentiles=None, session=None):
+    """
+    :param key: name of the group in the response, department or role
+    :param group_model: history table of the groups, Department or Title
+    :param reference_model: table of the group names, DepartmentRef or TitleRef
+    :param percentiles: salary percentiles to report
+    :return: dictionary with a <key>_array of statistics per group
+    """
+    percentiles = sorted(set(percentiles or PERCENTILES))
+    if any(percentile < 1 or percentile > 99 for percentile in percentiles):
+        error_message = 'Percentiles have to be between 1 and 99'
+        logger.warning("Stats.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+
+    try:
+        return stats_cache.get_or_create((key, tuple(percentiles)),
+                                         lambda: _compute(key, group_model, reference_model, percentiles, session))
+    except SQLAlchemyError:
+        error_message = 'Error while computing %s statistics' % key
+        logger.warning("Stats.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        if session is not None:
+            # _compute closed it already, unless the statistics came from the cache
+            session.close()
+
+
+def _compute(key, group_model, reference_model, percentiles, session=None):
+    if session is None:
+        session = create_session()
+
+    # Grouped by the integer reference key (department_ref_id or title_ref_id), the name is looked up once per group
+    group_key = getattr(group_model, reference_model.__tablename__ + '_id')
+    group = reference_model.name.label('name')
+    active_group = and_(group_model.employee_id == Employee.id, group_model.is_active == True)
+    active_salary = and_(Salary.employee_id == Employee.id, Salary.is_active == True)
+    active_amount = case([(Employee.is_active == True, Salary.amount)])
+
+    try:
+        totals = session.query(group,
+                               func.count(Employee.id),
+                               func.sum(case([(Employee.is_active == True, 1)], else_=0)),
+                               func.sum(active_amount),
+                               func.avg(active_amount)) \
+            .select_from(Employee) \
+            .outerjoin(group_model, active_group) \
+            .outerjoin(reference_model, reference_model.id == group_key) \
+            .outerjoin(Salary, active_salary) \
+            .group_by(group_key, reference_model.name) \
+            .all()
+
+        # Each active salary numbered within its group, so the median and percentiles are picked by position
+        ranked = session.query(group,
+                               Salary.amount.label('amount'),
+                               func.row_number().over(partition_by=group_key,
+                                                      order_by=Salary.amount).label('position'),
+                               func.count().over(partition_by=group_key).label('size')) \
+            .select_from(Employee) \
+            .outerjoin(group_model, active_group) \
+            .outerjoin(reference_model, reference_model.id == group_key) \
+            .join(Salary, active_salary) \
+            .filter(Employee.is_active == True) \
+            .subquery()
+
+        # The middle one or two salaries, and the nearest rank of each percentile: ceil(percentile * size / 100)
+        median = and_(2 * ranked.c.position >= ranked.c.size, 2 * ranked.c.position <= ranked.c.size + 2)
+        nearest_ranks = [and_(100 * ranked.c.position >= percentile * ranked.c.size,
+                              100 * (ranked.c.position - 1) < percentile * ranked.c.size)
+                         for percentile in percentiles]
+        picked = session.query(ranked.c.name, ranked.c.position, ranked.c.size, ranked.c.amount) \
+            .filter(or_(median, *nearest_ranks)) \
+            .all()
+    except SQLAlchemyError:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+    statistics = {}
+    for name, headcount, active, salary_sum, salary_mean in totals:
+        statistics[name] = {key: name,
+                            'headcount': headcount,
+                            'active': int(active or 0),
+                            'inactive': headcount - int(active or 0),
+                            'salary_sum': int(salary_sum or 0),
+                            'salary_mean': float(salary_mean) if salary_mean is not None else None,
+                            'salary_median': None,
+                            'salary_percentiles': dict(('p%s' % percentile, None) for percentile in percentiles)}
+
+    middles = {}
+    for name, position, size, amount in picked:
+        if size <= 2 * position <= size + 2:
+            middles.setdefault(name, []).append(amount)
+        for percentile in percentiles:
+            if 100 * position >= percentile * size > 100 * (position - 1):
+                statistics[name]['salary_percentiles']['p%s' % percentile] = amount
+    for name, amounts in middles.items():
+        statistics[name]['salary_median'] = float(sum(amounts)) / len(amounts)
+
+    # Employees without a current department or role are grouped last
+    groups = sorted(statistics.values(), key=lambda entry: (entry[key] is None, entry[key]))
+    logger.info("Stats - Computed %s statistics for %s groups", key, len(groups))
+    return {key + '_array': groups}
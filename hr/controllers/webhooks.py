@@ -0,0 +1,100 @@
+""" This is the controller of the /webhooks endpoints
+
+The following functions are called from here: GET, POST and DELETE.
+Subscribers are sent the changes made after they subscribed, see helpers/webhook_helper.py.
+"""
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from databasesetup import create_session, EmployeeChange, WebhookSubscription
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+
+def to_dict(subscription):
+    # The secret is never sent back
+    return {'subscription_id': subscription.id,
+            'url': subscription.url,
+            'is_active': subscription.is_active,
+            'last_change_id': subscription.last_change_id,
+            'created_at': subscription.created_at.isoformat() + 'Z'}
+
+
+def get(session=None):
+    """ This is the GET function that will return every webhook subscription.
+    :return: a set of subscriptions with how far each has been delivered
+    """
+    if session is None:
+        session = create_session()
+
+    try:
+        subscriptions = [to_dict(subscription) for subscription in
+                         session.query(WebhookSubscription).order_by(WebhookSubscription.id)]
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while retrieving webhook subscriptions'
+        logger.warning("Webhooks.py Get - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    return {'subscription_array': subscriptions}
+
+
+def post(subscription, session=None):
+    """ This is the POST function that subscribes a url to the employee changes made from now on.
+    :param subscription: dictionary with the url and optionally a secret to sign the requests with
+    :return: the new subscription
+    """
+    if session is None:
+        session = create_session()
+
+    try:
+        latest = session.query(func.max(EmployeeChange.id)).scalar() or 0
+        new_subscription = WebhookSubscription(url=subscription['url'], secret=subscription.get('secret'),
+                                               is_active=True, last_change_id=latest,
+                                               created_at=datetime.utcnow())
+        session.add(new_subscription)
+        session.commit()
+        response = to_dict(new_subscription)
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while adding the webhook subscription for %s' % subscription['url']
+        logger.warning("Webhooks.py Post - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    logger.info("Webhooks.py Post - Subscribed %s from change %s", response['url'], response['last_change_id'])
+    return {'subscription': response}, 200
+
+
+def delete(subscription_id, session=None):
+    """ This is the DELETE function that stops sending changes to a subscriber.
+    :param subscription_id:
+    :return: the removed subscription
+    """
+    if session is None:
+        session = create_session()
+
+    try:
+        subscription = session.query(WebhookSubscription).get(subscription_id)
+        if subscription is None:
+            session.rollback()
+            error_message = 'A webhook subscription with the id of %s does not exist' % subscription_id
+            logger.warning("Webhooks.py Delete - %s", error_message)
+            return {'error_message': error_message}, 400
+        response = to_dict(subscription)
+        session.delete(subscription)
+        session.commit()
+    except SQLAlchemyError:
+        session.rollback()
+        error_message = 'Error while deleting webhook subscription %s' % subscription_id
+        logger.warning("Webhooks.py Delete - %s", error_message)
+        return {'error_message': error_message}, 400
+    finally:
+        session.close()
+
+    logger.info("Webhooks.py Delete - Unsubscribed %s", response['url'])
+    return {'deleted_subscription': response}, 200
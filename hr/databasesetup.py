@@ -1,24 +1,68 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Date, ForeignKey
+from sqlalchemy import create_engine, event, Column, DDL, Integer, String, Boolean, Date, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker, relationship, class_mapper
-import logging
+from helpers.log_helper import get_logger
+from helpers.metrics_helper import TimedQueuePool, instrument_engine
+from helpers import query_inspector_helper, cache_helper, replica_helper
+import config
+import hashlib
 import random
 
-logging.basicConfig(filename='./log.txt', format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
-logger.info("Creating database.")
+logger.info("Creating database engine.")
 
-password_file = open("pass.txt", 'r')
-password = password_file.read().strip()
-password_file.close()
+if config.DATABASE_URL:
+    database_url = config.DATABASE_URL
+else:
+    password_file = open("pass.txt", 'r')
+    password = password_file.read().strip()
+    password_file.close()
+    database_url = 'mysql+mysqldb://root:' + password + '@localhost/343DB'
 
 file_name = "hr.myd"
-engine = create_engine('mysql+mysqldb://root:' + password + '@localhost/343DB', echo=True)
-engine.connect()
+
+
+def _create_engine(url):
+    # Pooled SQLite connections are handed to whichever thread checks them out, e.g. the webhook dispatcher's workers
+    connect_args = {'check_same_thread': False} if url.startswith('sqlite') else {}
+    new_engine = create_engine(url, echo=config.SQL_ECHO, poolclass=TimedQueuePool, connect_args=connect_args)
+    if new_engine.dialect.name == 'sqlite':
+        # SQLite only honours ondelete='CASCADE' when foreign keys are switched on for the connection
+        event.listen(new_engine, 'connect', lambda connection, record: connection.execute('PRAGMA foreign_keys=ON'))
+    instrument_engine(new_engine)
+    query_inspector_helper.instrument_engine(new_engine)
+    return new_engine
+
+
+# No connection is made here, the pool opens the first one when a request needs it
+engine = _create_engine(database_url)
+# Read-only controller paths may read from these, see create_read_session
+replica_engines = [_create_engine(url) for url in config.DATABASE_REPLICA_URLS]
 Base = declarative_base()
 
-logger.info("Database Created.")
+logger.info("Database engine created.")
+
+
+def employee_fingerprint(first_name, last_name, email, birth_date, start_date):
+    """ Identifies an employee the way POST /employee tells a new employee from one it already has
+    :param first_name:
+    :param last_name:
+    :param email: names and email are compared without case or surrounding spaces, like MySQL compares them
+    :param birth_date:
+    :param start_date: dates or datetimes, only the day counts
+    :return: 40 hexadecimal characters, as stored in the unique employee.fingerprint column
+    """
+    parts = [(value or '').strip().lower() for value in (first_name, last_name, email)]
+    parts += [str(birth_date)[:10], str(start_date)[:10]]
+    return hashlib.sha1('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _default_fingerprint(context):
+    row = context.get_current_parameters()
+    return employee_fingerprint(row.get('first_name'), row.get('last_name'), row.get('email'), row.get('birth_date'),
+                                row.get('start_date'))
 
 
 class Employee(Base):
@@ -27,11 +71,15 @@ class Employee(Base):
     is_active = Column(Boolean)
     last_name = Column(String(25))
     first_name = Column(String(25))
-    email = Column(String(50))
+    email = Column(String(50), index=True)
     birth_date = Column(Date)
     start_date = Column(Date)
     orders = Column(Integer)
     phones = Column(Integer)
+    # Unique, so a second POST of the same employee fails in the INSERT instead of needing a search first
+    fingerprint = Column(String(40), unique=True, index=True, default=_default_fingerprint)
+    # Raised by every PATCH, which only applies when the row still has the version the client read (If-Match)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     # This allows for reference to this employee's details without extra searching
     addresses = relationship("Address", back_populates="employee", cascade="all, delete-orphan", passive_deletes=True)
@@ -51,13 +99,19 @@ class Salary(Base):
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
     amount = Column(Integer)  # Will be an Integer of Cents. So for a salary of $100, the amount will be 10000
+    start_date = Column(Date)
 
     # This allows for reference to this employee's details without extra searching
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="salary")
 
+    # Answers "which salary was in effect on a date" and salary range filters with index seeks
+    __table_args__ = (Index('ix_salary_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_salary_active_amount', 'is_active', 'amount', 'employee_id'))
+
     def __repr__(self):
-        return "<Salary(id='%s', is_active='%s', amount='%s')>" % (self.id, self.is_active, self.amount)
+        return "<Salary(id='%s', is_active='%s', amount='%s', start_date='%s')>" % (self.id, self.is_active,
+                                                                                   self.amount, self.start_date)
 
     def to_str(self):
         return self.amount
@@ -77,6 +131,9 @@ class Address(Base):
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="addresses")
 
+    # Answers "which address was in effect on a date" with an index seek
+    __table_args__ = (Index('ix_address_employee_start_date', 'employee_id', 'start_date', 'id'),)
+
     def __repr__(self):
         return "<Address(id='%s', is_active='%s', employee_id='%s', street_address='%s', city='%s', state='%s', " \
                "zip='%s', start_date='%s')>" % (self.id, self.is_active, self.employee_id, self.street_address,
@@ -86,17 +143,37 @@ class Address(Base):
         return "%s, %s, %s %s" % (self.street_address, self.city, self.state, self.zip)
 
 
+class TitleRef(Base):
+    __tablename__ = 'title_ref'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(25), unique=True)
+
+    def __repr__(self):
+        return "<TitleRef(id='%s', name='%s')>" % (self.id, self.name)
+
+
 class Title(Base):
     __tablename__ = 'title'
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
-    name = Column(String(25))
     start_date = Column(Date)
 
+    # The name is kept once in title_ref, joined in whenever titles are loaded
+    title_ref_id = Column(Integer, ForeignKey(TitleRef.id))
+    ref = relationship("TitleRef", lazy='joined')
+
     # Allows for reference to the employee object without search
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="titles")
 
+    # Answers "which title was in effect on a date" and role filters with index seeks
+    __table_args__ = (Index('ix_title_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_title_ref_active', 'title_ref_id', 'is_active', 'employee_id'))
+
+    @property
+    def name(self):
+        return self.ref.name if self.ref is not None else None
+
     def __repr__(self):
         return "<Title(id='%s', employee_id='%s', is_active='%s', name='%s', " \
                "start_date='%s')>" % (self.id, self.employee_id, self.is_active, self.name, self.start_date)
@@ -105,17 +182,38 @@ class Title(Base):
         return "%s" % self.name
 
 
+class DepartmentRef(Base):
+    __tablename__ = 'department_ref'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(25), unique=True)
+    code = Column(String(25), index=True)  # The name without spaces, as used by /confirm_login
+
+    def __repr__(self):
+        return "<DepartmentRef(id='%s', name='%s', code='%s')>" % (self.id, self.name, self.code)
+
+
 class Department(Base):
     __tablename__ = 'department'
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
     start_date = Column(Date)
-    name = Column(String(25))
+
+    # The name is kept once in department_ref, joined in whenever departments are loaded
+    department_ref_id = Column(Integer, ForeignKey(DepartmentRef.id))
+    ref = relationship("DepartmentRef", lazy='joined')
 
     # Allows for reference to the employee object without search
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="departments")
 
+    # Answers "which department was in effect on a date" and department filters with index seeks
+    __table_args__ = (Index('ix_department_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_department_ref_active', 'department_ref_id', 'is_active', 'employee_id'))
+
+    @property
+    def name(self):
+        return self.ref.name if self.ref is not None else None
+
     def __repr__(self):
         return "<Department(id='%s', employee_id='%s', start_date='%s', is_active='%s', " \
                "name='%s')>" % (self.id, self.employee_id, self.start_date, self.is_active, self.name)
@@ -124,11 +222,146 @@ class Department(Base):
         return "%s" % self.name
 
 
+class EmployeeChange(Base):
+    """ The change feed: one row per employee changed by a commit, written in the same transaction as the change
+    """
+    __tablename__ = 'employee_change'
+    id = Column(Integer, primary_key=True)  # The cursor of GET /changes
+    # Not a foreign key, the change that deleted an employee has to outlive them
+    employee_id = Column(Integer)
+    operation = Column(String(10))
+    changed_at = Column(DateTime)
+
+    def __repr__(self):
+        return "<EmployeeChange(id='%s', employee_id='%s', operation='%s', changed_at='%s')>" \
+               % (self.id, self.employee_id, self.operation, self.changed_at)
+
+
+class EmployeeChangeCounter(Base):
+    """ The id of the last employee_change row, in a single row. Taking ids from it locks the row until the
+    transaction ends, so the changes are committed in id order, see helpers/change_feed_helper.py
+    """
+    __tablename__ = 'employee_change_counter'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    last_id = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return "<EmployeeChangeCounter(last_id='%s')>" % self.last_id
+
+
+# The counter starts with the table, migrations.add_employee_change_counter moves it past existing changes
+event.listen(EmployeeChangeCounter.__table__, 'after_create',
+             DDL('INSERT INTO employee_change_counter (id, last_id) VALUES (1, 0)'))
+
+
+class WebhookSubscription(Base):
+    """ A downstream service that is sent the change feed, see helpers/webhook_helper.py
+    """
+    __tablename__ = 'webhook_subscription'
+    id = Column(Integer, primary_key=True)
+    url = Column(String(255))
+    secret = Column(String(64))
+    is_active = Column(Boolean)
+    last_change_id = Column(Integer)  # The last change the subscriber accepted
+    created_at = Column(DateTime)
+
+    def __repr__(self):
+        return "<WebhookSubscription(id='%s', url='%s', is_active='%s', last_change_id='%s')>" \
+               % (self.id, self.url, self.is_active, self.last_change_id)
+
+
+class RewardRule(Base):
+    """ How reward events count, see helpers/rewards_helper.py. A rule adds points to the phones or orders of an
+    employee for every event of its event_type, and for phone events only for the listed phone models, between
+    starts_on and ends_on.
+    """
+    __tablename__ = 'reward_rule'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    event_type = Column(String(10))  # order or phone
+    model_ids = Column(String(100))  # Comma separated phone model ids, empty for every model
+    counter = Column(String(10))  # phones or orders
+    points = Column(Integer, default=1)
+    starts_on = Column(Date)  # Empty for since always
+    ends_on = Column(Date)  # Empty for until further notice, otherwise the first day the rule no longer counts
+    is_active = Column(Boolean, default=True)
+
+    def __repr__(self):
+        return "<RewardRule(id='%s', name='%s', event_type='%s', model_ids='%s', counter='%s', points='%s', " \
+               "starts_on='%s', ends_on='%s', is_active='%s')>" % (self.id, self.name, self.event_type,
+                                                                  self.model_ids, self.counter, self.points,
+                                                                  self.starts_on, self.ends_on, self.is_active)
+
+
+class RewardEvent(Base):
+    """ Something an employee was rewarded for: an order, a phone sold with it, or an adjustment that adds quantity
+    to counter directly. employee.phones and employee.orders are the totals the rules give these events.
+    """
+    __tablename__ = 'reward_event'
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
+    event_type = Column(String(10))  # order, phone or adjustment
+    order_id = Column(Integer)
+    serial_id = Column(Integer)
+    model_id = Column(Integer)
+    counter = Column(String(10))  # Only for adjustments
+    quantity = Column(Integer, default=1)
+    occurred_at = Column(DateTime, index=True)
+
+    __table_args__ = (Index('ix_reward_event_employee_id_occurred_at', 'employee_id', 'occurred_at'),)
+
+    def __repr__(self):
+        return "<RewardEvent(id='%s', employee_id='%s', event_type='%s', order_id='%s', serial_id='%s', " \
+               "model_id='%s', counter='%s', quantity='%s', occurred_at='%s')>" \
+               % (self.id, self.employee_id, self.event_type, self.order_id, self.serial_id, self.model_id,
+                  self.counter, self.quantity, self.occurred_at)
+
+
+# The rules a new database starts with, the ones rewards.post used to apply itself
+DEFAULT_REWARD_RULES = [
+    {'name': 'Rewarded phone models', 'event_type': 'phone', 'model_ids': '2,3', 'counter': 'phones', 'points': 1,
+     'is_active': True},
+    {'name': 'Every order', 'event_type': 'order', 'model_ids': '', 'counter': 'orders', 'points': 1,
+     'is_active': True},
+]
+
+# Cached pages and statistics are cleared whenever one of these is committed
+cache_helper.watch(Employee, Address, Title, Department, Salary)
+
+
 def create_session():
     return sessionmaker(bind=engine)()
 
 
-def default_info():
+def create_read_session():
+    """ A session for a controller path that only reads. It reads from a replica unless the client wrote something
+    the replicas do not have yet, see helpers/replica_helper.py. Nothing may be written through it.
+    """
+    return sessionmaker(bind=replica_helper.choose_engine(engine, replica_engines))()
+
+
+def get_reference(session, model, name):
+    """ Finds the department_ref or title_ref row of a name, adding it the first time the name is used
+    :param session:
+    :param model: DepartmentRef or TitleRef
+    :param name: e.g. Human Resources
+    :return: the reference object
+    """
+    reference = session.query(model).filter(model.name == name).first()
+    if reference is None:
+        reference = model(name=name)
+        if model is DepartmentRef:
+            reference.code = name.replace(" ", "")
+        try:
+            with session.begin_nested():
+                session.add(reference)
+        except IntegrityError:
+            # Another request added the same name first
+            reference = session.query(model).filter(model.name == name).one()
+    return reference
+
+
+def default_info(seed=343):
     Base.metadata.create_all(engine)
 
     import datetime
@@ -153,6 +386,7 @@ def default_info():
              ("Daniel", "Krutz", "Board", "Board"), ("Silva", "Matti", "Board", "Board")]
 
     employee_count = 0
+    rng = random.Random(seed)
 
     for name in names:
         email = "{0}.{1}@krutz.site".format(name[0], name[1])
@@ -189,19 +423,24 @@ def default_info():
 
         salary = 0
         if name[2] != "Board":
-            salary = random.SystemRandom().randint(50000, 100000)
+            salary = rng.randint(50000, 100000)
 
         session.add(employee)
         session.add(Address(is_active=True, street_address=str(employee_count) + " Lomb Memorial Drive", city="Rochester",
                             state="New York", zip="14623", start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Title(is_active=True, name=name[3], start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23), name=name[2],
-                    employee=employee))
-        session.add(Salary(is_active=True, amount=salary, employee=employee))
-        session.commit()
+        session.add(Title(is_active=True, ref=get_reference(session, TitleRef, name[3]),
+                          start_date=datetime.date(2017, 1, 23), employee=employee))
+        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23),
+                               ref=get_reference(session, DepartmentRef, name[2]), employee=employee))
+        session.add(Salary(is_active=True, amount=salary, start_date=datetime.date(2017, 1, 23), employee=employee))
 
         employee_count += 1
 
+    session.execute(RewardRule.__table__.insert(), DEFAULT_REWARD_RULES)
+
+    # One transaction for all of the sample data, use generate_data.py for larger data sets
+    session.commit()
+
 
 def serialize(model):
     """Transforms a model into a dictionary which can be dumped to JSON."""
@@ -210,8 +449,6 @@ def serialize(model):
     # then we return their values in a dict
     return dict((c, getattr(model, c)) for c in columns)
 
-logger.warning("Added default objects to database.")
-print("Added all objects to database.")
 
 if __name__ == "__main__":
     # Populate database if it is empty.  Set this to true to repopulate
@@ -0,0 +1,159 @@
+""" Generates synthetic employees with address, title, department and salary histories, and their reward totals.
+
+The same seed always produces the same data. Rows are built as plain dictionaries and written with executemany
+inserts in large chunks, one transaction per chunk, so no ORM objects are created.
+
+Run it from the hr directory with, for example: python generate_data.py --employees 1000000 --seed 343
+"""
+import argparse
+import datetime
+import random
+import time
+
+from sqlalchemy import func, select
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+               'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+               'Daniel', 'Nancy', 'Matthew', 'Lisa', 'Anthony', 'Laura', 'Mark', 'Melissa', 'Paul', 'Shannon']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+              'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Taylor', 'Moore', 'Jackson', 'Martin', 'Lee',
+              'Thompson', 'White', 'Harris', 'Clark', 'Lewis', 'Robinson', 'Walker', 'Young', 'King', 'Wright']
+STREETS = ['Lomb Memorial Drive', 'Jefferson Road', 'East Avenue', 'Monroe Avenue', 'Park Avenue', 'Main Street',
+           'University Avenue', 'Winton Road', 'Elmwood Avenue', 'Clinton Avenue']
+CITIES = [('Rochester', 'New York', '14623'), ('Henrietta', 'New York', '14467'), ('Pittsford', 'New York', '14534'),
+          ('Buffalo', 'New York', '14201'), ('Syracuse', 'New York', '13202'), ('Albany', 'New York', '12207')]
+DEPARTMENTS = ['Sales', 'Manufacturing', 'Inventory', 'Human Resources', 'Customer Support', 'Accounting']
+TITLES = ['Developer', 'Senior Developer', 'Manager', 'Analyst', 'Technician', 'Director', 'Associate']
+
+FIRST_START_DATE = datetime.date(1995, 1, 1)
+LAST_START_DATE = datetime.date(2017, 1, 1)
+
+
+def _next_ids(connection, models):
+    return dict((model, (connection.execute(select([func.max(model.id)])).scalar() or 0) + 1) for model in models)
+
+
+def _reference_ids(connection, model, names):
+    """ The id of every name in a department_ref or title_ref table, adding the names that are missing
+    """
+    existing = dict((row.name, row.id) for row in connection.execute(select([model.id, model.name])))
+    missing = [name for name in names if name not in existing]
+    if missing:
+        rows = [{'name': name} for name in missing]
+        if 'code' in model.__table__.c:
+            for row in rows:
+                row['code'] = row['name'].replace(' ', '')
+        connection.execute(model.__table__.insert(), rows)
+        existing = dict((row.name, row.id) for row in connection.execute(select([model.id, model.name])))
+    return existing
+
+
+def _history_dates(rng, start_date, count):
+    """ The start dates of count consecutive entries, the first on the employee's start date
+    """
+    dates = [start_date]
+    for _ in range(count - 1):
+        dates.append(dates[-1] + datetime.timedelta(days=rng.randint(90, 900)))
+    return dates
+
+
+def generate(engine, employee_count, seed=343, max_history=4, chunk_size=20000, progress=None):
+    """ Appends employee_count synthetic employees to the database behind engine
+    :param engine:
+    :param employee_count: number of employees to create
+    :param seed: seed for the random generator, the same seed creates the same employees
+    :param max_history: most entries created per employee for each history table
+    :param chunk_size: employees written per transaction
+    :param progress: optional function called with the number of employees written so far
+    :return: number of rows written
+    """
+    from databasesetup import Base, Employee, Address, Title, Department, Salary, TitleRef, DepartmentRef, \
+        RewardRule, RewardEvent, DEFAULT_REWARD_RULES
+
+    Base.metadata.create_all(engine)
+    rng = random.Random(seed)
+    span = (LAST_START_DATE - FIRST_START_DATE).days
+    models = (Employee, Address, Title, Department, Salary)
+    written = 0
+
+    with engine.begin() as connection:
+        next_id = _next_ids(connection, models)
+        title_ids = _reference_ids(connection, TitleRef, TITLES)
+        department_ids = _reference_ids(connection, DepartmentRef, DEPARTMENTS)
+        # Without rules the reward events count for nothing, like migrations.add_reward_rules a new database gets
+        # the default ones
+        if connection.execute(select([RewardRule.id]).limit(1)).first() is None:
+            connection.execute(RewardRule.__table__.insert(), DEFAULT_REWARD_RULES)
+
+    for chunk_start in range(0, employee_count, chunk_size):
+        rows = dict((model, []) for model in models)
+        events = []
+        for _ in range(min(chunk_size, employee_count - chunk_start)):
+            employee_id = next_id[Employee]
+            next_id[Employee] += 1
+            first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            start_date = FIRST_START_DATE + datetime.timedelta(days=rng.randint(0, span))
+            rows[Employee].append({
+                'id': employee_id, 'is_active': rng.random() < 0.92, 'first_name': first_name,
+                'last_name': last_name, 'email': '%s.%s.%s@krutz.site' % (first_name, last_name, employee_id),
+                'birth_date': start_date - datetime.timedelta(days=rng.randint(18 * 365, 50 * 365)),
+                'start_date': start_date, 'orders': rng.randint(0, 40), 'phones': rng.randint(0, 25)})
+            # The totals are kept as adjustment events, so recomputing them from the reward events keeps them
+            for counter in ('orders', 'phones'):
+                if rows[Employee][-1][counter]:
+                    events.append({'employee_id': employee_id, 'event_type': 'adjustment', 'counter': counter,
+                                   'quantity': rows[Employee][-1][counter],
+                                   'occurred_at': datetime.datetime.combine(start_date, datetime.time())})
+
+            for model in (Address, Title, Department, Salary):
+                dates = _history_dates(rng, start_date, rng.randint(1, max_history))
+                amount = rng.randrange(40000, 90000, 500)
+                for index, entry_date in enumerate(dates):
+                    row = {'id': next_id[model], 'employee_id': employee_id, 'is_active': index == len(dates) - 1,
+                           'start_date': entry_date}
+                    next_id[model] += 1
+                    if model is Address:
+                        city, state, zip_code = rng.choice(CITIES)
+                        row.update(street_address='%s %s' % (rng.randint(1, 9999), rng.choice(STREETS)),
+                                   city=city, state=state, zip=zip_code)
+                    elif model is Title:
+                        row['title_ref_id'] = title_ids[rng.choice(TITLES)]
+                    elif model is Department:
+                        row['department_ref_id'] = department_ids[rng.choice(DEPARTMENTS)]
+                    else:
+                        row['amount'] = amount
+                        amount += rng.randrange(1000, 8000, 500)
+                    rows[model].append(row)
+
+        with engine.begin() as connection:
+            for model in models:
+                connection.execute(model.__table__.insert(), rows[model])
+                written += len(rows[model])
+            if events:
+                connection.execute(RewardEvent.__table__.insert(), events)
+                written += len(events)
+        if progress is not None:
+            progress(chunk_start + len(rows[Employee]))
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--employees', type=int, required=True, help='number of employees to add')
+    parser.add_argument('--seed', type=int, default=343, help='the same seed always creates the same employees')
+    parser.add_argument('--max-history', type=int, default=4, help='most entries per employee and history table')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='employees written per transaction')
+    arguments = parser.parse_args()
+
+    from databasesetup import engine
+
+    start = time.time()
+    written = generate(engine, arguments.employees, arguments.seed, arguments.max_history, arguments.chunk_size,
+                       progress=lambda done: print("%s employees written" % done))
+    elapsed = time.time() - start
+    print("Wrote %s rows in %.1f s (%.0f rows per minute)" % (written, elapsed, written * 60 / elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+""" Production server settings, run from the hr directory with: gunicorn app:application
+
+The application is imported once in the master (preload_app) and forked into HR_WORKERS worker processes with
+HR_THREADS threads each. Anything that must not be shared between processes is set up again in every worker
+after the fork: the database pools, the log listener thread and the background threads of app.py.
+
+kill -HUP <master pid> replaces the workers one by one after they finish their requests. Because the code is
+preloaded, a new release needs kill -USR2 <master pid> (a new master) followed by kill -TERM of the old one.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('HR_FORKING_SERVER', 'true')
+
+# Not imported as config, gunicorn would read that name as its own config setting
+import config as hr_config
+
+bind = hr_config.BIND
+workers = hr_config.WORKERS
+threads = hr_config.THREADS
+worker_class = 'gthread'
+preload_app = True
+max_requests = hr_config.MAX_REQUESTS
+max_requests_jitter = hr_config.MAX_REQUESTS // 10  # So the workers are not all replaced at the same moment
+graceful_timeout = hr_config.GRACEFUL_TIMEOUT
+timeout = 60
+accesslog = None
+
+
+def post_fork(server, worker):
+    from databasesetup import engine, replica_engines
+    from helpers import log_helper
+    import app
+
+    # The pooled connections belong to the master, close=False leaves its sockets alone and opens new ones here
+    for database_engine in [engine] + replica_engines:
+        database_engine.dispose(close=False)
+    log_helper.restart_after_fork()
+    app.start_background_tasks()
+    server.log.info("Worker %s ready", worker.pid)
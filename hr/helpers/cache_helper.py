@@ -0,0 +1,119 @@
+""" This keeps small in-process caches of rendered or computed results and clears them when employees change
+
+Any commit that adds, changes or deletes an employee or one of their history rows clears every cache. Entries
+also expire after a short time, which bounds staleness when another worker process made the change. Other
+in-process structures can register a listener to hear which employees a commit changed.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_caches = []
+_listeners = []
+_watched_models = ()
+
+
+class ResultCache(object):
+    """ A least recently used cache of at most max_entries entries, each kept for at most ttl_seconds
+    """
+
+    def __init__(self, name, max_entries=256, ttl_seconds=60):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        _caches.append(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_create(self, key, creator):
+        """
+        :param key:
+        :param creator: function that computes the value when it is not cached
+        :return: the cached or newly computed value
+        """
+        value = self.get(key)
+        if value is None:
+            value = creator()
+            self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def invalidate_all():
+    for cache in _caches:
+        cache.clear()
+
+
+def mark_changed(session, employee_ids):
+    """ Records employees changed by Core statements, which the session events do not see, for the next commit
+    :param session:
+    :param employee_ids:
+    """
+    session.info.setdefault('hr_changed_employee_ids', set()).update(employee_ids)
+
+
+def add_listener(listener):
+    """
+    :param listener: function called after a commit with the set of changed employee ids. The set contains None
+            when a bulk statement changed rows that cannot be told apart.
+    """
+    _listeners.append(listener)
+
+
+def watch(*models):
+    """ Clears every cache after a commit that touched one of the models
+    :param models: mapped classes, e.g. Employee, Address, Title, Department, Salary
+    """
+    global _watched_models
+    _watched_models = models
+
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_bulk_update', _after_bulk)
+        event.listen(Session, 'after_bulk_delete', _after_bulk)
+
+
+def _after_flush(session, flush_context):
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(instance, _watched_models):
+            # History rows point at their employee, the employee row is the employee
+            employee_id = getattr(instance, 'employee_id', None) or instance.id
+            session.info.setdefault('hr_changed_employee_ids', set()).add(employee_id)
+
+
+def _after_bulk(update_context):
+    if issubclass(update_context.mapper.class_, _watched_models):
+        update_context.session.info.setdefault('hr_changed_employee_ids', set()).add(None)
+
+
+def _after_commit(session):
+    changed = session.info.pop('hr_changed_employee_ids', None)
+    if changed:
+        invalidate_all()
+        for listener in _listeners:
+            listener(changed)
@@ -0,0 +1,60 @@
+""" This writes and reads the employee change feed behind GET /changes
+
+Every controller that changes employees records which ones it changed, and how, in the employee_change table
+before it commits, so a change is in the feed exactly when it is in the database. Consumers keep the id of the
+last change they read and ask for the ones after it, so catching up costs the number of changes rather than the
+number of employees.
+
+Change ids are taken from the single employee_change_counter row, which stays locked until the transaction
+commits or rolls back. A transaction recording changes waits for the one before it, so changes become visible in
+id order: once a reader has seen an id, no lower id can appear later, and a rolled back transaction leaves no gap.
+"""
+from datetime import datetime
+
+from sqlalchemy import select
+
+from databasesetup import EmployeeChange, EmployeeChangeCounter
+from helpers import replica_helper
+
+CREATE, UPDATE, DELETE, DEACTIVATE, REWARD = 'create', 'update', 'delete', 'deactivate', 'reward'
+
+
+def record_changes(session, operation, employee_ids):
+    """ Adds the changes to the session's transaction, they are committed or rolled back with it
+    :param session:
+    :param operation: one of CREATE, UPDATE, DELETE, DEACTIVATE or REWARD
+    :param employee_ids: ids of the changed employees
+    """
+    if not employee_ids:
+        return
+    counter = EmployeeChangeCounter.__table__
+    # The UPDATE locks the counter row until the transaction ends, the SELECT then reads this transaction's value
+    session.execute(counter.update().where(counter.c.id == 1).values(last_id=counter.c.last_id + len(employee_ids)))
+    last_id = session.execute(select([counter.c.last_id]).where(counter.c.id == 1)).scalar()
+
+    now = datetime.utcnow()
+    first_id = last_id - len(employee_ids) + 1
+    rows = [{'id': first_id + position, 'employee_id': employee_id, 'operation': operation, 'changed_at': now}
+            for position, employee_id in enumerate(employee_ids)]
+    session.execute(EmployeeChange.__table__.insert(), rows)
+    if replica_helper.routing():
+        replica_helper.note_write(last_id)
+
+
+def read_changes(session, since=0, limit=100):
+    """
+    :param session:
+    :param since: id of the last change already read, 0 to start from the beginning
+    :param limit: most changes to return
+    :return: tuple of the changes after since in id order, and whether more changes can be read right away
+    """
+    changes = session.query(EmployeeChange).filter(EmployeeChange.id > since) \
+        .order_by(EmployeeChange.id).limit(limit + 1).all()
+    return changes[:limit], len(changes) > limit
+
+
+def serialize(change):
+    return {'change_id': change.id,
+            'employee_id': change.employee_id,
+            'operation': change.operation,
+            'changed_at': change.changed_at.isoformat() + 'Z'}
@@ -1,13 +1,16 @@
 """ This aids with grabbing appropriate "active" child objects of a particular employee
 """
+from sqlalchemy.orm import aliased
+from databasesetup import Address, Title, Department, Salary
 
 
 def get_all_children_objects(employee_object):
     """
     :param employee_object:
     :return: return dictionary of child objects with the following keys,
-            address, title, department, salary
+            address, title, department, salary. A key holds None if the employee has no active entry.
     """
+    addresses_object = title_object = department_object = salary_object = None
     for address in employee_object.addresses:
         if address.is_active:
             addresses_object = address
@@ -30,6 +33,7 @@ def get_all_children_objects(employee_object):
 
 
 def get_active_address(employee_object):
+    addresses_object = None
     for address in employee_object.addresses:
         if address.is_active:
             addresses_object = address
@@ -38,6 +42,7 @@ def get_active_address(employee_object):
 
 
 def get_active_title(employee_object):
+    title_object = None
     for title in employee_object.titles:
         if title.is_active:
             title_object = title
@@ -46,6 +51,7 @@ def get_active_title(employee_object):
 
 
 def get_active_department(employee_object):
+    department_object = None
     for department in employee_object.departments:
         if department.is_active:
             department_object = department
@@ -54,8 +60,62 @@ def get_active_department(employee_object):
 
 
 def get_active_salary(employee_object):
+    salary_object = None
     for salary in employee_object.salary:
         if salary.is_active:
             salary_object = salary
             break
     return salary_object
+
+
+def get_children_objects_as_of(session, as_of, employee_ids=None):
+    """ Rebuilds the child objects that were in effect for employees on a particular date.
+    The entry in effect is the one with the latest start date that is on or before the date. Each lookup is a
+    correlated subquery answered by the (employee_id, start_date, id) index of the history table.
+    :param session:
+    :param as_of: datetime.date to rebuild the child objects for
+    :param employee_ids: ids of the employees to look up, or None for every employee
+    :return: dictionary keyed by employee id of dictionaries with the following keys,
+            address, title, department, salary. A key holds None if the employee had no entry on that date.
+    """
+    children = {}
+    for key, model in (('address', Address), ('title', Title), ('department', Department), ('salary', Salary)):
+        for history_object in _history_as_of(session, model, as_of, employee_ids):
+            children.setdefault(history_object.employee_id,
+                                dict.fromkeys(('address', 'title', 'department', 'salary')))[key] = history_object
+
+    return children
+
+
+def _history_as_of(session, model, as_of, employee_ids):
+    history = aliased(model)
+    effective_id = session.query(history.id) \
+        .filter(history.employee_id == model.employee_id, history.start_date <= as_of) \
+        .order_by(history.start_date.desc(), history.id.desc()) \
+        .limit(1) \
+        .correlate(model) \
+        .scalar_subquery()
+
+    query = session.query(model).filter(model.id == effective_id)
+    if employee_ids is not None:
+        query = query.filter(model.employee_id.in_(employee_ids))
+    return query.all()
+
+
+def get_active_children_objects(session, employee_ids):
+    """ Loads the active child objects of many employees with one query per child table
+    :param session:
+    :param employee_ids: ids of the employees to look up
+    :return: dictionary keyed by employee id of dictionaries with the following keys,
+            address, title, department, salary
+    """
+    children = dict((employee_id, dict.fromkeys(('address', 'title', 'department', 'salary')))
+                    for employee_id in employee_ids)
+    if not children:
+        return children
+
+    for key, model in (('address', Address), ('title', Title), ('department', Department), ('salary', Salary)):
+        for child in session.query(model).filter(model.employee_id.in_(list(children)), model.is_active == True):
+            children[child.employee_id][key] = child
+
+    return children
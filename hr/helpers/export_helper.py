@@ -0,0 +1,65 @@
+""" This turns rows streamed from the database into the chunks of a CSV or NDJSON download
+
+Rows are written into a small buffer that is handed out whenever it holds CHUNK_SIZE characters, so a download
+of any size takes the memory of one chunk, and the server writes a few large chunks instead of one per row.
+compress() gzips the chunks as they pass.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+CHUNK_SIZE = 64 * 1024
+FORMATS = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return value
+
+
+def _json_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def encode(rows, columns, export_format):
+    """
+    :param rows: iterable of tuples with a value per column
+    :param columns: names of the columns, the CSV header and the NDJSON keys
+    :param export_format: csv or ndjson
+    :return: generator of utf-8 encoded chunks
+    """
+    buffer = io.StringIO()
+    if export_format == 'csv':
+        writer = csv.writer(buffer, lineterminator='\n')
+        writer.writerow(columns)
+        write = lambda row: writer.writerow([_csv_value(value) for value in row])
+    else:
+        dumps = json.JSONEncoder(ensure_ascii=False, separators=(',', ':')).encode
+        write = lambda row: buffer.write(dumps(dict(zip(columns, [_json_value(value) for value in row]))) + '\n')
+
+    for row in rows:
+        write(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def compress(chunks):
+    """
+    :param chunks: generator of bytes
+    :return: generator of the gzip compressed bytes, one gzip member in all
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
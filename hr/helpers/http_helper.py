@@ -0,0 +1,259 @@
+""" This is the one client every controller and script calls other services through
+
+All calls share a requests session that keeps a pool of open connections per host, and every call has a connect
+and a read timeout. Idempotent calls that fail on the way, time out or get a RETRY_STATUSES answer are retried a
+few times after a short, jittered pause. Each host has a circuit breaker: after config.HTTP_BREAKER_FAILURES
+failed calls in a row it refuses calls to that host for config.HTTP_BREAKER_RESET_SECONDS, then lets a single
+call through to find out whether the host is back. A host that is down therefore costs one timeout, not one per
+request, and no threads pile up waiting on it.
+
+Calls are timed per target in hr_outbound_request_duration_seconds, with the outcome ok, error or refused.
+The async serving mode sends its calls through aiohttp but shares the breakers, see circuit().
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib.parse import urlsplit
+from urllib3.exceptions import NewConnectionError
+
+import config
+from helpers.log_helper import get_logger
+from helpers.metrics_helper import OUTBOUND_SECONDS, OUTBOUND_RETRIES, OUTBOUND_CIRCUIT_OPENS
+
+logger = get_logger(__name__)
+
+RETRY_STATUSES = (502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+_session = None
+_breakers = {}
+_lock = threading.Lock()
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """ Raised instead of calling a host whose circuit breaker is open
+    """
+
+
+class CircuitBreaker(object):
+    """ Counts the failed calls to one host in a row and refuses calls while the host looks down
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failures, reset_seconds, clock=time.monotonic):
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        :return: whether a call may be made now. Once the breaker was open long enough a single trial call is
+        allowed, its outcome closes or opens the breaker again.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def retry_after(self):
+        """
+        :return: seconds until a trial call is allowed
+        """
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0
+            return max(0, self.reset_seconds - (self.clock() - self.opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        """
+        :return: whether this failure opened the breaker
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and
+                                                self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+                return True
+            return False
+
+
+def get_breaker(url):
+    """
+    :param url: any url of the host
+    :return: the circuit breaker of the host
+    """
+    host = urlsplit(url).netloc
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(host, CircuitBreaker(config.HTTP_BREAKER_FAILURES,
+                                                                config.HTTP_BREAKER_RESET_SECONDS))
+    return breaker
+
+
+def get_session():
+    """
+    :return: the requests session shared by every call, created on first use so each worker process has its own
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                # Retries are made by request() so they can respect the breaker and add jitter
+                adapter = HTTPAdapter(pool_connections=config.HTTP_POOL_HOSTS, pool_maxsize=config.HTTP_POOL_SIZE,
+                                      max_retries=0)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def reset():
+    """ Forgets the session and every breaker, e.g. between tests
+    """
+    global _session
+    with _lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _breakers.clear()
+
+
+def _refused(url, target, breaker):
+    logger.warning("http_helper.py - %s (%s) is failing, calls are refused for %.0f s", target,
+                   urlsplit(url).netloc, breaker.retry_after())
+    return CircuitOpenError('%s is unavailable, calls are refused for %.0f s' % (target, breaker.retry_after()))
+
+
+def _record(breaker, failed, url, target):
+    if not failed:
+        breaker.record_success()
+    elif breaker.record_failure():
+        OUTBOUND_CIRCUIT_OPENS.inc(target)
+        logger.warning("http_helper.py - Opened the circuit of %s (%s) for %s s", target, urlsplit(url).netloc,
+                       config.HTTP_BREAKER_RESET_SECONDS)
+
+
+def _pause(attempt):
+    """ Full jitter: a random pause of up to HTTP_RETRY_BACKOFF_SECONDS * 2 ** attempt
+    """
+    time.sleep(random.uniform(0, config.HTTP_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def request(method, url, target, retries=None, timeout=None, idempotent=None, **kwargs):
+    """
+    :param method: e.g. GET
+    :param url:
+    :param target: short name of the other service for the metrics and the log, e.g. inventory
+    :param retries: times a failed call is retried, defaults to config.HTTP_RETRIES
+    :param timeout: seconds, or a (connect, read) tuple, defaults to the configured timeouts
+    :param idempotent: whether the call can safely be made twice, defaults to True for GET, PUT, DELETE, HEAD and
+    OPTIONS. Other calls are only retried when the connection could not be made.
+    :param kwargs: passed on to requests, e.g. data, json, headers
+    :return: the requests Response of the last attempt
+    :raise requests.RequestException: when every attempt failed, CircuitOpenError when the host is refused
+    """
+    method = method.upper()
+    if retries is None:
+        retries = config.HTTP_RETRIES
+    if timeout is None:
+        timeout = (config.HTTP_CONNECT_TIMEOUT_SECONDS, config.HTTP_READ_TIMEOUT_SECONDS)
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    breaker = get_breaker(url)
+    session = get_session()
+
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            OUTBOUND_SECONDS.observe(0, target, 'refused')
+            raise _refused(url, target, breaker)
+        start = time.time()
+        try:
+            response = session.request(method, url, timeout=timeout, **kwargs)
+        except requests.RequestException as error:
+            OUTBOUND_SECONDS.observe(time.time() - start, target, 'error')
+            _record(breaker, True, url, target)
+            retryable = idempotent or _not_sent(error)
+            if not retryable or attempt >= retries:
+                raise
+            logger.info("http_helper.py - %s %s failed (%s), retrying", method, target, error)
+        else:
+            failed = response.status_code >= 500
+            OUTBOUND_SECONDS.observe(time.time() - start, target, 'error' if failed else 'ok')
+            _record(breaker, failed, url, target)
+            if not (idempotent and response.status_code in RETRY_STATUSES) or attempt >= retries:
+                return response
+            logger.info("http_helper.py - %s %s answered %s, retrying", method, target, response.status_code)
+        OUTBOUND_RETRIES.inc(target)
+        _pause(attempt)
+        attempt += 1
+
+
+def _not_sent(error):
+    """
+    :param error: the requests exception of a failed call
+    :return: whether the connection could not be made, so the service cannot have acted on the call
+    """
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    # A refused connection or an unknown host, which requests wraps in a MaxRetryError
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def get(url, target, **kwargs):
+    return request('GET', url, target, **kwargs)
+
+
+def post(url, target, **kwargs):
+    return request('POST', url, target, **kwargs)
+
+
+class _Call(object):
+    __slots__ = ('status',)
+
+    def __init__(self):
+        self.status = None
+
+
+@contextmanager
+def circuit(url, target):
+    """ Guards a call made with another client, e.g. aiohttp, with the breaker of the host and times it:
+        with circuit(url, 'inventory') as call:
+            async with http.get(url) as response:
+                call.status = response.status
+    An exception or a status of 500 or more counts as a failed call.
+    :raise CircuitOpenError: when the host is refused
+    """
+    breaker = get_breaker(url)
+    if not breaker.allow():
+        OUTBOUND_SECONDS.observe(0, target, 'refused')
+        raise _refused(url, target, breaker)
+    call = _Call()
+    start = time.time()
+    failed = True
+    try:
+        yield call
+        failed = call.status is not None and call.status >= 500
+    finally:
+        OUTBOUND_SECONDS.observe(time.time() - start, target, 'error' if failed else 'ok')
+        _record(breaker, failed, url, target)
@@ -0,0 +1,108 @@
+""" This sets up logging for every module of the application
+
+Log calls on the request path only put the record on a queue. A background listener thread formats the
+records as JSON lines and writes them to a rotating log file.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+from datetime import datetime
+
+import config
+
+_listener = None
+_queue_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """ Formats a record as a single JSON object per line
+    """
+
+    def format(self, record):
+        entry = {'time': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+                 'level': record.levelname,
+                 'logger': record.name,
+                 'message': record.getMessage()}
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """ Puts records on the queue without formatting them, so the message is only built by the listener thread
+    """
+
+    def prepare(self, record):
+        # A traceback can change once the caller moves on, so it is the only thing rendered up front
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _create_file_handler():
+    if config.LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(config.LOG_FILE, when=config.LOG_ROTATE_WHEN,
+                                                         backupCount=config.LOG_BACKUP_COUNT)
+    return logging.handlers.RotatingFileHandler(config.LOG_FILE, maxBytes=config.LOG_MAX_BYTES,
+                                                backupCount=config.LOG_BACKUP_COUNT)
+
+
+def configure_logging():
+    """ Attaches the queue handler to the root logger and starts the listener thread. Only the first call does
+    anything, so every module can call this when it is imported.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    file_handler = _create_file_handler()
+    file_handler.setFormatter(JsonFormatter())
+
+    record_queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(record_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    _queue_handler = DeferredQueueHandler(record_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(config.LOG_LEVEL)
+    for module, level in config.LOG_LEVELS.items():
+        logging.getLogger(module).setLevel(level)
+
+
+def stop_logging():
+    """ Writes out anything still on the queue and stops the listener thread
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+
+def restart_after_fork():
+    """ Gives a forked worker process its own queue and listener thread. The listener started before the fork
+    does not run in the child, so records queued there would never be written.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+    _listener = None
+    _queue_handler = None
+    configure_logging()
+
+
+def get_logger(name):
+    """
+    :param name: usually __name__ of the calling module
+    :return: a logger that writes through the shared queue
+    """
+    configure_logging()
+    return logging.getLogger(name)
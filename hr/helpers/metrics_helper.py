@@ -0,0 +1,191 @@
+""" This collects latency and query metrics and renders them in the Prometheus text format for /metrics
+
+Recording only touches a few counters under a lock. Nothing is formatted until /metrics is scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+_request_state = threading.local()
+
+
+class Counter(object):
+    """ A value per set of label values that only goes up
+    """
+
+    def __init__(self, name, description, label_names=()):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s counter' % self.name]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append('%s%s %s' % (self.name, _labels(self.label_names, label_values), value))
+        return lines
+
+
+class Histogram(object):
+    """ Counts observations into buckets per set of label values
+    """
+
+    def __init__(self, name, description, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # One slot per bucket plus one for +Inf, then the sum of the observations
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description), '# TYPE %s histogram' % self.name]
+        with self._lock:
+            all_series = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        for label_values, series in all_series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append('%s_bucket%s %s' % (self.name, _labels(self.label_names + ('le',),
+                                                                    label_values + (bound,)), cumulative))
+            labels = _labels(self.label_names, label_values)
+            lines.append('%s_sum%s %s' % (self.name, labels, series[-1]))
+            lines.append('%s_count%s %s' % (self.name, labels, cumulative))
+        return lines
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    pairs = ('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+             for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+REQUEST_SECONDS = Histogram('hr_request_duration_seconds', 'Time spent handling a request',
+                            ('operation', 'method', 'status'))
+REQUEST_SQL_STATEMENTS = Histogram('hr_request_sql_statements', 'SQL statements executed per request',
+                                   ('operation',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('hr_request_sql_duration_seconds', 'Time spent in SQL per request', ('operation',))
+SQL_STATEMENTS = Counter('hr_sql_statements_total', 'SQL statements executed')
+SQL_SECONDS = Histogram('hr_sql_statement_duration_seconds', 'Time spent executing a single SQL statement')
+POOL_CHECKOUT_SECONDS = Histogram('hr_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled connection')
+OUTBOUND_SECONDS = Histogram('hr_outbound_request_duration_seconds', 'Time spent calling other services',
+                             ('target', 'outcome'))
+OUTBOUND_RETRIES = Counter('hr_outbound_retries_total', 'Calls to other services made again after a failure',
+                           ('target',))
+OUTBOUND_CIRCUIT_OPENS = Counter('hr_outbound_circuit_opens_total',
+                                 'Times calls to another service started being refused', ('target',))
+DB_READS = Counter('hr_db_reads_total', 'Read-only sessions by the database they read from', ('target',))
+
+ALL_METRICS = [REQUEST_SECONDS, REQUEST_SQL_STATEMENTS, REQUEST_SQL_SECONDS, SQL_STATEMENTS, SQL_SECONDS,
+               POOL_CHECKOUT_SECONDS, OUTBOUND_SECONDS, OUTBOUND_RETRIES, OUTBOUND_CIRCUIT_OPENS, DB_READS]
+
+
+def render():
+    """
+    :return: every metric in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in ALL_METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+class TimedQueuePool(QueuePool):
+    """ A QueuePool that records how long each checkout waited for a connection
+    """
+
+    def _do_get(self):
+        start = time.time()
+        try:
+            return QueuePool._do_get(self)
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.time() - start)
+
+
+def instrument_engine(engine):
+    """ Counts and times every statement the engine executes, both overall and for the current request
+    :param engine:
+    """
+    # The start is kept on the statement's execution context, so a statement that fails leaves nothing behind
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context.hr_statement_start = time.time()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        start = getattr(context, 'hr_statement_start', None)
+        if start is None:
+            return
+        elapsed = time.time() - start
+        SQL_STATEMENTS.inc()
+        SQL_SECONDS.observe(elapsed)
+        state = getattr(_request_state, 'sql', None)
+        if state is not None:
+            state[0] += 1
+            state[1] += elapsed
+
+
+@contextmanager
+def time_outbound(target):
+    """ Times a call to another service, e.g. with time_outbound('inventory'): requests.get(...)
+    :param target: short name of the other service
+    """
+    start = time.time()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        OUTBOUND_SECONDS.observe(time.time() - start, target, outcome)
+
+
+def init_app(flask_app):
+    """ Records the latency and SQL usage of every request handled by the flask app
+    :param flask_app:
+    """
+    from flask import request
+
+    @flask_app.before_request
+    def start_request():
+        _request_state.start = time.time()
+        _request_state.sql = [0, 0.0]
+
+    @flask_app.after_request
+    def finish_request(response):
+        start = getattr(_request_state, 'start', None)
+        if start is not None:
+            # Connexion names endpoints "<blueprint>.<operation id>", only the operation is interesting
+            operation = (request.endpoint or 'unknown').rsplit('.', 1)[-1]
+            REQUEST_SECONDS.observe(time.time() - start, operation, request.method, response.status_code)
+            REQUEST_SQL_STATEMENTS.observe(_request_state.sql[0], operation)
+            REQUEST_SQL_SECONDS.observe(_request_state.sql[1], operation)
+            _request_state.start = None
+            _request_state.sql = None
+        return response
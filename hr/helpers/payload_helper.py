@@ -0,0 +1,286 @@
+""" This checks request bodies against the swagger definitions with functions compiled once per schema
+
+compile_schema turns a schema into nested closures that test each keyword directly, instead of walking the schema
+with jsonschema on every request. The same pass normalizes the body: format: date strings become datetime.date and
+format: address strings are split into street_address, city, state and zip. Schemas with a keyword the compiler
+does not know are left to jsonschema.
+
+CompiledBodyValidator puts the compiled functions in front of every operation (validator_map in app.py), and the
+controllers call load_payload() for the Payload they work with. Under Flask the validator keeps the Payload it
+built on flask.g, so load_payload() hands it out instead of checking and parsing the body a second time.
+"""
+import os
+import re
+import threading
+from datetime import date
+
+from connexion.decorators.validation import RequestBodyValidator
+from connexion.exceptions import BadRequestProblem
+from flask import g, has_app_context
+
+from helpers.log_helper import get_logger
+from helpers.regex_helper import parse_address
+
+logger = get_logger(__name__)
+
+SPEC_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'specs', 'swagger.yaml')
+
+# Keywords that only document the schema, and the definitions connexion copies into body schemas after it
+# resolved the references to them
+_IGNORED = frozenset(('description', 'example', 'title', 'default', 'readOnly', 'x-nullable', 'definitions'))
+
+_definitions = None
+_validators = {}
+_lock = threading.Lock()
+
+
+class PayloadError(Exception):
+    """ Raised when a body does not match its schema
+    """
+
+
+class Payload(object):
+    """ A body that matched its definition. Indexing gives the normalized values, body is the body as it was sent
+    """
+    __slots__ = ('body', 'values')
+
+    def __init__(self, body, values):
+        self.body = body
+        self.values = values
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+    def __contains__(self, name):
+        return name in self.values
+
+    def get(self, name, default=None):
+        return self.values.get(name, default)
+
+
+def _path(path):
+    return " - '%s'" % '.'.join(str(part) for part in path) if path else ''
+
+
+def _parse_date(value):
+    # fromisoformat also takes forms such as 20170328 on newer Pythons, the API only accepts 2017-03-28
+    if len(value) != 10 or value[4] != '-' or value[7] != '-':
+        raise ValueError(value)
+    return date.fromisoformat(value)
+
+
+def _parse_address(value):
+    components = parse_address(value)
+    if components is None:
+        raise ValueError(value)
+    return components
+
+
+FORMATS = {'date': _parse_date, 'address': _parse_address}
+
+_TYPES = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: isinstance(value, bool),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+}
+
+# keyword: (the values it applies to, what is compared with its bound, the error)
+_LIMITS = {
+    'minimum': (_TYPES['number'], lambda value: value, "%r is less than the minimum of %r%s"),
+    'maximum': (_TYPES['number'], lambda value: value, "%r is greater than the maximum of %r%s"),
+    'minLength': (_TYPES['string'], len, "%r is shorter than %r characters%s"),
+    'maxLength': (_TYPES['string'], len, "%r is longer than %r characters%s"),
+    'minItems': (_TYPES['array'], len, "%r has fewer than %r items%s"),
+    'maxItems': (_TYPES['array'], len, "%r has more than %r items%s"),
+}
+
+
+def _compile(schema, path):
+    """
+    :return: a function taking a value and returning its normalized value, or None when the schema has a keyword
+    that is not handled here
+    """
+    unknown = set(schema) - _IGNORED - set(_LIMITS) - {'type', 'format', 'enum', 'pattern', 'items',
+                                                             'properties', 'required'}
+    if unknown or schema.get('format', 'date') not in FORMATS or schema.get('type', 'object') not in _TYPES:
+        return None
+
+    checks = []
+    if 'type' in schema:
+        is_type, type_name = _TYPES[schema['type']], schema['type']
+
+        def check_type(value):
+            if not is_type(value):
+                raise PayloadError("%r is not of type %r%s" % (value, type_name, _path(path)))
+        checks.append(check_type)
+    if 'enum' in schema:
+        allowed = schema['enum']
+
+        def check_enum(value):
+            if value not in allowed:
+                raise PayloadError("%r is not one of %r%s" % (value, allowed, _path(path)))
+        checks.append(check_enum)
+    for keyword, (applies, measure, message) in _LIMITS.items():
+        if keyword in schema:
+            checks.append(_limit(schema[keyword], keyword.startswith('min'), applies, measure, message, path))
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+
+        def check_pattern(value):
+            if isinstance(value, str) and not pattern.search(value):
+                raise PayloadError("%r does not match %r%s" % (value, pattern.pattern, _path(path)))
+        checks.append(check_pattern)
+
+    items = properties = None
+    if 'items' in schema:
+        items = _compile(schema['items'], path + ['[]'])
+        if items is None:
+            return None
+    if 'properties' in schema:
+        properties = []
+        for name, property_schema in schema['properties'].items():
+            compiled = _compile(property_schema, path + [name])
+            if compiled is None:
+                return None
+            properties.append((name, compiled))
+    required = tuple(schema.get('required', ()))
+    parse = FORMATS.get(schema.get('format'))
+    format_name = schema.get('format')
+
+    def check(value):
+        for single_check in checks:
+            single_check(value)
+        if isinstance(value, dict):
+            for name in required:
+                if name not in value:
+                    raise PayloadError("%r is a required property%s" % (name, _path(path)))
+            if properties:
+                value = dict(value)
+                for name, compiled_property in properties:
+                    if name in value:
+                        value[name] = compiled_property(value[name])
+        elif items is not None and isinstance(value, list):
+            value = [items(item) for item in value]
+        elif parse is not None and isinstance(value, str):
+            try:
+                value = parse(value)
+            except ValueError:
+                raise PayloadError("%r is not a %r%s" % (value, format_name, _path(path)))
+        return value
+    return check
+
+
+def _limit(bound, is_minimum, applies, measure, message, path):
+    def check_limit(value):
+        if applies(value):
+            size = measure(value)
+            if size < bound if is_minimum else size > bound:
+                raise PayloadError(message % (value, bound, _path(path)))
+    return check_limit
+
+
+def compile_schema(schema):
+    """
+    :param schema: a swagger schema with its references resolved
+    :return: a function that returns the normalized body or raises PayloadError, or None when the schema needs
+    jsonschema
+    """
+    return _compile(schema, [])
+
+
+def _load_definitions():
+    from connexion.json_schema import resolve_refs
+    from helpers import spec_helper
+
+    with open(SPEC_FILE, 'rb') as spec_file:
+        return resolve_refs(spec_helper.parse(spec_file.read()))['definitions']
+
+
+def init_api(api=None):
+    """ Compiles the definitions of the API, so the first requests do not pay for it
+    :param api: as returned by add_api, None reads the definitions from swagger.yaml (the aiohttp app does not
+    hand out its API)
+    """
+    global _definitions
+    definitions = api.specification['definitions'] if api is not None else _load_definitions()
+    with _lock:
+        _definitions = definitions
+        _validators.clear()
+    for name in definitions:
+        get_validator(name)
+
+
+def get_validator(definition):
+    """
+    :param definition: name of a swagger definition, e.g. EmployeePost
+    :return: the compiled function of the definition
+    """
+    compiled = _validators.get(definition)
+    if compiled is None:
+        global _definitions
+        with _lock:
+            if _definitions is None:
+                # Controllers called without the app, e.g. from a script or a test
+                _definitions = _load_definitions()
+            compiled = _validators[definition] = compile_schema(_definitions[definition]) or _fallback(
+                _definitions[definition])
+    return compiled
+
+
+def _fallback(schema):
+    from jsonschema import Draft4Validator, ValidationError, draft4_format_checker
+
+    schema_validator = Draft4Validator(schema, format_checker=draft4_format_checker)
+
+    def check(value):
+        try:
+            schema_validator.validate(value)
+        except ValidationError as e:
+            raise PayloadError(e.message)
+        return value
+    return check
+
+
+def load_payload(definition, body):
+    """ Checks and normalizes a request body
+    :param definition: name of the swagger definition of the body, e.g. EmployeePost
+    :param body: the body as connexion passed it to the controller
+    :return: the Payload, or the error response when the body does not match the definition
+    """
+    if isinstance(body, Payload):
+        return body
+    if has_app_context():
+        payload = g.pop('hr_payload', None)
+        # Only the body CompiledBodyValidator checked, connexion passes the controller that same object
+        if payload is not None and payload.body is body:
+            return payload
+    try:
+        return Payload(body, get_validator(definition)(body))
+    except PayloadError as e:
+        logger.warning("payload_helper.py Load - %s: %s", definition, e)
+        return {'error_message': str(e)}, 400
+
+
+class CompiledBodyValidator(RequestBodyValidator):
+    """ connexion's body validator, checking with the compiled function of the schema when there is one
+    """
+
+    def __init__(self, schema, consumes, api, is_null_value_valid=False, validator=None, strict_validation=False):
+        RequestBodyValidator.__init__(self, schema, consumes, api, is_null_value_valid=is_null_value_valid,
+                                      validator=validator, strict_validation=strict_validation)
+        self.compiled = compile_schema(schema)
+
+    def validate_schema(self, data, url):
+        if self.compiled is None or (self.is_null_value_valid and data is None):
+            return RequestBodyValidator.validate_schema(self, data, url)
+        try:
+            payload = Payload(data, self.compiled(data))
+        except PayloadError as e:
+            logger.warning("payload_helper.py Validate - %s validation error: %s", url, e)
+            raise BadRequestProblem(detail=str(e))
+        if has_app_context():
+            g.hr_payload = payload
+        return None
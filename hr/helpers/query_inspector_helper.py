@@ -0,0 +1,172 @@
+""" This finds N+1 query patterns and slow statements while a request or a test runs
+
+Statements are grouped by their shape, which is the SQL with literals and IN lists replaced by placeholders.
+A shape executed more often than the repeat threshold, or a statement slower than the slow limit, is reported
+along with the controller line that caused it. The inspector is opt-in through HR_QUERY_INSPECTOR; tests can use
+inspect_queries(strict=True) to fail when a pattern is found.
+"""
+import re
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import config
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+_current = threading.local()
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*\?\s*,)*\s*\?\s*\)', re.IGNORECASE)
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s|:\w+|\?')
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryInspectionError(Exception):
+    """ Raised in strict mode when an inspection finds repeated or slow statements
+    """
+
+    def __init__(self, findings):
+        self.findings = findings
+        Exception.__init__(self, '\n'.join(findings))
+
+
+def normalize(statement):
+    """
+    :param statement: SQL text as sent to the database
+    :return: the shape of the statement, e.g. "SELECT ... WHERE employee.id = ?"
+    """
+    shape = _STRING_LITERAL.sub('?', statement)
+    shape = _PLACEHOLDER.sub('?', shape)
+    shape = _NUMBER_LITERAL.sub('?', shape)
+    shape = _IN_LIST.sub('IN (?...)', shape)
+    return _WHITESPACE.sub(' ', shape).strip()
+
+
+def _origin():
+    """ Finds the controller line that led to the statement, or failing that the closest application frame
+    """
+    frames = traceback.extract_stack()[:-3]
+    for filename, line_number, function, _ in reversed(frames):
+        if '/controllers/' in filename.replace('\\', '/'):
+            return '%s:%s in %s' % (filename, line_number, function)
+    for filename, line_number, function, _ in reversed(frames):
+        path = filename.replace('\\', '/')
+        if '/sqlalchemy/' not in path and not path.endswith('query_inspector_helper.py'):
+            return '%s:%s in %s' % (filename, line_number, function)
+    return 'unknown'
+
+
+class QueryInspection(object):
+    """ The statements executed during a single request or test
+    """
+
+    def __init__(self, name, repeat_threshold=None, slow_seconds=None):
+        self.name = name
+        self.repeat_threshold = config.QUERY_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        self.slow_seconds = config.SLOW_QUERY_SECONDS if slow_seconds is None else slow_seconds
+        self.shapes = {}
+        self.slow = []
+
+    def record(self, statement, elapsed):
+        shape = normalize(statement)
+        seen = self.shapes.get(shape)
+        if seen is None:
+            self.shapes[shape] = seen = {'count': 0, 'seconds': 0.0, 'origin': _origin()}
+        seen['count'] += 1
+        seen['seconds'] += elapsed
+        if elapsed >= self.slow_seconds:
+            self.slow.append((elapsed, shape, _origin()))
+
+    def findings(self):
+        """
+        :return: a readable line for every repeated shape and slow statement
+        """
+        findings = []
+        for shape, seen in sorted(self.shapes.items(), key=lambda item: -item[1]['count']):
+            if seen['count'] > self.repeat_threshold:
+                findings.append('%s: statement repeated %s times (%.1f ms total) from %s: %s'
+                                % (self.name, seen['count'], seen['seconds'] * 1000, seen['origin'], shape))
+        for elapsed, shape, origin in self.slow:
+            findings.append('%s: slow statement took %.1f ms from %s: %s' % (self.name, elapsed * 1000, origin, shape))
+        return findings
+
+
+def start(name, repeat_threshold=None, slow_seconds=None):
+    _current.inspection = QueryInspection(name, repeat_threshold, slow_seconds)
+    return _current.inspection
+
+
+def finish(strict=None):
+    """ Ends the inspection for this thread and reports what it found
+    :param strict: raise QueryInspectionError when something is found, defaults to HR_QUERY_INSPECTOR_STRICT
+    :return: the findings
+    """
+    inspection = getattr(_current, 'inspection', None)
+    _current.inspection = None
+    if inspection is None:
+        return []
+
+    findings = inspection.findings()
+    for finding in findings:
+        logger.warning("Query inspector - %s", finding)
+    if findings and (config.QUERY_INSPECTOR_STRICT if strict is None else strict):
+        raise QueryInspectionError(findings)
+    return findings
+
+
+@contextmanager
+def inspect_queries(name='inspection', strict=True, repeat_threshold=None, slow_seconds=None):
+    """ Inspects the statements executed inside the block, e.g. in a test:
+        with inspect_queries('employees.get'):
+            employees.get(session=session)
+    """
+    inspection = start(name, repeat_threshold, slow_seconds)
+    try:
+        yield inspection
+    except Exception:
+        _current.inspection = None
+        raise
+    finish(strict)
+
+
+def instrument_engine(engine):
+    """ Feeds the statements of the engine to the inspection running on the current thread, if there is one
+    :param engine:
+    """
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, so a statement that fails leaves nothing behind
+        if context is not None and getattr(_current, 'inspection', None) is not None:
+            context.hr_inspector_start = time.time()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        inspection = getattr(_current, 'inspection', None)
+        start = getattr(context, 'hr_inspector_start', None)
+        if inspection is not None and start is not None:
+            inspection.record(statement, time.time() - start)
+
+
+def init_app(flask_app):
+    """ Inspects every request when HR_QUERY_INSPECTOR is on
+    :param flask_app:
+    """
+    if not config.QUERY_INSPECTOR:
+        return
+
+    from flask import request
+
+    @flask_app.before_request
+    def start_request():
+        start('%s %s' % (request.method, request.path))
+
+    @flask_app.after_request
+    def finish_request(response):
+        finish()
+        return response
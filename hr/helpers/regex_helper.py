@@ -2,6 +2,34 @@
 """
 import re
 
+ADDRESS = re.compile(r'^([\d]+[\s[a-zA-Z/.\u00C0-\u017F]+),'
+                     r'([\s[a-zA-Z\u00C0-\u017F]+),'
+                     r'([\s[a-zA-Z\u00C0-\u017F]+)\s([\d]+)$')
+
+
+def parse_address(address):
+    """
+    :param address: e.g. 12345 Example St., Example City, State 12345
+    :return: dictionary with the keys street_address, city, state and zip, or None when the format is wrong
+    """
+    match = ADDRESS.match(address)
+    if match is None:
+        return None
+    return {'street_address': match.group(1), 'city': match.group(2), 'state': match.group(3), 'zip': match.group(4)}
+
+
+def address_error(address):
+    """
+    :param address: an address parse_address did not accept
+    :return: the error response explaining the expected format
+    """
+    return {'error_message': 'Address is formatted incorrectly. Instead, it needs to be formatted like so: '
+                             '(replace everything in <> with the appropriate value)',
+            'address': {'format': '<Street Number> <Street Name> <Street Modifier if necessary>, '
+                                  '<City>, <State> <Zipcode>',
+                        'example': '12345 Example St., Example City, State 12345',
+                        'provided': address}}, 500
+
 
 def validate_address(address):
     """
@@ -9,19 +37,7 @@ def validate_address(address):
     :return: dictionary containing components of the address
             that is with the keys: street_address, city, state, and zip
     """
-    regex = r'^([\d]+[\s[a-zA-Z/.\u00C0-\u017F]+),' \
-            r'([\s[a-zA-Z\u00C0-\u017F]+),' \
-            r'([\s[a-zA-Z\u00C0-\u017F]+)\s([\d]+)$'
-    regex_object = re.compile(regex)
-    if not regex_object.match(address):
-        return {'error_message': 'Address is formatted incorrectly. Instead, it needs to be formatted like so: '
-                                 '(replace everything in <> with the appropriate value)',
-                'address': {'format': '<Street Number> <Street Name> <Street Modifier if necessary>, '
-                                      '<City>, <State> <Zipcode>',
-                            'example': '12345 Example St., Example City, State 12345',
-                            'provided': address}}, 500
-
-    return {'street_address': re.search(regex, address).group(1),
-            'city': re.search(regex, address).group(2),
-            'state': re.search(regex, address).group(3),
-            'zip': re.search(regex, address).group(4)}
+    components = parse_address(address)
+    if components is None:
+        return address_error(address)
+    return components
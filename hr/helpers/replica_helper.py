@@ -0,0 +1,124 @@
+""" This picks the database engine the read-only controller paths use: a replica when there is one, the primary
+when the client has written something the replicas may not have yet
+
+Writes always go to the primary. A request that commits employee or reward changes is answered with a session
+token, the id of the last employee_change row it wrote, both as the X-HR-Session-Token header and as a cookie.
+Replicas apply commits in the order the primary made them, so a replica that has that change row has everything
+the client wrote. A read that sends the token is served by the first replica that has it, otherwise by the
+primary. Once a replica has caught up the cookie is removed and later reads skip the check.
+
+Only requests of the flask app are routed. Scripts, background threads and the async serving mode read from the
+primary, as they did before.
+"""
+import itertools
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+import config
+from helpers.log_helper import get_logger
+from helpers.metrics_helper import DB_READS
+
+logger = get_logger(__name__)
+
+TOKEN_HEADER = 'X-HR-Session-Token'
+TOKEN_COOKIE = 'hr_session_token'
+
+_request_state = threading.local()
+_next_replica = itertools.count()
+
+
+def choose_engine(primary, replicas):
+    """
+    :param primary: the engine writes go to
+    :param replicas: engines of the replicas, may be empty
+    :return: the engine the current request should read from
+    """
+    if not replicas or not routing():
+        DB_READS.inc('primary')
+        return primary
+
+    token = _request_state.token
+    first = next(_next_replica) % len(replicas)
+    for offset in range(len(replicas)):
+        replica = replicas[(first + offset) % len(replicas)]
+        if token is None or has_change(replica, token):
+            _request_state.caught_up = token is not None
+            DB_READS.inc('replica')
+            return replica
+    logger.debug("replica_helper.py - No replica has change %s yet, reading from the primary", token)
+    DB_READS.inc('primary')
+    return primary
+
+
+def has_change(replica, change_id):
+    """
+    :param replica: engine of a replica
+    :param change_id: id of an employee_change row
+    :return: whether the replica has the row, False when the replica cannot be reached
+    """
+    from databasesetup import EmployeeChange
+    change = EmployeeChange.__table__.c
+    try:
+        with replica.connect() as connection:
+            return connection.execute(select([change.id]).where(change.id == change_id)).first() is not None
+    except SQLAlchemyError:
+        logger.warning("replica_helper.py - Could not check replica %s for change %s", replica.url, change_id,
+                       exc_info=True)
+        return False
+
+
+def routing():
+    """
+    :return: whether the current request is routed, i.e. the writes it makes should hand out a session token
+    """
+    return getattr(_request_state, 'routed', False)
+
+
+def note_write(change_id):
+    """ Remembers the last change the current request wrote, the client is sent it as its session token
+    :param change_id: id of an employee_change row
+    """
+    if routing():
+        _request_state.written = change_id
+
+
+def _parse_token(value):
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def init_app(flask_app):
+    """ Reads the session token of every request of the flask app and hands out new ones after writes, when
+    HR_DATABASE_REPLICA_URLS is set
+    :param flask_app:
+    """
+    if not config.DATABASE_REPLICA_URLS:
+        return
+
+    from flask import request
+
+    @flask_app.before_request
+    def start_request():
+        _request_state.routed = True
+        _request_state.token = _parse_token(request.headers.get(TOKEN_HEADER) or request.cookies.get(TOKEN_COOKIE))
+        _request_state.written = None
+        _request_state.caught_up = False
+
+    @flask_app.after_request
+    def finish_request(response):
+        if routing():
+            if _request_state.written is not None and response.status_code < 400:
+                response.headers[TOKEN_HEADER] = str(_request_state.written)
+                response.set_cookie(TOKEN_COOKIE, str(_request_state.written),
+                                    max_age=config.READ_YOUR_WRITES_SECONDS, httponly=True)
+            elif _request_state.caught_up and TOKEN_COOKIE in request.cookies:
+                response.delete_cookie(TOKEN_COOKIE)
+        return response
+
+    @flask_app.teardown_request
+    def end_request(error):
+        _request_state.routed = False
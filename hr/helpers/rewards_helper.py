@@ -0,0 +1,160 @@
+""" This scores rewards: the reward_rule table says what orders and phones are worth, reward_event holds what every
+employee sold, and employee.phones and employee.orders are the totals the rules give those events.
+
+Rules are data, so changing an incentive is adding a rule and ending the old one, after which store_totals brings
+the stored totals in line. Totals for any period are computed the same way, in one pass over the events of the
+period that are streamed from the database in batches rather than loaded at once.
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import and_, bindparam, select
+
+from databasesetup import Employee, RewardEvent, RewardRule
+from helpers.cache_helper import mark_changed
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+EVENT_TYPES = ('order', 'phone')
+COUNTERS = ('phones', 'orders')
+ADJUSTMENT = 'adjustment'
+BATCH_SIZE = 10000
+
+
+class Rule(object):
+    """ A reward_rule row, with its phone models parsed once
+    """
+    __slots__ = ('name', 'event_type', 'model_ids', 'counter', 'points', 'starts_on', 'ends_on')
+
+    def __init__(self, name, event_type, model_ids, counter, points, starts_on=None, ends_on=None):
+        self.name = name
+        self.event_type = event_type
+        self.model_ids = frozenset(int(model_id) for model_id in (model_ids or '').split(',') if model_id.strip())
+        self.counter = counter
+        self.points = points if points is not None else 1
+        self.starts_on = starts_on
+        self.ends_on = ends_on
+
+    def applies(self, model_id, day):
+        """
+        :param model_id: phone model of the event, None for orders
+        :param day: date the event occurred on
+        """
+        if self.model_ids and model_id not in self.model_ids:
+            return False
+        if self.starts_on is not None and day < self.starts_on:
+            return False
+        return self.ends_on is None or day < self.ends_on
+
+
+def load_rules(session):
+    """
+    :return: dictionary of event type to the active rules for it
+    """
+    rules = defaultdict(list)
+    for row in session.query(RewardRule).filter(RewardRule.is_active == True).order_by(RewardRule.id):
+        rules[row.event_type].append(Rule(row.name, row.event_type, row.model_ids, row.counter, row.points,
+                                          row.starts_on, row.ends_on))
+    return rules
+
+
+def score(events, rules, totals=None):
+    """ Adds up what each event is worth. Events are read once, in any order.
+    :param events: iterable of rows with employee_id, event_type, model_id, counter, quantity and occurred_at
+    :param rules: as returned by load_rules
+    :param totals: totals to add to, e.g. from an earlier batch
+    :return: dictionary of employee id to a dictionary with the keys phones and orders
+    """
+    if totals is None:
+        totals = {}
+    for event in events:
+        employee_totals = totals.get(event.employee_id)
+        if employee_totals is None:
+            employee_totals = totals[event.employee_id] = dict.fromkeys(COUNTERS, 0)
+        quantity = event.quantity if event.quantity is not None else 1
+        if event.event_type == ADJUSTMENT:
+            employee_totals[event.counter] += quantity
+            continue
+        day = event.occurred_at.date() if isinstance(event.occurred_at, datetime) else event.occurred_at
+        for rule in rules.get(event.event_type, ()):
+            if rule.applies(event.model_id, day):
+                employee_totals[rule.counter] += rule.points * quantity
+    return totals
+
+
+def compute_totals(session, start=None, end=None, employee_ids=None, rules=None):
+    """ Scores the events of a period with the current rules
+    :param start: first date counted, None for since the first event
+    :param end: first date no longer counted, None for up to now
+    :param employee_ids: only score these employees, None for everyone
+    :param rules: as returned by load_rules, None to load them
+    :return: see score, employees without events in the period are left out
+    """
+    if rules is None:
+        rules = load_rules(session)
+    event = RewardEvent.__table__.c
+    query = select([event.employee_id, event.event_type, event.model_id, event.counter, event.quantity,
+                    event.occurred_at])
+    conditions = []
+    if start is not None:
+        conditions.append(event.occurred_at >= _as_datetime(start))
+    if end is not None:
+        conditions.append(event.occurred_at < _as_datetime(end))
+    if employee_ids is not None:
+        conditions.append(event.employee_id.in_(employee_ids))
+    if conditions:
+        query = query.where(and_(*conditions))
+
+    totals = {}
+    result = session.execute(query.execution_options(stream_results=True))
+    for batch in result.partitions(BATCH_SIZE):
+        score(batch, rules, totals)
+    return totals
+
+
+def store_totals(session, employee_ids=None):
+    """ Recomputes employee.phones and employee.orders from every event and writes the ones that changed
+    :param employee_ids: only these employees, e.g. the one a reward was just posted for; None for everyone
+    :return: tuple of the totals of the employees (see score) and the ids of the employees whose totals changed
+    """
+    totals = compute_totals(session, employee_ids=employee_ids)
+    employee = Employee.__table__.c
+    query = select([employee.id, employee.phones, employee.orders])
+    if employee_ids is not None:
+        query = query.where(employee.id.in_(employee_ids))
+
+    changed = []
+    for row in session.execute(query).fetchall():
+        new = totals.setdefault(row.id, dict.fromkeys(COUNTERS, 0))
+        if (row.phones, row.orders) != (new['phones'], new['orders']):
+            changed.append({'row_id': row.id, 'row_phones': new['phones'], 'row_orders': new['orders']})
+    if changed:
+        update = Employee.__table__.update().where(employee.id == bindparam('row_id')) \
+            .values(phones=bindparam('row_phones'), orders=bindparam('row_orders'))
+        for chunk_start in range(0, len(changed), BATCH_SIZE):
+            session.execute(update, changed[chunk_start:chunk_start + BATCH_SIZE])
+    changed_ids = [row['row_id'] for row in changed]
+    mark_changed(session, changed_ids)
+    logger.info("rewards_helper.py Store - %s employees have new reward totals", len(changed_ids))
+    return totals, changed_ids
+
+
+def record_sale(session, employee_id, order_id, model_ids, occurred_at=None):
+    """ Adds the events of one order: the order and each phone sold with it
+    :param employee_id:
+    :param order_id:
+    :param model_ids: list of (serial id, phone model id)
+    :param occurred_at: when the order was made, None for now
+    """
+    occurred_at = occurred_at or datetime.utcnow()
+    rows = [{'employee_id': employee_id, 'event_type': 'order', 'order_id': order_id, 'serial_id': None,
+             'model_id': None, 'counter': None, 'quantity': 1, 'occurred_at': occurred_at}]
+    rows += [{'employee_id': employee_id, 'event_type': 'phone', 'order_id': order_id, 'serial_id': serial_id,
+              'model_id': model_id, 'counter': None, 'quantity': 1, 'occurred_at': occurred_at}
+             for serial_id, model_id in model_ids]
+    session.execute(RewardEvent.__table__.insert(), rows)
+
+
+def _as_datetime(day):
+    return datetime(day.year, day.month, day.day) if isinstance(day, date) and not isinstance(day, datetime) else day
@@ -0,0 +1,336 @@
+""" This keeps an in-process index of every employee's name, email, department and role for /employee/search
+
+Each field is split into lower case words. Words of three or more letters are indexed by their trigrams, so any
+part of a word is found by intersecting the word sets of its trigrams, and every word can be found by its prefix in
+a sorted word list. A match scores higher the better the word matched (whole word, then prefix, then any part)
+and the more important the field is (name, then email, then department and role).
+
+The index is loaded from the database on first use. Commits made through this process update the changed
+employees on the next search; changes made by other processes are picked up when the index is rebuilt in the
+background every config.SEARCH_INDEX_MAX_AGE seconds.
+"""
+import bisect
+import re
+import threading
+import time
+from collections import defaultdict
+from sys import intern
+
+from sqlalchemy import and_
+
+import config
+from databasesetup import create_session, Employee, Title, Department, TitleRef, DepartmentRef
+from helpers import cache_helper
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+FIELD_WEIGHTS = (('name', 3), ('email', 2), ('department', 1), ('role', 1))
+WHOLE_WORD, PREFIX, PART = 3, 2, 1
+LOAD_BATCH_SIZE = 10000
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+_index = None
+_index_lock = threading.Lock()  # held to search, swap or change the index, never while reading the database
+_update_lock = threading.Lock()  # held while the database is read for a build or for changed employees
+_stale_lock = threading.Lock()
+_stale_ids = set()
+_rebuild_pending = False
+_refreshed_while_rebuilding = None
+
+
+def words(text):
+    """
+    :return: the lower case words of text, e.g. "Mary.Smith@krutz.site" gives mary, smith, krutz, site
+    """
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _trigrams(word):
+    return set(word[i:i + 3] for i in range(len(word) - 2))
+
+
+class SearchIndex(object):
+    """ Word and trigram postings for a set of employees
+    """
+
+    def __init__(self):
+        self.built_at = time.time()
+        self._documents = {}
+        self._postings = dict((field, defaultdict(set)) for field, _ in FIELD_WEIGHTS)
+        self._word_counts = defaultdict(int)
+        self._sorted_words = []
+        self._trigram_words = defaultdict(set)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, employee_id, name, email, department, role):
+        """ Indexes one employee, replacing what was indexed for them before
+        """
+        self.remove(employee_id)
+        # Only the text is kept, its words are worked out again when the employee is removed
+        document = (name, email, intern(department or ''), intern(role or ''))
+        self._documents[employee_id] = document
+        for field, field_words in self._document_words(document):
+            postings = self._postings[field]
+            for word in field_words:
+                postings[word].add(employee_id)
+                self._add_word(word)
+
+    def remove(self, employee_id):
+        document = self._documents.pop(employee_id, None)
+        if document is None:
+            return
+        for field, field_words in self._document_words(document):
+            postings = self._postings[field]
+            for word in field_words:
+                postings[word].discard(employee_id)
+                if not postings[word]:
+                    del postings[word]
+                self._remove_word(word)
+
+    @staticmethod
+    def _document_words(document):
+        return [(field, set(words(text))) for (field, _), text in zip(FIELD_WEIGHTS, document)]
+
+    def _add_word(self, word):
+        self._word_counts[word] += 1
+        if self._word_counts[word] > 1:
+            return
+        bisect.insort(self._sorted_words, word)
+        # Numbers, like the ones in email addresses, are only found by prefix to keep the trigram sets small
+        if not word.isdigit():
+            for trigram in _trigrams(word):
+                self._trigram_words[trigram].add(word)
+
+    def _remove_word(self, word):
+        self._word_counts[word] -= 1
+        if self._word_counts[word] > 0:
+            return
+        del self._word_counts[word]
+        del self._sorted_words[bisect.bisect_left(self._sorted_words, word)]
+        for trigram in _trigrams(word):
+            trigram_words = self._trigram_words.get(trigram)
+            if trigram_words is not None:
+                trigram_words.discard(word)
+                if not trigram_words:
+                    del self._trigram_words[trigram]
+
+    def _matching_words(self, query_word):
+        """
+        :return: the indexed words that start with or contain query_word
+        """
+        position = bisect.bisect_left(self._sorted_words, query_word)
+        matches = set()
+        while position < len(self._sorted_words) and self._sorted_words[position].startswith(query_word):
+            matches.add(self._sorted_words[position])
+            position += 1
+
+        if len(query_word) >= 3 and not query_word.isdigit():
+            candidates = None
+            for trigram in sorted(_trigrams(query_word), key=lambda t: len(self._trigram_words.get(t, ()))):
+                trigram_words = self._trigram_words.get(trigram)
+                if not trigram_words:
+                    return matches
+                candidates = set(trigram_words) if candidates is None else candidates & trigram_words
+            matches.update(word for word in candidates if query_word in word)
+        return matches
+
+    def _scores(self, query_word):
+        """
+        :return: dictionary of employee id to the best score of query_word for that employee
+        """
+        weighted = []
+        for word in self._matching_words(query_word):
+            quality = WHOLE_WORD if word == query_word else PREFIX if word.startswith(query_word) else PART
+            for field, weight in FIELD_WEIGHTS:
+                postings = self._postings[field].get(word)
+                if postings:
+                    weighted.append((quality * weight, postings))
+
+        # Applying the lowest scores first leaves every employee with their best one
+        scores = {}
+        for score, postings in sorted(weighted, key=lambda entry: entry[0]):
+            scores.update(dict.fromkeys(postings, score))
+        return scores
+
+    def search(self, query, offset, limit):
+        """ Finds the employees matching every word of query
+        :param query: text to look for
+        :param offset: number of ranked results to skip
+        :param limit: number of ranked results to return
+        :return: tuple of the number of matching employees and the ids of the requested results, best first
+        """
+        per_word = sorted((self._scores(query_word) for query_word in set(words(query))), key=len)
+        if not per_word:
+            return 0, []
+
+        totals = per_word[0]
+        for scores in per_word[1:]:
+            totals = dict((employee_id, score + scores[employee_id])
+                          for employee_id, score in totals.items() if employee_id in scores)
+
+        by_score = defaultdict(list)
+        for employee_id, score in totals.items():
+            by_score[score].append(employee_id)
+
+        # Only the score groups that overlap the requested page need to be sorted
+        page, skip = [], offset
+        for score in sorted(by_score, reverse=True):
+            group = by_score[score]
+            if skip >= len(group):
+                skip -= len(group)
+                continue
+            group.sort()
+            page.extend(group[skip:skip + limit - len(page)])
+            skip = 0
+            if len(page) >= limit:
+                break
+        return len(totals), page
+
+
+def _rows(session, employee_ids=None):
+    query = session.query(Employee.id, Employee.first_name, Employee.last_name, Employee.email,
+                          DepartmentRef.name, TitleRef.name) \
+        .outerjoin(Department, and_(Department.employee_id == Employee.id, Department.is_active == True)) \
+        .outerjoin(DepartmentRef, DepartmentRef.id == Department.department_ref_id) \
+        .outerjoin(Title, and_(Title.employee_id == Employee.id, Title.is_active == True)) \
+        .outerjoin(TitleRef, TitleRef.id == Title.title_ref_id)
+    if employee_ids is not None:
+        query = query.filter(Employee.id.in_(employee_ids))
+    return query.yield_per(LOAD_BATCH_SIZE)
+
+
+def _load(session, index, employee_ids=None):
+    _add_rows(index, _rows(session, employee_ids))
+
+
+def _add_rows(index, rows):
+    for employee_id, first_name, last_name, email, department, role in rows:
+        index.add(employee_id, '%s %s' % (first_name, last_name), email, department, role)
+
+
+def build(session):
+    """ Loads every employee into a new index
+    :param session:
+    :return: the index
+    """
+    start = time.time()
+    index = SearchIndex()
+    _load(session, index)
+    logger.info("Search index built with %s employees in %.1f s", len(index), time.time() - start)
+    return index
+
+
+def mark_stale(employee_ids):
+    """ Listener for cache_helper, the changed employees are indexed again before the next search
+    :param employee_ids: set of changed employee ids, containing None if any employee may have changed
+    """
+    global _rebuild_pending
+    with _stale_lock:
+        if None in employee_ids:
+            _rebuild_pending = True
+        _stale_ids.update(employee_id for employee_id in employee_ids if employee_id is not None)
+
+
+def _take_stale():
+    global _rebuild_pending
+    with _stale_lock:
+        stale, rebuild = set(_stale_ids), _rebuild_pending
+        _stale_ids.clear()
+        _rebuild_pending = False
+    return stale, rebuild
+
+
+def _refresh(session):
+    """ Brings the index up to date with the commits of this process, building it first if needed. The database is
+    read outside _index_lock, so searches keep using the current index meanwhile; only swapping the index or
+    applying the re-read employees takes it.
+    """
+    global _index
+    if _index is not None and not _stale_ids and not _rebuild_pending:
+        return
+    # One thread at a time reads changes, so an older read of an employee is never applied after a newer one
+    with _update_lock:
+        stale, rebuild = _take_stale()
+        if _index is None or rebuild:
+            index = build(session)
+            with _index_lock:
+                _index = index
+        elif stale:
+            rows = list(_rows(session, list(stale)))
+            with _index_lock:
+                for employee_id in stale:
+                    _index.remove(employee_id)
+                _add_rows(_index, rows)
+                if _refreshed_while_rebuilding is not None:
+                    _refreshed_while_rebuilding.update(stale)
+
+
+def _start_background_rebuild():
+    global _refreshed_while_rebuilding
+    _refreshed_while_rebuilding = set()
+    thread = threading.Thread(target=_rebuild_in_background, name='search-index-rebuild')
+    thread.daemon = True
+    thread.start()
+
+
+def _rebuild_in_background():
+    """ Builds a fresh index while searches keep using the current one, then swaps them
+    """
+    global _index, _refreshed_while_rebuilding
+    session = create_session()
+    try:
+        index = build(session)
+        with _index_lock:
+            # Employees refreshed while the new index was loading may have been read before their change
+            mark_stale(_refreshed_while_rebuilding)
+            _index = index
+    except Exception:
+        logger.exception("Search index rebuild failed")
+    finally:
+        session.close()
+        with _index_lock:
+            _refreshed_while_rebuilding = None
+
+
+def search(session, query, offset=0, limit=20):
+    """ Searches the employees' names, emails, departments and roles
+    :param session:
+    :param query: text to look for, every word of it has to match
+    :param offset: number of ranked results to skip
+    :param limit: number of ranked results to return
+    :return: tuple of the number of matching employees and the ids of the requested results, best first
+    """
+    _refresh(session)
+    with _index_lock:
+        if time.time() - _index.built_at > config.SEARCH_INDEX_MAX_AGE and _refreshed_while_rebuilding is None:
+            _start_background_rebuild()
+        return _index.search(query, offset, limit)
+
+
+def warm_up():
+    """ Builds the index in the background so the first search does not have to
+    """
+    def load():
+        global _index
+        session = create_session()
+        try:
+            with _update_lock:
+                if _index is None:
+                    index = build(session)
+                    with _index_lock:
+                        _index = index
+        except Exception:
+            logger.exception("Search index warm up failed")
+        finally:
+            session.close()
+
+    thread = threading.Thread(target=load, name='search-index-warm-up')
+    thread.daemon = True
+    thread.start()
+
+
+cache_helper.add_listener(mark_stale)
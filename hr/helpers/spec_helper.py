@@ -0,0 +1,107 @@
+""" This adds the API to a connexion app from a copy of the spec parsed on an earlier start
+
+Connexion spends most of add_api rendering swagger.yaml with Jinja2, parsing the YAML and validating the result
+against the Swagger 2.0 schema. The parsed spec is kept as JSON in config.SPEC_CACHE_DIR under a hash of the file,
+the Jinja2 arguments and the connexion version, so editing any of them parses the file again. A spec is only
+written to the cache after connexion accepted it, which is why one read back from the cache is not validated again.
+"""
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+
+import connexion
+import jinja2
+import yaml
+from connexion.spec import Specification
+
+import config
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+# libyaml parses the spec several times faster than the pure Python loader when it is installed
+_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def cache_file(contents, arguments=None):
+    """
+    :param contents: the spec file as bytes
+    :param arguments: the Jinja2 arguments the spec is rendered with
+    :return: where the parsed spec is cached
+    """
+    key = hashlib.sha1(contents)
+    key.update(json.dumps(arguments or {}, sort_keys=True).encode('utf-8'))
+    key.update(connexion.__version__.encode('utf-8'))
+    return os.path.join(config.SPEC_CACHE_DIR, 'spec-%s.json' % key.hexdigest())
+
+
+def parse(contents, arguments=None):
+    """ Renders and parses a spec the way connexion does
+    :param contents: the spec file as bytes
+    :param arguments: the Jinja2 arguments
+    :return: the spec as a dictionary
+    """
+    template = jinja2.Template(contents.decode('utf-8', 'replace'))
+    return yaml.load(template.render(**(arguments or {})), Loader=_LOADER)
+
+
+@contextmanager
+def _already_validated():
+    original = Specification.__dict__['_validate_spec']
+    Specification._validate_spec = classmethod(lambda cls, spec: None)
+    try:
+        yield
+    finally:
+        Specification._validate_spec = original
+
+
+def _read(file_name):
+    try:
+        with open(file_name, 'r') as cached:
+            return json.load(cached)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write(file_name, text):
+    try:
+        if not os.path.isdir(config.SPEC_CACHE_DIR):
+            os.makedirs(config.SPEC_CACHE_DIR)
+        # Written under a temporary name first, so a worker starting at the same time never reads half a file
+        temporary_name = '%s.%s.tmp' % (file_name, os.getpid())
+        with open(temporary_name, 'w') as cached:
+            cached.write(text)
+        os.replace(temporary_name, file_name)
+    except (IOError, OSError) as e:
+        logger.warning("spec_helper.py Write - could not cache the spec in %s: %s", config.SPEC_CACHE_DIR, e)
+
+
+def add_api(app, specification, **kwargs):
+    """ Same as app.add_api(specification, **kwargs), using the cached spec when the file has not changed
+    :param app: a connexion app
+    :param specification: the spec file name, relative to the app's specification directory
+    :return: the API connexion added
+    """
+    path = os.path.join(str(app.specification_dir), specification)
+    with open(path, 'rb') as spec_file:
+        contents = spec_file.read()
+    file_name = cache_file(contents, kwargs.get('arguments'))
+
+    spec = _read(file_name) if config.SPEC_CACHE_DIR else None
+    if spec is not None:
+        logger.debug("spec_helper.py Add - %s from %s", specification, file_name)
+        with _already_validated():
+            return app.add_api(spec, **kwargs)
+
+    spec = parse(contents, kwargs.get('arguments'))
+    try:
+        # Before add_api, which fills in defaults of its own
+        text = json.dumps(spec)
+    except (TypeError, ValueError):
+        logger.warning("spec_helper.py Add - %s has values JSON cannot hold and is not cached", specification)
+        text = None
+    api = app.add_api(spec, **kwargs)
+    if text is not None and config.SPEC_CACHE_DIR:
+        _write(file_name, text)
+    return api
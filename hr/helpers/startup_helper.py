@@ -0,0 +1,49 @@
+""" This times the phases of starting the application, so a slow start shows where its time went
+
+app.py imports this module first and marks the end of each phase. report() logs how long each phase took and warns
+when the start took longer than config.STARTUP_BUDGET_SECONDS, which is what a new worker costs an autoscaler or a
+reload. benchmarks/startup_bench.py breaks the import phase down by module.
+"""
+import time
+
+import config
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+_phases = []
+_last = time.perf_counter()
+
+
+def mark(phase):
+    """ Ends a phase that started where the previous one ended
+    :param phase: e.g. "imports"
+    :return: the seconds the phase took
+    """
+    global _last
+    now = time.perf_counter()
+    seconds = now - _last
+    _phases.append((phase, seconds))
+    _last = now
+    return seconds
+
+
+def phases():
+    """
+    :return: (phase, seconds) pairs in the order they ended
+    """
+    return list(_phases)
+
+
+def report():
+    """ Logs the phases and their total, as a warning when the total is over the budget
+    :return: the total in seconds
+    """
+    total = sum(seconds for _, seconds in _phases)
+    breakdown = ', '.join('%s %.0f ms' % (phase, seconds * 1000) for phase, seconds in _phases)
+    if total > config.STARTUP_BUDGET_SECONDS:
+        logger.warning("startup_helper.py Report - started in %.2f s, over the %.2f s budget: %s",
+                       total, config.STARTUP_BUDGET_SECONDS, breakdown)
+    else:
+        logger.info("startup_helper.py Report - started in %.2f s: %s", total, breakdown)
+    return total
@@ -0,0 +1,156 @@
+""" This serves the html pages and the files in static/ from memory
+
+Everything is read once at startup. Each file gets an ETag from its content and, when that is smaller, a gzip
+variant with an ETag of its own. Static files are also published under a fingerprinted name, e.g. /assets/css/bootstrap.min.1a2b3c4d5e6f.css,
+that can be cached for a year because a new version of the file gets a new name. The pages refer to the
+fingerprinted names and are revalidated with their ETag on every view.
+"""
+import copy
+import gzip
+import hashlib
+import io
+import mimetypes
+import os
+import re
+
+from flask import Response, request, abort
+
+HR_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ASSET_PREFIX = '/assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+_STATIC_REFERENCE = re.compile(r'''(["'])/static/([^"'?#]+)\1''')
+
+_assets = {}
+_pages = {}
+_fingerprinted_urls = {}
+
+
+class Asset(object):
+    """ A file held in memory with everything needed to answer a request for it
+    """
+
+    def __init__(self, body, mimetype, cache_control):
+        self.body = body
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.gzipped = _gzip(body)
+
+    def response(self):
+        # The gzip variant is another representation, so it has its own ETag
+        gzipped = self.gzipped is not None and request.accept_encodings['gzip'] > 0
+        etag = self.etag + '-gz' if gzipped else self.etag
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif gzipped:
+            response = Response(self.gzipped, mimetype=self.mimetype)
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = Response(self.body, mimetype=self.mimetype)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = self.cache_control
+        response.headers['Vary'] = 'Accept-Encoding'
+        return response
+
+    def with_cache_control(self, cache_control):
+        """ The same file under another name, without compressing it again
+        """
+        asset = copy.copy(self)
+        asset.cache_control = cache_control
+        return asset
+
+
+def _gzip(body):
+    """
+    :return: the gzip compressed body, or None when compressing does not save at least a tenth
+    """
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=9, mtime=0) as compressed:
+        compressed.write(body)
+    gzipped = buffer.getvalue()
+    return gzipped if len(gzipped) < len(body) * 0.9 else None
+
+
+def _mimetype(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def _fingerprinted(relative_path, body):
+    root, extension = os.path.splitext(relative_path)
+    return '%s.%s%s' % (root, hashlib.sha256(body).hexdigest()[:12], extension)
+
+
+def load(static_directory=None, page_directory=None):
+    """ Reads, fingerprints and compresses every static file and page
+    :param static_directory: defaults to hr/static
+    :param page_directory: defaults to hr/html
+    """
+    static_directory = static_directory or os.path.join(HR_DIRECTORY, 'static')
+    page_directory = page_directory or os.path.join(HR_DIRECTORY, 'html')
+    _assets.clear()
+    _pages.clear()
+    _fingerprinted_urls.clear()
+
+    for directory, _, file_names in os.walk(static_directory):
+        for file_name in file_names:
+            if file_name.endswith(('.py', '.pyc')):
+                continue
+            path = os.path.join(directory, file_name)
+            relative_path = os.path.relpath(path, static_directory).replace(os.sep, '/')
+            with open(path, 'rb') as static_file:
+                body = static_file.read()
+            fingerprinted_path = _fingerprinted(relative_path, body)
+            # The plain name stays available for relative references such as fonts and source maps in the css
+            asset = _assets[relative_path] = Asset(body, _mimetype(path), REVALIDATE)
+            _assets[fingerprinted_path] = asset.with_cache_control(IMMUTABLE)
+            _fingerprinted_urls[relative_path] = ASSET_PREFIX + fingerprinted_path
+
+    for file_name in os.listdir(page_directory):
+        with open(os.path.join(page_directory, file_name), 'rb') as page_file:
+            html = page_file.read().decode('utf-8')
+        html = _STATIC_REFERENCE.sub(_rewrite_reference, html)
+        _pages[file_name] = Asset(html.encode('utf-8'), 'text/html', REVALIDATE)
+
+
+def _rewrite_reference(match):
+    url = _fingerprinted_urls.get(match.group(2))
+    if url is None:
+        return match.group(0)
+    return match.group(1) + url + match.group(1)
+
+
+def asset_url(relative_path):
+    """
+    :param relative_path: path of a file inside static/, e.g. css/bootstrap.min.css
+    :return: the fingerprinted url of the file
+    """
+    return _fingerprinted_urls.get(relative_path, '/static/' + relative_path)
+
+
+def send_page(file_name):
+    """
+    :param file_name: name of a page in html/, e.g. viewemployees.html
+    :return: the page response
+    """
+    page = _pages.get(file_name)
+    if page is None:
+        abort(404)
+    return page.response()
+
+
+def send_asset(filename):
+    asset = _assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset.response()
+
+
+def init_app(flask_app):
+    """ Loads the files, serves them under /assets/ and makes asset_url available to templates
+    :param flask_app:
+    """
+    load()
+    flask_app.add_url_rule(ASSET_PREFIX + '<path:filename>', 'assets', send_asset)
+    flask_app.jinja_env.globals['asset_url'] = asset_url
@@ -0,0 +1,208 @@
+""" This pushes the employee change feed to the subscribers registered at /webhooks
+
+A dispatcher thread looks for subscribers that are behind the change feed, right after a commit in this process
+and every config.WEBHOOK_POLL_SECONDS for commits made elsewhere. Each subscriber behind is delivered to on a
+small worker pool: the changes after its cursor are POSTed in batches of up to config.WEBHOOK_BATCH_SIZE and the
+cursor moves on once the subscriber answers with a 2xx. A slow or failing subscriber only holds up its own worker,
+and after a failed delivery it is left alone for an exponentially growing, jittered time before it is tried again.
+
+Deliveries are at least once: a batch can be sent again after a timeout, so subscribers should ignore change ids
+they have already seen. When a subscription has a secret, the body is signed with HMAC-SHA256 in the
+X-HR-Signature header.
+"""
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import and_, func
+from sqlalchemy.exc import SQLAlchemyError
+from urllib3.util.retry import Retry
+
+import config
+from databasesetup import create_session, EmployeeChange, WebhookSubscription
+from helpers import cache_helper
+from helpers.change_feed_helper import read_changes, serialize
+from helpers.log_helper import get_logger
+from helpers.metrics_helper import time_outbound
+
+logger = get_logger(__name__)
+
+BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 300
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_dispatcher = None
+
+
+def create_http_session(pool_size, retries):
+    """
+    :param pool_size: connections kept open per subscriber host
+    :param retries: times a request is retried after a connection error or a RETRY_STATUSES answer
+    :return: a requests session with pooled connections and retries with backoff
+    """
+    retry = Retry(total=retries, backoff_factor=0.5, status_forcelist=RETRY_STATUSES,
+                  allowed_methods=frozenset(['POST']), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    http = requests.Session()
+    http.mount('http://', adapter)
+    http.mount('https://', adapter)
+    return http
+
+
+def sign(secret, body):
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+
+class Dispatcher(object):
+    """ Delivers the change feed to every active subscription
+    """
+
+    def __init__(self, session_factory=create_session, workers=None, batch_size=None, poll_seconds=None,
+                 timeout_seconds=None, retries=None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size or config.WEBHOOK_BATCH_SIZE
+        self.poll_seconds = poll_seconds or config.WEBHOOK_POLL_SECONDS
+        self.timeout_seconds = timeout_seconds or config.WEBHOOK_TIMEOUT_SECONDS
+        workers = workers or config.WEBHOOK_WORKERS
+        self._http = create_http_session(workers, config.WEBHOOK_RETRIES if retries is None else retries)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._lock = threading.Lock()
+        self._in_flight = set()
+        self._failures = {}  # subscription id: (failures in a row, time of the next attempt)
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+
+    def start(self):
+        cache_helper.add_listener(self.notify)
+        thread = threading.Thread(target=self._run, name='webhook-dispatcher')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        self._executor.shutdown(wait=True)
+
+    def notify(self, employee_ids=None):
+        """ Listener for cache_helper, a commit may have added changes
+        """
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.dispatch()
+            except SQLAlchemyError:
+                logger.exception("Webhooks - Could not look for subscribers to deliver to")
+            self._wake.wait(self.poll_seconds)
+            self._wake.clear()
+
+    def dispatch(self):
+        """ Starts a delivery for every subscriber that is behind, not being delivered to and not backing off
+        :return: the futures of the started deliveries
+        """
+        session = self.session_factory()
+        try:
+            latest = session.query(func.max(EmployeeChange.id)).scalar() or 0
+            behind = session.query(WebhookSubscription.id, WebhookSubscription.url, WebhookSubscription.secret,
+                                   WebhookSubscription.last_change_id) \
+                .filter(and_(WebhookSubscription.is_active == True, WebhookSubscription.last_change_id < latest)) \
+                .all()
+        finally:
+            session.close()
+
+        now = time.time()
+        futures = []
+        with self._lock:
+            for subscription_id, url, secret, cursor in behind:
+                if subscription_id in self._in_flight or self._failures.get(subscription_id, (0, 0))[1] > now:
+                    continue
+                self._in_flight.add(subscription_id)
+                futures.append(self._executor.submit(self._deliver, subscription_id, url, secret, cursor))
+        return futures
+
+    def _deliver(self, subscription_id, url, secret, cursor):
+        """ Sends batches of changes to one subscriber until it has them all or a request fails
+        :return: the number of changes delivered
+        """
+        delivered = 0
+        try:
+            has_more = True
+            while has_more:
+                session = self.session_factory()
+                try:
+                    changes, has_more = read_changes(session, cursor, self.batch_size)
+                finally:
+                    session.close()
+                if not changes:
+                    break
+
+                self._post(url, secret, {'change_array': [serialize(change) for change in changes],
+                                         'next_cursor': changes[-1].id})
+                delivered += len(changes)
+                if not self._save_cursor(subscription_id, cursor, changes[-1].id):
+                    # The subscription was changed or delivered to by another process meanwhile
+                    break
+                cursor = changes[-1].id
+
+            with self._lock:
+                self._failures.pop(subscription_id, None)
+        except (requests.RequestException, SQLAlchemyError) as error:
+            with self._lock:
+                failures = self._failures.get(subscription_id, (0, 0))[0] + 1
+                delay = min(BACKOFF_SECONDS * 2 ** (failures - 1), MAX_BACKOFF_SECONDS) * random.uniform(0.5, 1.0)
+                self._failures[subscription_id] = (failures, time.time() + delay)
+            logger.warning("Webhooks - Delivery to subscription %s (%s) failed %s times in a row, next attempt in "
+                           "%.1f s: %s", subscription_id, url, failures, delay, error)
+        finally:
+            with self._lock:
+                self._in_flight.discard(subscription_id)
+
+        if delivered:
+            logger.info("Webhooks - Delivered %s changes to subscription %s", delivered, subscription_id)
+            # Changes committed during the delivery found this subscriber busy
+            self._wake.set()
+        return delivered
+
+    def _post(self, url, secret, payload):
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if secret:
+            headers['X-HR-Signature'] = sign(secret, body)
+        with time_outbound('webhook'):
+            response = self._http.post(url, data=body, headers=headers, timeout=self.timeout_seconds)
+            response.raise_for_status()
+
+    def _save_cursor(self, subscription_id, old_cursor, new_cursor):
+        """
+        :return: whether the cursor was still at old_cursor and has been moved to new_cursor
+        """
+        session = self.session_factory()
+        try:
+            saved = session.query(WebhookSubscription) \
+                .filter(and_(WebhookSubscription.id == subscription_id,
+                             WebhookSubscription.last_change_id == old_cursor)) \
+                .update({WebhookSubscription.last_change_id: new_cursor}, synchronize_session=False)
+            session.commit()
+            return saved == 1
+        except SQLAlchemyError:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+
+def start():
+    """ Starts delivering changes from this process
+    """
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = Dispatcher()
+        _dispatcher.start()
+        logger.info("Webhooks - Dispatcher started with %s workers", config.WEBHOOK_WORKERS)
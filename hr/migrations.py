@@ -0,0 +1,194 @@
+""" Brings a database created by an older version of databasesetup up to date with the current models.
+
+Every migration checks the live schema before it changes anything, so running this more than once is safe.
+Run it from the hr directory with: python migrations.py
+"""
+from datetime import datetime
+from sqlalchemy import func, inspect, select, bindparam, MetaData, Table
+from databasesetup import engine, Base, employee_fingerprint, Employee, Salary, Address, Title, Department, TitleRef, DepartmentRef, \
+    RewardRule, RewardEvent, DEFAULT_REWARD_RULES, EmployeeChange, EmployeeChangeCounter
+from helpers.log_helper import get_logger
+
+logger = get_logger(__name__)
+
+
+def add_salary_start_date(connection):
+    """ Salary entries did not have a start date. Existing entries start on the employee's start date.
+    """
+    columns = [column['name'] for column in inspect(connection).get_columns(Salary.__tablename__)]
+    if 'start_date' in columns:
+        return False
+
+    connection.execute('ALTER TABLE salary ADD COLUMN start_date DATE')
+    connection.execute('UPDATE salary SET start_date = '
+                       '(SELECT employee.start_date FROM employee WHERE employee.id = salary.employee_id) '
+                       'WHERE start_date IS NULL')
+    return True
+
+
+def add_history_start_date_indexes(connection):
+    """ Adds the (employee_id, start_date, id) indexes used for point in time lookups.
+    """
+    return _create_missing_indexes(connection, (Address, Title, Department, Salary))
+
+
+def add_employee_email_index(connection):
+    """ Adds the email index used to find the employee signing in.
+    """
+    return _create_missing_indexes(connection, (Employee,))
+
+
+def add_roster_filter_indexes(connection):
+    """ Adds the indexes used to filter the roster by department, role and salary.
+    """
+    return _create_missing_indexes(connection, (Title, Department, Salary))
+
+
+def normalize_department_and_title_names(connection):
+    """ Department and title names were copied into every history row. Each name is now stored once in
+    department_ref or title_ref and the history rows point at it.
+    """
+    normalized = False
+    for model, reference_model in ((Department, DepartmentRef), (Title, TitleRef)):
+        table, reference = model.__tablename__, reference_model.__tablename__
+        key = reference + '_id'
+        columns = [column['name'] for column in inspect(connection).get_columns(table)]
+        if 'name' not in columns:
+            continue
+
+        if key not in columns:
+            connection.execute('ALTER TABLE %s ADD COLUMN %s INTEGER REFERENCES %s (id)' % (table, key, reference))
+            if connection.dialect.name == 'mysql':
+                # MySQL ignores REFERENCES inside a column definition
+                connection.execute('ALTER TABLE %s ADD FOREIGN KEY (%s) REFERENCES %s (id)' % (table, key, reference))
+
+        existing = set(row[0] for row in connection.execute(select([reference_model.name])))
+        names = [row[0] for row in connection.execute('SELECT DISTINCT name FROM %s WHERE name IS NOT NULL' % table)
+                 if row[0] not in existing]
+        if names:
+            rows = [{'name': name} for name in names]
+            if reference_model is DepartmentRef:
+                for row in rows:
+                    row['code'] = row['name'].replace(' ', '')
+            connection.execute(reference_model.__table__.insert(), rows)
+        connection.execute('UPDATE {0} SET {1} = (SELECT {2}.id FROM {2} WHERE {2}.name = {0}.name) '
+                           'WHERE {1} IS NULL'.format(table, key, reference))
+
+        # The old name indexes have to go before the column can be dropped
+        for index in Table(table, MetaData(), autoload_with=connection).indexes:
+            if 'name' in index.columns:
+                index.drop(connection)
+        connection.execute('ALTER TABLE %s DROP COLUMN name' % table)
+        normalized = True
+
+    return _create_missing_indexes(connection, (Title, Department)) or normalized
+
+
+def add_employee_fingerprint(connection):
+    """ Adds the unique fingerprint POST /employee finds duplicates with. When older rows already share one, only
+    the first of them gets it.
+    """
+    columns = [column['name'] for column in inspect(connection).get_columns(Employee.__tablename__)]
+    if 'fingerprint' in columns:
+        return _create_missing_indexes(connection, (Employee,))
+
+    connection.execute('ALTER TABLE employee ADD COLUMN fingerprint VARCHAR(40)')
+    table = Employee.__table__
+    update = table.update().where(table.c.id == bindparam('row_id')).values(fingerprint=bindparam('row_fingerprint'))
+    rows = connection.execute(select([table.c.id, table.c.first_name, table.c.last_name, table.c.email,
+                                      table.c.birth_date, table.c.start_date]).order_by(table.c.id)).fetchall()
+    seen = set()
+    updates = []
+    for row in rows:
+        fingerprint = employee_fingerprint(row.first_name, row.last_name, row.email, row.birth_date, row.start_date)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            updates.append({'row_id': row.id, 'row_fingerprint': fingerprint})
+        if len(updates) == 10000:
+            connection.execute(update, updates)
+            updates = []
+    if updates:
+        connection.execute(update, updates)
+    _create_missing_indexes(connection, (Employee,))
+    return True
+
+
+def add_employee_version(connection):
+    """ Adds the row version PATCH /employee compares with If-Match, every existing employee starts at 1
+    """
+    columns = [column['name'] for column in inspect(connection).get_columns(Employee.__tablename__)]
+    if 'version' in columns:
+        return False
+    connection.execute('ALTER TABLE employee ADD COLUMN version INTEGER NOT NULL DEFAULT 1')
+    return True
+
+
+def add_reward_rules(connection):
+    """ Starts the reward_rule table with the rules rewards.post used to apply itself, and keeps the phones and
+    orders counted before there were reward events as one adjustment event each, so recomputing the totals from
+    the events gives the same numbers.
+    """
+    if connection.execute(select([RewardRule.id]).limit(1)).first() is not None:
+        return False
+    connection.execute(RewardRule.__table__.insert(), DEFAULT_REWARD_RULES)
+
+    table = Employee.__table__
+    with_events = select([RewardEvent.employee_id]).distinct()
+    rows = connection.execute(select([table.c.id, table.c.phones, table.c.orders])
+                              .where(table.c.id.notin_(with_events))).fetchall()
+    now = datetime.utcnow()
+    events = []
+    for row in rows:
+        for counter in ('phones', 'orders'):
+            if getattr(row, counter):
+                events.append({'employee_id': row.id, 'event_type': 'adjustment', 'counter': counter,
+                               'quantity': getattr(row, counter), 'occurred_at': now})
+        if len(events) >= 10000:
+            connection.execute(RewardEvent.__table__.insert(), events)
+            events = []
+    if events:
+        connection.execute(RewardEvent.__table__.insert(), events)
+    return True
+
+
+def add_employee_change_counter(connection):
+    """ Change ids were handed out by the employee_change primary key. The counter that hands them out now starts
+    after the last change that was recorded.
+    """
+    counter = EmployeeChangeCounter.__table__
+    last_id = connection.execute(select([func.max(EmployeeChange.id)])).scalar() or 0
+    return connection.execute(counter.update().where(counter.c.last_id < last_id).values(last_id=last_id)) \
+        .rowcount > 0
+
+
+def _create_missing_indexes(connection, models):
+    added = False
+    for model in models:
+        live = inspect(connection)
+        existing = [index['name'] for index in live.get_indexes(model.__tablename__)]
+        columns = [column['name'] for column in live.get_columns(model.__tablename__)]
+        for index in model.__table__.indexes:
+            # Indexes on columns that an older database does not have yet are added by the migration adding them
+            if index.name not in existing and all(column.name in columns for column in index.columns):
+                index.create(connection)
+                added = True
+    return added
+
+
+MIGRATIONS = [add_salary_start_date, add_history_start_date_indexes, add_employee_email_index,
+              add_roster_filter_indexes, normalize_department_and_title_names, add_employee_fingerprint,
+              add_employee_version, add_reward_rules, add_employee_change_counter]
+
+
+def migrate():
+    # Tables that do not exist yet are simply created from the models
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        for migration in MIGRATIONS:
+            if migration(connection):
+                logger.warning("Applied migration %s", migration.__name__)
+
+
+if __name__ == "__main__":
+    migrate()
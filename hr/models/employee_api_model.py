@@ -21,7 +21,7 @@ class EmployeeApiModel(object):
     """
 
     def __init__(self, is_active=None, employee_id=None, name=None, birth_date=None, address=None, email=None,
-                 department=None, role=None, team_start_date=None, start_date=None, salary=None):
+                 department=None, role=None, team_start_date=None, start_date=None, salary=None, version=None):
         """
         EmployeeApiModel - a model defined in Swagger
 
@@ -41,7 +41,8 @@ class EmployeeApiModel(object):
             'role': 'str',
             'team_start_date': 'str',
             'start_date': 'str',
-            'salary': 'int'
+            'salary': 'int',
+            'version': 'int'
         }
 
         self.attribute_map = {
@@ -55,7 +56,8 @@ class EmployeeApiModel(object):
             'role': 'role',
             'team_start_date': 'team_start_date',
             'start_date': 'start_date',
-            'salary': 'salary'
+            'salary': 'salary',
+            'version': 'version'
         }
 
         self._is_active = is_active
@@ -69,6 +71,7 @@ class EmployeeApiModel(object):
         self._team_start_date = team_start_date
         self._start_date = start_date
         self._salary = salary
+        self._version = version
 
     @property
     def is_active(self):
@@ -301,6 +304,27 @@ class EmployeeApiModel(object):
 
         self._salary = salary
 
+    @property
+    def version(self):
+        """
+        Gets the version of this EmployeeApiModel.
+
+        :return: The version of this EmployeeApiModel.
+        :rtype: int
+        """
+        return self._version
+
+    @version.setter
+    def version(self, version):
+        """
+        Sets the version of this EmployeeApiModel.
+
+        :param version: The version of this EmployeeApiModel.
+        :type: int
+        """
+
+        self._version = version
+
     def to_dict(self):
         """
         Returns the model properties as a dict
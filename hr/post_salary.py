@@ -1,10 +1,9 @@
-import logging
-import requests
+from helpers.log_helper import get_logger
+from helpers import http_helper
 
-logging.basicConfig(filename='./log.txt',format='%(asctime)s :: %(name)s :: %(message)s')
-logger = logging.getLogger(__name__)
+logger = get_logger(__name__)
 
-employees_payload = requests.get("http://vm343a.se.rit.edu:80/employee")
+employees_payload = http_helper.get("http://vm343a.se.rit.edu:80/employee", 'employees')
 employees = employees_payload.json()
 
 # Number to divide annual employee salary by to get salary for a given time period
@@ -15,5 +14,5 @@ for employee in employees["employee_array"]:
     if employee["department"] != "Board":
         salary_request_body = { "amount" : employee["salary"]/pay_period, "department" : employee["department"],
                                 "userID" : employee["employee_id"], "name" : employee["name"] }
-        response = requests.post("http://vm343e.se.rit.edu/salary", salary_request_body)
+        response = http_helper.post("http://vm343e.se.rit.edu/salary", 'salary', data=salary_request_body)
         logger.info(response.text)
\ No newline at end of file
@@ -0,0 +1,31 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from helpers.async_helper import async_database_url, resolve_function
+
+
+class AsyncHelperTests(unittest.TestCase):
+
+    def test_async_drivers(self):
+        self.assertEqual(async_database_url('mysql+mysqldb://root:pw@localhost/343DB'),
+                         'mysql+aiomysql://root:pw@localhost/343DB')
+        self.assertEqual(async_database_url('sqlite:///hr.db'), 'sqlite+aiosqlite:///hr.db')
+
+    def test_async_versions_are_preferred(self):
+        from controllers import authentication
+        self.assertIs(resolve_function('controllers.authentication.get'), authentication.get_async)
+
+    def test_sync_controllers_run_on_a_thread(self):
+        function = resolve_function('controllers.search.get')
+        self.assertTrue(asyncio.iscoroutinefunction(function))
+        self.assertEqual(asyncio.run(function('!!')), function.__wrapped__('!!'),
+                         msg="The wrapped controller should answer as it does when called directly")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from helpers import cache_helper
+from helpers.cache_helper import ResultCache
+
+Base = declarative_base()
+
+
+class Person(Base):
+    __tablename__ = 'person'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+
+
+class CacheHelperTests(unittest.TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = ResultCache('test lru', max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_entries_expire(self):
+        cache = ResultCache('test ttl', ttl_seconds=-1)
+        cache.set('a', 1)
+        self.assertIsNone(cache.get('a'))
+
+    def test_commit_of_watched_model_clears_caches(self):
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        session = sessionmaker(bind=engine)()
+        cache_helper.watch(Person)
+        cache = ResultCache('test watch')
+
+        cache.set('roster', 'html')
+        session.commit()
+        self.assertEqual(cache.get('roster'), 'html')
+
+        session.add(Person(name='Lucas'))
+        session.commit()
+        self.assertIsNone(cache.get('roster'))
+
+        cache.set('roster', 'html')
+        session.query(Person).filter(Person.id == 1).update({'name': 'Luke'})
+        session.commit()
+        self.assertIsNone(cache.get('roster'))
+        session.close()
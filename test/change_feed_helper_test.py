@@ -0,0 +1,107 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import migrations
+from databasesetup import Base, EmployeeChange, EmployeeChangeCounter
+from helpers.change_feed_helper import record_changes, read_changes, CREATE, DELETE, UPDATE
+
+
+class ChangeFeedTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[EmployeeChange.__table__, EmployeeChangeCounter.__table__])
+        self.session = sessionmaker(bind=engine)()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_changes_are_read_after_the_cursor(self):
+        record_changes(self.session, CREATE, [7, 8])
+        record_changes(self.session, DELETE, [7])
+        self.session.commit()
+
+        changes, has_more = read_changes(self.session, 0, 2)
+        self.assertEqual([(c.employee_id, c.operation) for c in changes], [(7, 'create'), (8, 'create')])
+        self.assertTrue(has_more)
+
+        changes, has_more = read_changes(self.session, changes[-1].id, 2)
+        self.assertEqual([(c.employee_id, c.operation) for c in changes], [(7, 'delete')])
+        self.assertFalse(has_more)
+
+    def test_rolled_back_changes_leave_no_gap(self):
+        record_changes(self.session, CREATE, [7])
+        self.session.rollback()
+        self.assertEqual(read_changes(self.session, 0, 10), ([], False))
+
+        record_changes(self.session, CREATE, [8])
+        self.session.commit()
+        self.assertEqual([c.id for c in read_changes(self.session, 0, 10)[0]], [1])
+
+    def test_the_counter_starts_after_existing_changes(self):
+        self.session.execute(EmployeeChange.__table__.insert(), [
+            {'id': 1, 'employee_id': 1, 'operation': 'update', 'changed_at': datetime.utcnow()},
+            {'id': 4, 'employee_id': 4, 'operation': 'update', 'changed_at': datetime.utcnow()}])
+        self.session.commit()
+        with self.session.bind.begin() as connection:
+            self.assertTrue(migrations.add_employee_change_counter(connection))
+            self.assertFalse(migrations.add_employee_change_counter(connection))
+
+        record_changes(self.session, UPDATE, [5])
+        self.session.commit()
+        self.assertEqual([c.id for c in read_changes(self.session, 0, 10)[0]], [1, 4, 5])
+
+
+class CommitOrderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        engine = create_engine('sqlite:///' + os.path.join(self.directory, 'changes.db'))
+        Base.metadata.create_all(engine, tables=[EmployeeChange.__table__, EmployeeChangeCounter.__table__])
+        self.session_factory = sessionmaker(bind=engine)
+
+    def tearDown(self):
+        self.session_factory.kw['bind'].dispose()
+        shutil.rmtree(self.directory)
+
+    def test_a_slow_commit_holds_back_the_later_changes(self):
+        slow = self.session_factory()
+        record_changes(slow, UPDATE, [1])
+
+        def record_later():
+            session = self.session_factory()
+            record_changes(session, UPDATE, [2])
+            session.commit()
+            session.close()
+
+        later = threading.Thread(target=record_later)
+        later.start()
+        time.sleep(0.2)
+
+        reader = self.session_factory()
+        self.assertEqual(read_changes(reader, 0, 10), ([], False),
+                         msg="Nothing after the uncommitted change may be visible yet")
+        reader.close()
+
+        slow.commit()
+        slow.close()
+        later.join(5)
+        reader = self.session_factory()
+        self.assertEqual([(c.id, c.employee_id) for c in read_changes(reader, 0, 10)[0]], [(1, 1), (2, 2)])
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, Date, ForeignKey
+from sqlalchemy import create_engine, event, Column, DDL, Integer, String, Boolean, Date, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, class_mapper
 import logging
@@ -27,11 +27,13 @@ class Employee(Base):
     is_active = Column(Boolean)
     last_name = Column(String(25))
     first_name = Column(String(25))
-    email = Column(String(50))
+    email = Column(String(50), index=True)
     birth_date = Column(Date)
     start_date = Column(Date)
     orders = Column(Integer)
     phones = Column(Integer)
+    fingerprint = Column(String(40), unique=True, index=True)
+    version = Column(Integer, nullable=False, default=1, server_default='1')
 
     # This allows for reference to this employee's details without extra searching
     addresses = relationship("Address", back_populates="employee", cascade="all, delete-orphan", passive_deletes=True)
@@ -51,11 +53,15 @@ class Salary(Base):
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
     amount = Column(Integer)  # Will be an Integer of Cents. So for a salary of $100, the amount will be 10000
+    start_date = Column(Date)
 
     # This allows for reference to this employee's details without extra searching
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="salary")
 
+    __table_args__ = (Index('ix_salary_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_salary_active_amount', 'is_active', 'amount', 'employee_id'))
+
     def __repr__(self):
         return "<Salary(id='%s', is_active='%s', amount='%s')>" % (self.id, self.is_active, self.amount)
 
@@ -77,6 +83,8 @@ class Address(Base):
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="addresses")
 
+    __table_args__ = (Index('ix_address_employee_start_date', 'employee_id', 'start_date', 'id'),)
+
     def __repr__(self):
         return "<Address(id='%s', is_active='%s', employee_id='%s', street_address='%s', city='%s', state='%s', " \
                "zip='%s', start_date='%s')>" % (self.id, self.is_active, self.employee_id, self.street_address,
@@ -86,17 +94,35 @@ class Address(Base):
         return "%s, %s, %s %s" % (self.street_address, self.city, self.state, self.zip)
 
 
+class TitleRef(Base):
+    __tablename__ = 'title_ref'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(25), unique=True)
+
+    def __repr__(self):
+        return "<TitleRef(id='%s', name='%s')>" % (self.id, self.name)
+
+
 class Title(Base):
     __tablename__ = 'title'
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
-    name = Column(String(25))
     start_date = Column(Date)
 
+    title_ref_id = Column(Integer, ForeignKey(TitleRef.id))
+    ref = relationship("TitleRef", lazy='joined')
+
     # Allows for reference to the employee object without search
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="titles")
 
+    __table_args__ = (Index('ix_title_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_title_ref_active', 'title_ref_id', 'is_active', 'employee_id'))
+
+    @property
+    def name(self):
+        return self.ref.name if self.ref is not None else None
+
     def __repr__(self):
         return "<Title(id='%s', employee_id='%s', is_active='%s', name='%s', " \
                "start_date='%s')>" % (self.id, self.employee_id, self.is_active, self.name, self.start_date)
@@ -105,17 +131,36 @@ class Title(Base):
         return "%s" % self.name
 
 
+class DepartmentRef(Base):
+    __tablename__ = 'department_ref'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(25), unique=True)
+    code = Column(String(25), index=True)
+
+    def __repr__(self):
+        return "<DepartmentRef(id='%s', name='%s', code='%s')>" % (self.id, self.name, self.code)
+
+
 class Department(Base):
     __tablename__ = 'department'
     id = Column(Integer, primary_key=True)
     is_active = Column(Boolean)
     start_date = Column(Date)
-    name = Column(String(25))
+
+    department_ref_id = Column(Integer, ForeignKey(DepartmentRef.id))
+    ref = relationship("DepartmentRef", lazy='joined')
 
     # Allows for reference to the employee object without search
     employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
     employee = relationship("Employee", back_populates="departments")
 
+    __table_args__ = (Index('ix_department_employee_start_date', 'employee_id', 'start_date', 'id'),
+                      Index('ix_department_ref_active', 'department_ref_id', 'is_active', 'employee_id'))
+
+    @property
+    def name(self):
+        return self.ref.name if self.ref is not None else None
+
     def __repr__(self):
         return "<Department(id='%s', employee_id='%s', start_date='%s', is_active='%s', " \
                "name='%s')>" % (self.id, self.employee_id, self.start_date, self.is_active, self.name)
@@ -124,10 +169,87 @@ class Department(Base):
         return "%s" % self.name
 
 
+class EmployeeChange(Base):
+    __tablename__ = 'employee_change'
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer)
+    operation = Column(String(10))
+    changed_at = Column(DateTime)
+
+    def __repr__(self):
+        return "<EmployeeChange(id='%s', employee_id='%s', operation='%s', changed_at='%s')>" \
+               % (self.id, self.employee_id, self.operation, self.changed_at)
+
+
+class EmployeeChangeCounter(Base):
+    __tablename__ = 'employee_change_counter'
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    last_id = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return "<EmployeeChangeCounter(last_id='%s')>" % self.last_id
+
+
+event.listen(EmployeeChangeCounter.__table__, 'after_create',
+             DDL('INSERT INTO employee_change_counter (id, last_id) VALUES (1, 0)'))
+
+
+class WebhookSubscription(Base):
+    __tablename__ = 'webhook_subscription'
+    id = Column(Integer, primary_key=True)
+    url = Column(String(255))
+    secret = Column(String(64))
+    is_active = Column(Boolean)
+    last_change_id = Column(Integer)
+    created_at = Column(DateTime)
+
+    def __repr__(self):
+        return "<WebhookSubscription(id='%s', url='%s', is_active='%s', last_change_id='%s')>" \
+               % (self.id, self.url, self.is_active, self.last_change_id)
+
+
+class RewardRule(Base):
+    __tablename__ = 'reward_rule'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50))
+    event_type = Column(String(10))
+    model_ids = Column(String(100))
+    counter = Column(String(10))
+    points = Column(Integer, default=1)
+    starts_on = Column(Date)
+    ends_on = Column(Date)
+    is_active = Column(Boolean, default=True)
+
+
+class RewardEvent(Base):
+    __tablename__ = 'reward_event'
+    id = Column(Integer, primary_key=True)
+    employee_id = Column(Integer, ForeignKey(Employee.id, ondelete='CASCADE'))
+    event_type = Column(String(10))
+    order_id = Column(Integer)
+    serial_id = Column(Integer)
+    model_id = Column(Integer)
+    counter = Column(String(10))
+    quantity = Column(Integer, default=1)
+    occurred_at = Column(DateTime, index=True)
+
+    __table_args__ = (Index('ix_reward_event_employee_id_occurred_at', 'employee_id', 'occurred_at'),)
+
+
 def create_session():
     return sessionmaker(bind=engine)()
 
 
+def get_reference(session, model, name):
+    reference = session.query(model).filter(model.name == name).first()
+    if reference is None:
+        reference = model(name=name)
+        if model is DepartmentRef:
+            reference.code = name.replace(" ", "")
+        session.add(reference)
+    return reference
+
+
 def default_info():
     Base.metadata.create_all(engine)
 
@@ -153,14 +275,21 @@ def default_info():
         session.add(employee)
         session.add(Address(is_active=True, street_address=str(employee_count) + " Lomb Memorial Drive", city="Rochester",
                             state="New York", zip="14623", start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Title(is_active=True, name=name[3], start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23), name=name[2],
-                    employee=employee))
-        session.add(Salary(is_active=True, amount=salary, employee=employee))
+        session.add(Title(is_active=True, ref=get_reference(session, TitleRef, name[3]),
+                          start_date=datetime.date(2017, 1, 23), employee=employee))
+        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23),
+                               ref=get_reference(session, DepartmentRef, name[2]), employee=employee))
+        session.add(Salary(is_active=True, amount=salary, start_date=datetime.date(2017, 1, 23), employee=employee))
         session.commit()
 
         employee_count += 1
 
+    session.add(RewardRule(name='Rewarded phone models', event_type='phone', model_ids='2,3', counter='phones',
+                           points=1, is_active=True))
+    session.add(RewardRule(name='Every order', event_type='order', model_ids='', counter='orders', points=1,
+                           is_active=True))
+    session.commit()
+
 
 def serialize(model):
     """Transforms a model into a dictionary which can be dumped to JSON."""
@@ -0,0 +1,220 @@
+import unittest
+from datetime import date
+
+from .sqlite_database import create_sessions, employee_payload
+
+from flask import Flask
+
+from controllers import employee, employees
+from databasesetup import employee_fingerprint, Employee, Address, Department, Salary
+
+
+class DuplicateEmployeeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        body, status = employees.post(employee_payload(), session=self.sessions())
+        self.assertEqual(status, 200, msg=body)
+        self.employee_id = body['employee_id']
+        self.session = self.sessions()
+
+    def tearDown(self):
+        self.session.close()
+
+    def employee(self, employee_id):
+        return employees.get(employee_id=[employee_id], session=self.sessions())['employee_array'][0]
+
+    def test_posting_an_employee_again_is_refused(self):
+        for employee in (employee_payload(), employee_payload(fname=' POST ', email='Test@Test.com')):
+            body, status = employees.post(employee, session=self.sessions())
+            self.assertEqual(status, 400, msg=employee)
+            self.assertIn('already exists', body['error_message'])
+        self.assertEqual(self.session.query(Employee).count(), 1)
+
+    def test_upsert_updates_the_department_and_address(self):
+        employee = employee_payload(department='Sales', address='2 other rd, buffalo, ny 14201')
+        body, status = employees.post(employee, upsert=True, session=self.sessions())
+
+        self.assertEqual(status, 200, msg=body)
+        self.assertEqual(body['employee_id'], self.employee_id)
+        self.assertEqual(self.session.query(Employee).count(), 1)
+        current = self.employee(self.employee_id)
+        self.assertEqual(current['department'], 'Sales')
+        self.assertEqual(current['address'], '2 other rd,  buffalo,  ny 14201')
+        self.assertEqual(current['version'], 2)
+        self.assertEqual(sorted(row.is_active for row in self.session.query(Department)), [False, True],
+                         msg="The old department stays in the history")
+        self.assertEqual(self.session.query(Address).count(), 2)
+
+    def test_upsert_without_changes_leaves_the_employee_alone(self):
+        body, status = employees.post(employee_payload(), upsert=True, session=self.sessions())
+        self.assertEqual((status, body['employee_id']), (200, self.employee_id))
+        self.assertEqual(self.employee(self.employee_id)['version'], 1)
+
+    def test_a_new_name_changes_the_fingerprint(self):
+        before = self.session.query(Employee).get(self.employee_id)
+        old_fingerprint, birth_date, start_date = before.fingerprint, before.birth_date, before.start_date
+        self.session.close()
+
+        response = employees.patch({'employee_id': self.employee_id, 'fname': 'Renamed'}, session=self.sessions())
+        self.assertEqual(response[1], 200, msg=response[0])
+
+        fingerprint = self.session.query(Employee.fingerprint).filter(Employee.id == self.employee_id).scalar()
+        self.assertNotEqual(fingerprint, old_fingerprint)
+        self.assertEqual(fingerprint, employee_fingerprint('Renamed', 'Employee', 'test@test.com', birth_date,
+                                                           start_date))
+        self.assertEqual(employees.post(employee_payload(fname='Renamed'), session=self.sessions())[1], 400)
+        self.assertEqual(employees.post(employee_payload(), session=self.sessions())[1], 200,
+                         msg="The old name is free again")
+
+
+class EmployeeVersionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        self.employee_id = employees.post(employee_payload(), session=self.sessions())[0]['employee_id']
+        self.app = Flask(__name__)
+
+    def stored(self):
+        session = self.sessions()
+        row = session.query(Employee.first_name, Employee.version).filter(Employee.id == self.employee_id).one()
+        session.close()
+        return tuple(row)
+
+    def patch(self, changes, if_match=None):
+        headers = {'If-Match': if_match} if if_match is not None else {}
+        with self.app.test_request_context('/employee', method='PATCH', headers=headers):
+            return employees.patch(dict(changes, employee_id=self.employee_id), session=self.sessions())
+
+    def test_a_current_version_is_changed(self):
+        body, status, headers = self.patch({'fname': 'Second', 'version': 1})
+        self.assertEqual((status, body['version'], headers['ETag']), (200, 2, '"2"'))
+        self.assertEqual(self.stored(), ('Second', 2))
+
+        body, status, headers = self.patch({'salary': 1000}, if_match='"2"')
+        self.assertEqual((status, body['version'], headers['ETag']), (200, 3, '"3"'))
+        self.assertEqual(self.stored(), ('Second', 3))
+
+    def test_a_stale_version_is_a_conflict(self):
+        self.patch({'fname': 'Second'})
+        for changes, if_match in (({'fname': 'Third', 'version': 1}, None), ({'salary': 1000}, '"1"'),
+                                  ({'fname': 'Third', 'version': 3}, '"1"')):
+            body, status = self.patch(changes, if_match)
+            self.assertEqual(status, 409, msg=changes)
+            self.assertEqual(body['version'], 2)
+            self.assertIn('changed since version 1 was read, they are at version 2 now', body['error_message'])
+        self.assertEqual(self.stored(), ('Second', 2), msg="A conflict changes nothing")
+
+    def test_any_version_matches_a_star_or_a_missing_version(self):
+        self.assertEqual(self.patch({'fname': 'Second'})[1], 200)
+        self.assertEqual(self.patch({'fname': 'Third'}, if_match='*')[1], 200)
+        self.assertEqual(self.patch({'salary': 1000}, if_match='"1", "3"')[2]['ETag'], '"4"')
+        self.assertEqual(self.stored(), ('Third', 4))
+
+    def test_if_match_has_to_be_a_version(self):
+        body, status = self.patch({'fname': 'Second'}, if_match='"abc"')
+        self.assertEqual(status, 400)
+        self.assertEqual(self.stored(), ('Post', 1))
+
+
+class PointInTimeTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        # Inactive, so the start date is kept as posted
+        self.employee_id = employees.post(employee_payload(is_active=False), session=self.sessions())[0][
+            'employee_id']
+        self.first_salary = self.one(None)['salary']
+        response = employees.patch({'employee_id': self.employee_id, 'department': 'Sales',
+                                    'department_start_date': '2018-06-01', 'salary': 1000,
+                                    'salary_start_date': '2018-06-01'}, session=self.sessions())
+        self.assertEqual(response[1], 200, msg=response[0])
+
+    def one(self, as_of):
+        return employees.get(employee_id=[self.employee_id], as_of=as_of, session=self.sessions())[
+            'employee_array'][0]
+
+    def test_before_a_change_the_old_values_are_returned(self):
+        for found in (self.one('2018-05-31'),
+                      employee.get(self.employee_id, as_of='2018-05-31', session=self.sessions())['employee_array']):
+            self.assertEqual((found['department'], found['salary']), ('HR', self.first_salary))
+            self.assertEqual(found['team_start_date'], date(2017, 4, 19))
+            self.assertEqual(found['role'], 'TEST')
+
+    def test_from_the_change_on_the_new_values_are_returned(self):
+        for as_of in ('2018-06-01', '2019-01-01'):
+            for found in (self.one(as_of),
+                          employee.get(self.employee_id, as_of=as_of, session=self.sessions())['employee_array']):
+                self.assertEqual((found['department'], found['salary']), ('Sales', 1000), msg=as_of)
+                self.assertEqual(found['team_start_date'], date(2018, 6, 1))
+        self.assertEqual(self.one(None)['department'], 'Sales')
+
+    def test_before_the_start_date_the_employee_did_not_exist(self):
+        self.assertEqual(employees.get(employee_id=[self.employee_id], as_of='2017-04-18',
+                                       session=self.sessions())[1], 400)
+        self.assertEqual(employee.get(self.employee_id, as_of='2017-04-18', session=self.sessions())[1], 400)
+        self.assertEqual(employees.get(as_of='2017-04-18', session=self.sessions())['employee_array'], [],
+                         msg="The roster as of that day leaves them out")
+        self.assertEqual(self.one('2017-04-19')['department'], 'HR')
+
+    def test_a_date_has_to_be_formatted(self):
+        self.assertEqual(employees.get(as_of='01.06.2018', session=self.sessions())[1], 400)
+
+
+class RosterFilterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        self.ids = {}
+        for name, department, role, is_active, salary in (('Ann', 'Sales', 'Manager', True, 300),
+                                                          ('Bob', 'Sales', 'Clerk', True, 100),
+                                                          ('Cat', 'HR', 'Manager', False, 200),
+                                                          ('Dan', 'HR', 'Clerk', True, None)):
+            body, status = employees.post(employee_payload(fname=name, department=department, role=role,
+                                                           is_active=is_active), session=self.sessions())
+            self.assertEqual(status, 200, msg=body)
+            self.ids[name] = body['employee_id']
+            if salary is not None:
+                employees.patch({'employee_id': body['employee_id'], 'salary': salary}, session=self.sessions())
+        # Dan has no current salary, e.g. after it was ended by hand
+        session = self.sessions()
+        session.query(Salary).filter(Salary.employee_id == self.ids['Dan']).update({'is_active': False})
+        session.commit()
+        session.close()
+
+    def names(self, **filters):
+        found = employees.get(session=self.sessions(), **filters)['employee_array']
+        return [employee_object['name'].split()[0] for employee_object in found]
+
+    def test_each_filter(self):
+        self.assertEqual(self.names(department='Sales'), ['Ann', 'Bob'])
+        self.assertEqual(self.names(role='Manager'), ['Ann', 'Cat'])
+        self.assertEqual(self.names(is_active=False), ['Cat'])
+        self.assertEqual(self.names(is_active=True), ['Ann', 'Bob', 'Dan'])
+        self.assertEqual(self.names(min_salary=200), ['Ann', 'Cat'])
+        self.assertEqual(self.names(max_salary=150), ['Bob'])
+        self.assertEqual(self.names(department='HR', role='Clerk', is_active=True), ['Dan'])
+        self.assertEqual(self.names(department='Nobody'), [], msg="No match is an empty roster, not an error")
+
+    def test_a_descending_sort(self):
+        self.assertEqual(self.names(sort='-salary'), ['Ann', 'Cat', 'Bob', 'Dan'])
+        self.assertEqual(self.names(sort='-employee_id'), ['Dan', 'Cat', 'Bob', 'Ann'])
+        self.assertEqual(self.names(department='HR', sort='-role'), ['Cat', 'Dan'])
+        self.assertEqual(employees.get(sort='-age', session=self.sessions())[1], 400)
+
+    def test_asked_for_ids_keep_their_order(self):
+        ids = [self.ids['Dan'], self.ids['Ann'], self.ids['Cat']]
+        self.assertEqual(self.names(employee_id=ids), ['Dan', 'Ann', 'Cat'])
+        self.assertEqual(self.names(employee_id=ids, sort='name'), ['Ann', 'Cat', 'Dan'],
+                         msg="An explicit sort wins")
+
+    def test_an_employee_without_a_salary_is_kept(self):
+        found = employees.get(employee_id=[self.ids['Dan']], sort='salary', session=self.sessions())
+        self.assertEqual(found['employee_array'][0]['salary'], None)
+        self.assertIn('Dan', self.names(sort='salary'))
+        self.assertIn('Dan', self.names(department='HR', sort='-salary'))
+        self.assertNotIn('Dan', self.names(max_salary=1000000), msg="A salary filter needs a salary")
+
+
+if __name__ == '__main__':
+    unittest.main()
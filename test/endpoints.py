@@ -1,9 +1,9 @@
 import unittest
-from hr.controllers import employee, employees
+from hr.controllers import employee, employees, export, offboard, search, stats
 import datetime
 
 import random
-from hr.databasesetup import Address,Employee,Salary,Title,Department
+from hr.databasesetup import Address,Employee,Salary,Title,Department,TitleRef,DepartmentRef,get_reference
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.engine import create_engine
 from sqlalchemy_utils import database_exists, create_database
@@ -52,10 +52,11 @@ def setup_module():
         session.add(employee)
         session.add(Address(is_active=True, street_address=str(employee_count) + " Lomb Memorial Drive", city="Rochester",
                             state="New York", zip="14623", start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Title(is_active=True, name=name[3], start_date=datetime.date(2017, 1, 23), employee=employee))
-        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23), name=name[2],
-                    employee=employee))
-        session.add(Salary(is_active=True, amount=salary, employee=employee))
+        session.add(Title(is_active=True, ref=get_reference(session, TitleRef, name[3]),
+                          start_date=datetime.date(2017, 1, 23), employee=employee))
+        session.add(Department(is_active=True, start_date=datetime.date(2017, 1, 23),
+                               ref=get_reference(session, DepartmentRef, name[2]), employee=employee))
+        session.add(Salary(is_active=True, amount=salary, start_date=datetime.date(2017, 1, 23), employee=employee))
         session.commit()
 
         employee_count += 1
@@ -416,6 +417,28 @@ class EndPointTests(unittest.TestCase):
                           400),
                          msg="Able to POST and existing employee's information.")
 
+    def test_postEmployeeUpsert(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "HR",
+            "fname": "Up",
+            "is_active": False,
+            "lname": "Sert",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "up@sert.com"
+        }
+        created, status = employees.post(employee_to_post, session=session)
+        self.assertEqual(status, 200)
+
+        employee_to_post.update(department="Sales", fname="UP ")
+        updated, status = employees.post(employee_to_post, upsert=True, session=session)
+        self.assertEqual((status, updated['employee_id']), (200, created['employee_id']),
+                         msg="The same employee, with different case and spacing, should be updated")
+        self.assertEqual(employee.get(created['employee_id'], session=session)['employee_array']['department'],
+                         "Sales")
+
     def test_patchEmployee(self):
         patch = {
           "address": "1 test dr, rochester, ny 14623",
@@ -510,6 +533,18 @@ class EndPointTests(unittest.TestCase):
                           400),
                          msg="Able to PATCH an employee that doesn't exist.")
 
+    def test_patchEmployeeVersion(self):
+        id = employees.get(session=session)['employee_array'][-1]['employee_id']
+        version = employee.get(id, session=session)['employee_array']['version']
+
+        response = employees.patch({'employee_id': id, 'salary': 100, 'version': version}, session=session)
+        self.assertEqual((response[1], response[0]['version']), (200, version + 1))
+
+        response = employees.patch({'employee_id': id, 'salary': 200, 'version': version}, session=session)
+        self.assertEqual((response[1], response[0]['version']), (409, version + 1),
+                         msg="Able to PATCH a version of an employee that was already changed.")
+        self.assertEqual(employee.get(id, session=session)['employee_array']['salary'], 100)
+
     def test_deleteEmployee(self):
         employee_to_post = {
             "address": "1 test dr, rochester, ny 14623",
@@ -530,6 +565,173 @@ class EndPointTests(unittest.TestCase):
         self.assertEqual(employee_to_delete['name'], employee_to_post['fname'] + " " + employee_to_post['lname'])
         self.assertEqual(employee.get(id,session=session),({'error_message': 'Error while retrieving employee ' + str(id)}, 400))
 
+    def test_getEmployeesFiltered(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "Filtering",
+            "fname": "Fil",
+            "is_active": True,
+            "lname": "Ter",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "test@filter.com"
+        }
+        employees.post(employee_to_post, session=session)
+        employee_to_post.update(fname="Second", is_active=False, email="second@filter.com")
+        employees.post(employee_to_post, session=session)
+
+        filtered = employees.get(department='Filtering', session=session)['employee_array']
+        self.assertEqual([e['email'] for e in filtered], ["test@filter.com", "second@filter.com"],
+                         msg="Only the Filtering employees should be returned, by id")
+
+        filtered = employees.get(department='Filtering', is_active=False, session=session)['employee_array']
+        self.assertEqual([e['email'] for e in filtered], ["second@filter.com"])
+
+        filtered = employees.get(department='Filtering', sort='-name', session=session)['employee_array']
+        self.assertEqual(filtered[0]['name'], 'Second Ter', msg="Equal last names should be sorted by first name")
+
+        salary = filtered[0]['salary']
+        filtered = employees.get(department='Filtering', min_salary=salary, max_salary=salary,
+                                 session=session)['employee_array']
+        self.assertTrue(all(e['salary'] == salary for e in filtered), msg="Salaries should be within the range")
+
+        self.assertEqual(employees.get(department='Nowhere', session=session)['employee_array'], [])
+
+    def test_departmentStatistics(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "Statistics",
+            "fname": "Stat",
+            "is_active": True,
+            "lname": "Istic",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "test@stats.com"
+        }
+        for index, is_active in enumerate([True, True, True, False]):
+            employee_to_post.update(is_active=is_active, email="test%s@stats.com" % index)
+            employees.post(employee_to_post, session=session)
+        ids = [e['employee_id'] for e in employees.get(department='Statistics', session=session)['employee_array']]
+        for salary, e_id in zip([100, 200, 400, 800], ids):
+            employees.patch({'employee_id': e_id, 'salary': salary}, session=session)
+
+        department = [d for d in stats.departments(percentiles=[50], session=session)['department_array']
+                      if d['department'] == 'Statistics'][0]
+        self.assertEqual((department['headcount'], department['active'], department['inactive']), (4, 3, 1))
+        self.assertEqual(department['salary_sum'], 700, msg="Only active salaries should be summed")
+        self.assertEqual(department['salary_median'], 200)
+        self.assertEqual(department['salary_percentiles'], {'p50': 200})
+
+    def test_searchEmployees(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "Sales",
+            "fname": "Quintessa",
+            "is_active": True,
+            "lname": "Searchable",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "quintessa@search.com"
+        }
+        employees.post(employee_to_post, session=session)
+
+        results = search.get('quint searcha', session=session)
+        self.assertEqual(results['total'], 1, msg="Only the posted employee should match")
+        self.assertEqual(results['employee_array'][0]['name'], 'Quintessa Searchable')
+
+        results = search.get('tessa sales', session=session)
+        self.assertEqual(results['employee_array'][0]['email'], 'quintessa@search.com',
+                         msg="A part of a word should match")
+
+        self.assertEqual(search.get('!!', session=session)[1], 400, msg="A search without words should fail")
+
+    def test_exportRoster(self):
+        import csv
+        import io
+        import json
+
+        response = export.get(session=session)
+        rows = list(csv.reader(io.StringIO(b''.join(response.response).decode('utf-8'))))
+        self.assertEqual(rows[0], list(export.ROSTER_COLUMNS))
+        self.assertEqual(len(rows) - 1, session.query(Employee).count(), msg="There should be a row per employee")
+        first = employees.get([int(rows[1][0])], session=session)['employee_array'][0]
+        self.assertEqual(rows[1][1], first['name'])
+        self.assertEqual(rows[1][6], first['address'])
+
+        response = export.get('ndjson', include_history=True, session=session)
+        entries = [json.loads(line) for line in b''.join(response.response).decode('utf-8').splitlines()]
+        self.assertEqual(set(entry['field'] for entry in entries), {'address', 'role', 'department', 'salary'})
+        self.assertEqual(len([entry for entry in entries if entry['field'] == 'salary']),
+                         session.query(Salary).count(), msg="Every salary entry should be exported")
+
+        self.assertEqual(export.get('xlsx', session=session)[1], 400)
+
+    def test_offboardEmployees(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "Offboarding",
+            "fname": "Off",
+            "is_active": True,
+            "lname": "Board",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "first@offboard.com"
+        }
+        employees.post(employee_to_post, session=session)
+        employee_to_post.update(fname="Second", email="second@offboard.com")
+        employees.post(employee_to_post, session=session)
+        ids = [e['employee_id'] for e in employees.get(department='Offboarding', session=session)['employee_array']]
+
+        report, status = offboard.post({'department': 'Offboarding', 'chunk_size': 1}, session=session)
+        self.assertEqual((status, report['matched'], report['changed'], report['chunks']), (200, 2, 2, 2))
+        deactivated = employee.get(ids[0], session=session)['employee_array']
+        self.assertEqual((deactivated['is_active'], deactivated['department']), (False, None),
+                         msg="The employee and their current department should be inactive")
+
+        report, status = offboard.post({'employee_ids': ids + [-1], 'mode': 'delete'}, session=session)
+        self.assertEqual((status, report['changed'], report['missing_ids']), (200, 2, [-1]))
+        self.assertEqual(employees.get(employee_id=ids, session=session)[1], 400)
+
+        self.assertEqual(offboard.post({}, session=session)[1], 400, msg="Employees have to be chosen")
+
+    def test_getEmployeeAsOf(self):
+        employee_to_post = {
+            "address": "1 test dr, rochester, ny 14623",
+            "birth_date": "1990-04-19",
+            "department": "HR",
+            "fname": "As",
+            "is_active": False,
+            "lname": "Of",
+            "role": "TEST",
+            "start_date": "2017-04-19",
+            "email": "test@asof.com"
+        }
+        employees.post(employee_to_post, session=session)
+        id = employees.get(session=session)['employee_array'][-1]['employee_id']
+        employees.patch({'employee_id': id, 'department': 'Sales', 'department_start_date': '2017-06-01',
+                         'role': 'Manager', 'role_start_date': '2017-06-01',
+                         'salary': 100, 'salary_start_date': '2017-06-01'}, session=session)
+
+        before = employee.get(id, session=session, as_of='2017-05-01')['employee_array']
+        self.assertEqual(before['department'], 'HR', msg="Department before the change should be HR")
+        self.assertEqual(before['role'], 'TEST', msg="Role before the change should be TEST")
+        self.assertNotEqual(before['salary'], 100, msg="Salary before the change should be the original salary")
+
+        after = employee.get(id, session=session, as_of='2017-07-01')['employee_array']
+        self.assertEqual(after['department'], 'Sales', msg="Department after the change should be Sales")
+        self.assertEqual(after['role'], 'Manager', msg="Role after the change should be Manager")
+        self.assertEqual(after['salary'], 100, msg="Salary after the change should be 100")
+
+        roster = employees.get([id], session=session, as_of='2017-05-01')['employee_array']
+        self.assertEqual(roster[0]['department'], 'HR')
+        self.assertEqual(employee.get(id, session=session, as_of='2017-01-01'),
+                         ({'error_message': 'Error while retrieving employee %s as of 2017-01-01' % id}, 400),
+                         msg="Found an employee before their start date")
+
     def teardown(self):
         self.session.close()
         self.__transaction.rollback()
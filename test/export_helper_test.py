@@ -0,0 +1,46 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+from datetime import date
+
+from hr.helpers import export_helper
+
+
+class ExportHelperTests(unittest.TestCase):
+
+    def rows(self, count):
+        for number in range(count):
+            yield (number, 'Name, "%s"' % number, date(2017, 1, 23), number % 2 == 0, None)
+
+    def test_csv_is_written_in_chunks(self):
+        chunks = list(export_helper.encode(self.rows(5000), ('employee_id', 'name', 'start_date', 'is_active',
+                                                             'salary'), 'csv'))
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) < export_helper.CHUNK_SIZE * 2 for chunk in chunks))
+
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        self.assertEqual(rows[0], ['employee_id', 'name', 'start_date', 'is_active', 'salary'])
+        self.assertEqual(rows[1], ['0', 'Name, "0"', '2017-01-23', 'true', ''])
+        self.assertEqual(len(rows), 5001)
+
+    def test_ndjson_has_an_object_per_line(self):
+        body = b''.join(export_helper.encode(self.rows(3), ('employee_id', 'name', 'start_date', 'is_active',
+                                                            'salary'), 'ndjson'))
+        lines = body.decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[1]), {'employee_id': 1, 'name': 'Name, "1"', 'start_date': '2017-01-23',
+                                                'is_active': False, 'salary': None})
+
+    def test_compressed_chunks_make_one_gzip_file(self):
+        chunks = list(export_helper.encode(self.rows(5000), ('a', 'b', 'c', 'd', 'e'), 'csv'))
+        self.assertEqual(gzip.decompress(b''.join(export_helper.compress(iter(chunks)))), b''.join(chunks))
+
+    def test_an_empty_export_still_has_its_header(self):
+        self.assertEqual(b''.join(export_helper.encode(iter(()), ('a', 'b'), 'csv')), b'a,b\n')
+        self.assertEqual(b''.join(export_helper.encode(iter(()), ('a', 'b'), 'ndjson')), b'')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import gzip
+import unittest
+
+from .sqlite_database import create_sessions, employee_payload
+
+from flask import Flask
+
+from controllers import employees, export
+
+
+class ExportEncodingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        employees.post(employee_payload(), session=self.sessions())
+        self.app = Flask(__name__)
+
+    def export(self, accept_encoding):
+        with self.app.test_request_context('/employee/export', headers={'Accept-Encoding': accept_encoding}):
+            response = export.get(session=self.sessions())
+            return response.headers.get('Content-Encoding'), b''.join(response.response)
+
+    def test_gzip_is_sent_when_accepted(self):
+        encoding, body = self.export('br, gzip;q=0.8')
+        self.assertEqual(encoding, 'gzip')
+        self.assertIn(b'Post Employee', gzip.decompress(body))
+
+    def test_gzip_is_not_sent_when_refused(self):
+        for accept_encoding in ('gzip;q=0', 'identity', 'x-gzip-like'):
+            encoding, body = self.export(accept_encoding)
+            self.assertIsNone(encoding, msg=accept_encoding)
+            self.assertIn(b'Post Employee', body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import unittest
+
+from .sqlite_database import create_sessions
+
+import generate_data
+from databasesetup import Employee, Address, Title, Department, Salary, RewardEvent
+from helpers import rewards_helper
+
+
+class GenerateDataTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        self.engine = self.sessions.kw['bind']
+
+    def rows(self, sessions):
+        """
+        :return: every generated row of every table, in id order
+        """
+        session = sessions()
+        rows = dict((model.__tablename__, [tuple(row) for row in session.execute(
+                     model.__table__.select().order_by(model.__table__.c.id))])
+                    for model in (Employee, Address, Title, Department, Salary, RewardEvent))
+        session.close()
+        return rows
+
+    def test_the_same_seed_generates_the_same_rows(self):
+        written = generate_data.generate(self.engine, 20, seed=11, chunk_size=7)
+        other_sessions = create_sessions()
+        self.assertEqual(generate_data.generate(other_sessions.kw['bind'], 20, seed=11), written)
+
+        rows = self.rows(self.sessions)
+        self.assertEqual(rows, self.rows(other_sessions))
+        self.assertEqual(len(rows['employee']), 20)
+        self.assertEqual(sum(len(table_rows) for table_rows in rows.values()), written)
+
+        generate_data.generate(other_sessions.kw['bind'], 20, seed=12)
+        self.assertNotEqual(self.rows(other_sessions)['employee'][20:], rows['employee'])
+
+    def test_a_second_run_appends(self):
+        generate_data.generate(self.engine, 20, seed=11)
+        generate_data.generate(self.engine, 5, seed=11)
+
+        rows = self.rows(self.sessions)
+        self.assertEqual([row[0] for row in rows['employee']], list(range(1, 26)))
+        for table in ('address', 'title', 'department', 'salary'):
+            ids = [row[0] for row in rows[table]]
+            self.assertEqual(ids, list(range(1, len(ids) + 1)), msg="%s ids continue after the first run" % table)
+        session = self.sessions()
+        self.assertEqual(session.query(Employee.email).distinct().count(), 25, msg="Every email is unique")
+        session.close()
+
+    def test_a_generated_database_scores_sales(self):
+        generate_data.generate(self.engine, 5, seed=7)
+        session = self.sessions()
+        phones, orders = session.query(Employee.phones, Employee.orders).filter(Employee.id == 1).one()
+
+        rewards_helper.record_sale(session, 1, 1, [(10, 2)])
+        rewards_helper.store_totals(session, [1])
+        session.commit()
+        self.assertEqual(session.query(Employee.phones, Employee.orders).filter(Employee.id == 1).one(),
+                         (phones + 1, orders + 1))
+        session.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
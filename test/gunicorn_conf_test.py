@@ -0,0 +1,90 @@
+import json
+import logging
+import os
+import runpy
+import shutil
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import config
+from helpers import log_helper
+
+CONF_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr', 'gunicorn.conf.py')
+
+
+class GunicornConfTests(unittest.TestCase):
+
+    def test_settings_come_from_the_environment(self):
+        forking_server = os.environ.get('HR_FORKING_SERVER')
+        settings = runpy.run_path(CONF_FILE)
+        if forking_server is None:
+            del os.environ['HR_FORKING_SERVER']
+        self.assertEqual((settings['workers'], settings['threads']), (config.WORKERS, config.THREADS))
+        self.assertTrue(settings['preload_app'])
+        self.assertNotIn('config', settings, msg="gunicorn would take a module named config as its config setting")
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+    def test_a_forked_worker_writes_its_own_logs(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log_file = os.path.join(directory, 'worker.txt')
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                config.LOG_FILE = log_file
+                log_helper.restart_after_fork()
+                logging.getLogger('worker').warning("written by the worker")
+                log_helper.stop_logging()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        with open(log_file) as written:
+            self.assertIn("written by the worker", written.read())
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "needs fork")
+    def test_post_fork_gives_the_worker_new_pools_and_threads(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        result_file = os.path.join(directory, 'result.json')
+        forking_server = os.environ.get('HR_FORKING_SERVER')
+        settings = runpy.run_path(CONF_FILE)
+        if forking_server is None:
+            del os.environ['HR_FORKING_SERVER']
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                import databasesetup
+                config.LOG_FILE = os.path.join(directory, 'worker.txt')
+                config.SPEC_CACHE_DIR = os.path.join(directory, 'specs')
+                config.SEARCH_WARM_UP, config.WEBHOOKS_ENABLED = False, True
+                databasesetup.replica_engines.append(databasesetup._create_engine('sqlite://'))
+                engines = [databasesetup.engine] + databasesetup.replica_engines
+                pools = [database_engine.pool for database_engine in engines]
+
+                settings['post_fork'](SimpleNamespace(log=logging.getLogger('gunicorn')), SimpleNamespace(pid=pid))
+                with open(result_file, 'w') as result:
+                    json.dump({'replaced': [database_engine.pool is not pool
+                                            for database_engine, pool in zip(engines, pools)],
+                               'threads': [thread.name for thread in threading.enumerate()],
+                               'log_listener': log_helper._listener is not None}, result)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        with open(result_file) as result:
+            worker = json.load(result)
+        self.assertEqual(worker['replaced'], [True, True], msg="The primary and the replica pool are new")
+        self.assertIn('webhook-dispatcher', worker['threads'])
+        self.assertTrue(worker['log_listener'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import requests
+
+import config
+from helpers import http_helper
+from helpers.http_helper import CircuitBreaker, CircuitOpenError
+from helpers.metrics_helper import OUTBOUND_RETRIES
+
+
+class StubService(object):
+    """ A local service that answers the given statuses in turn, then 200, after an optional delay
+    """
+
+    def __init__(self, statuses=(), delay=0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.calls = 0
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def answer(self):
+                service.calls += 1
+                time.sleep(service.delay)
+                self.send_response(service.statuses.pop(0) if service.statuses else 200)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_GET = do_POST = answer
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%s/phones/1' % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class CircuitBreakerTests(unittest.TestCase):
+
+    def test_opens_after_failures_in_a_row_and_lets_one_trial_through(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failures=2, reset_seconds=10, clock=lambda: now[0])
+        breaker.record_failure()
+        breaker.record_success()
+        self.assertFalse(breaker.record_failure())
+        self.assertTrue(breaker.record_failure())
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow(), msg="Only one trial call is let through")
+        self.assertTrue(breaker.record_failure(), msg="A failed trial opens the breaker again")
+        self.assertEqual(breaker.retry_after(), 10)
+
+        now[0] = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertTrue(breaker.allow())
+        self.assertTrue(breaker.allow())
+
+
+class RequestTests(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = (config.HTTP_RETRY_BACKOFF_SECONDS, config.HTTP_BREAKER_FAILURES,
+                         config.HTTP_READ_TIMEOUT_SECONDS)
+        config.HTTP_RETRY_BACKOFF_SECONDS = 0.001
+        config.HTTP_BREAKER_FAILURES = 3
+        http_helper.reset()
+
+    def tearDown(self):
+        config.HTTP_RETRY_BACKOFF_SECONDS, config.HTTP_BREAKER_FAILURES, config.HTTP_READ_TIMEOUT_SECONDS = \
+            self.settings
+        http_helper.reset()
+
+    def test_idempotent_calls_are_retried(self):
+        service = StubService(statuses=[503, 502])
+        try:
+            self.assertEqual(http_helper.get(service.url, 'test_retry').status_code, 200)
+            self.assertEqual(service.calls, 3)
+            self.assertIn(('test_retry',), OUTBOUND_RETRIES._values)
+        finally:
+            service.close()
+
+    def test_other_calls_are_not_retried(self):
+        service = StubService(statuses=[503])
+        try:
+            self.assertEqual(http_helper.post(service.url, 'test_post').status_code, 503)
+            self.assertEqual(service.calls, 1)
+        finally:
+            service.close()
+
+    def test_other_calls_are_retried_when_the_connection_was_refused(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%s/orders' % listener.getsockname()[1]
+        listener.close()
+
+        with self.assertRaises(requests.ConnectionError):
+            http_helper.post(url, 'test_post_refused', retries=1)
+        self.assertEqual(OUTBOUND_RETRIES._values.get(('test_post_refused',)), 1)
+
+    def test_other_calls_are_not_retried_after_a_read_timeout(self):
+        config.HTTP_READ_TIMEOUT_SECONDS = 0.05
+        service = StubService(delay=0.2)
+        try:
+            with self.assertRaises(requests.ReadTimeout):
+                http_helper.post(service.url, 'test_post_timeout')
+            self.assertEqual(service.calls, 1, msg="The service may have acted on the call")
+        finally:
+            service.close()
+
+    def test_a_failing_host_is_refused(self):
+        config.HTTP_READ_TIMEOUT_SECONDS = 0.05
+        service = StubService(delay=0.2)
+        try:
+            with self.assertRaises(CircuitOpenError):
+                http_helper.get(service.url, 'test_down', retries=5)
+            self.assertEqual(service.calls, 3, msg="The breaker stops the retries once it opened")
+
+            start = time.time()
+            with self.assertRaises(CircuitOpenError):
+                http_helper.get(service.url, 'test_down')
+            self.assertLess(time.time() - start, 0.05)
+            self.assertEqual(service.calls, 3)
+        finally:
+            service.close()
+
+    def test_circuit_counts_failed_statuses(self):
+        url = 'http://127.0.0.1:9/phones/1'
+        for _ in range(3):
+            with http_helper.circuit(url, 'test_async') as call:
+                call.status = 500
+        with self.assertRaises(CircuitOpenError):
+            with http_helper.circuit(url, 'test_async'):
+                pass
+
+
+if __name__ == '__main__':
+    unittest.main()
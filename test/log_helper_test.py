@@ -0,0 +1,96 @@
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import config
+from helpers import log_helper
+from helpers.log_helper import JsonFormatter, DeferredQueueHandler
+
+
+def make_record(message, *args, **kwargs):
+    return logging.LogRecord('controllers.employees', logging.WARNING, __file__, 1, message, args,
+                             kwargs.get('exc_info'))
+
+
+class JsonFormatterTests(unittest.TestCase):
+
+    def test_a_record_is_one_json_line(self):
+        record = make_record("employee %s has %d rows", 'Post "Employee"\nSecond line', 2)
+        record.created = 0
+        line = JsonFormatter().format(record)
+
+        self.assertNotIn('\n', line)
+        self.assertEqual(json.loads(line), {'time': '1970-01-01T00:00:00Z', 'level': 'WARNING',
+                                            'logger': 'controllers.employees',
+                                            'message': 'employee Post "Employee"\nSecond line has 2 rows'})
+
+    def test_an_exception_is_included(self):
+        try:
+            raise ValueError('bad salary')
+        except ValueError:
+            record = make_record("failed", exc_info=sys.exc_info())
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertIn('ValueError: bad salary', entry['exception'])
+        self.assertEqual(entry['message'], 'failed')
+
+    def test_a_traceback_rendered_before_queueing_is_kept(self):
+        try:
+            raise ValueError('bad salary')
+        except ValueError:
+            record = DeferredQueueHandler(None).prepare(make_record("failed", exc_info=sys.exc_info()))
+        self.assertIsNone(record.exc_info)
+        self.assertIn('ValueError: bad salary', json.loads(JsonFormatter().format(record))['exception'])
+
+
+class LogLevelsTests(unittest.TestCase):
+
+    def levels(self, value):
+        with mock.patch.dict(os.environ, {'HR_LOG_LEVELS': value}):
+            return config._get_levels('HR_LOG_LEVELS')
+
+    def test_levels_are_parsed_per_module(self):
+        self.assertEqual(self.levels('controllers.employees=debug, sqlalchemy.engine = INFO'),
+                         {'controllers.employees': 'DEBUG', 'sqlalchemy.engine': 'INFO'})
+        self.assertEqual(self.levels('a=b=c'), {'a': 'B=C'}, msg="Only the first = separates the module")
+
+    def test_entries_without_a_level_are_skipped(self):
+        self.assertEqual(self.levels(''), {})
+        self.assertEqual(self.levels('controllers,,helpers.webhook_helper=ERROR,'),
+                         {'helpers.webhook_helper': 'ERROR'})
+        with mock.patch.dict(os.environ, clear=True):
+            self.assertEqual(config._get_levels('HR_LOG_LEVELS'), {})
+
+    def test_the_levels_are_set_on_the_module_loggers(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        log_file = os.path.join(directory, 'log.txt')
+        logger = logging.getLogger('controllers.log_levels_test')
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+
+        log_helper.stop_logging()
+        self.addCleanup(log_helper.configure_logging)
+        self.addCleanup(log_helper.stop_logging)
+        with mock.patch.multiple(config, LOG_FILE=log_file, LOG_LEVEL='WARNING',
+                                 LOG_LEVELS=self.levels('controllers.log_levels_test=DEBUG')):
+            log_helper.configure_logging()
+            logger.debug("written at debug")
+            logging.getLogger('controllers.other_test').info("below the root level")
+            log_helper.stop_logging()
+
+        with open(log_file) as written:
+            entries = [json.loads(line) for line in written]
+        self.assertEqual([(entry['logger'], entry['level'], entry['message']) for entry in entries],
+                         [('controllers.log_levels_test', 'DEBUG', 'written at debug')])
+        self.assertEqual(logger.level, logging.DEBUG)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from hr.helpers.metrics_helper import Counter, Histogram, SQL_STATEMENTS, instrument_engine
+
+
+class MetricsHelperTests(unittest.TestCase):
+
+    def test_counter(self):
+        counter = Counter('hr_test_total', 'A test counter', ('target',))
+        counter.inc('inventory')
+        counter.inc('inventory')
+        counter.inc('google')
+        lines = counter.render()
+        self.assertEqual(lines[1], '# TYPE hr_test_total counter')
+        self.assertIn('hr_test_total{target="inventory"} 2', lines)
+        self.assertIn('hr_test_total{target="google"} 1', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram('hr_test_seconds', 'A test histogram', ('operation',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, 'get')
+        histogram.observe(0.1, 'get')
+        histogram.observe(0.5, 'get')
+        histogram.observe(5, 'get')
+        lines = histogram.render()
+        self.assertIn('hr_test_seconds_bucket{operation="get",le="0.1"} 2', lines)
+        self.assertIn('hr_test_seconds_bucket{operation="get",le="1.0"} 3', lines)
+        self.assertIn('hr_test_seconds_bucket{operation="get",le="+Inf"} 4', lines)
+        self.assertIn('hr_test_seconds_count{operation="get"} 4', lines)
+        self.assertIn('hr_test_seconds_sum{operation="get"} 5.65', lines)
+
+    def test_label_values_are_escaped(self):
+        counter = Counter('hr_test_total', 'A test counter', ('target',))
+        counter.inc('say "hi"')
+        self.assertIn('hr_test_total{target="say \\"hi\\""} 1', counter.render())
+
+    def test_failed_statements_leave_nothing_on_the_connection(self):
+        engine = create_engine('sqlite://')
+        instrument_engine(engine)
+        with engine.connect() as connection:
+            for _ in range(3):
+                with self.assertRaises(OperationalError):
+                    connection.exec_driver_sql('SELECT * FROM missing_table')
+            before = SQL_STATEMENTS._values.get((), 0)
+            connection.exec_driver_sql('SELECT 1')
+            self.assertEqual(SQL_STATEMENTS._values[()], before + 1)
+            self.assertFalse([key for key in connection.info if key.startswith('hr_')])
@@ -0,0 +1,108 @@
+import unittest
+from datetime import date
+from unittest import mock
+
+from .sqlite_database import create_sessions
+
+from sqlalchemy import inspect, Boolean, Column, Date, Index, Integer, MetaData, String, Table
+
+import migrations
+from controllers import employees
+from databasesetup import Base, Employee, Address, Salary, Title, Department, TitleRef, DepartmentRef
+
+
+def old_history_table(metadata, name):
+    """ The title or department table as it was before the names moved into title_ref and department_ref
+    """
+    return Table(name, metadata,
+                 Column('id', Integer, primary_key=True),
+                 Column('is_active', Boolean),
+                 Column('start_date', Date),
+                 Column('name', String(25)),
+                 Column('employee_id', Integer),
+                 Index('ix_%s_employee_start_date' % name, 'employee_id', 'start_date', 'id'),
+                 Index('ix_%s_name_active' % name, 'name', 'is_active', 'employee_id'))
+
+
+class NormalizeNamesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        self.engine = self.sessions.kw['bind']
+        Base.metadata.drop_all(self.engine, tables=[Title.__table__, Department.__table__, TitleRef.__table__,
+                                                    DepartmentRef.__table__])
+        metadata = MetaData()
+        old_title, old_department = old_history_table(metadata, 'title'), old_history_table(metadata, 'department')
+        metadata.create_all(self.engine)
+
+        with self.engine.begin() as connection:
+            connection.execute(Employee.__table__.insert(), [
+                {'id': 1, 'first_name': 'Ann', 'last_name': 'Lee', 'email': 'ann@test.com', 'is_active': True,
+                 'birth_date': date(1980, 1, 1), 'start_date': date(2015, 1, 1)},
+                {'id': 2, 'first_name': 'Bob', 'last_name': 'Ray', 'email': 'bob@test.com', 'is_active': True,
+                 'birth_date': date(1985, 1, 1), 'start_date': date(2016, 1, 1)},
+                {'id': 3, 'first_name': 'Cat', 'last_name': 'Kim', 'email': 'cat@test.com', 'is_active': False,
+                 'birth_date': date(1990, 1, 1), 'start_date': date(2017, 1, 1)}])
+            connection.execute(Address.__table__.insert(), [
+                {'employee_id': employee_id, 'street_address': '1 test dr', 'city': 'rochester', 'state': 'ny',
+                 'zip': '14623', 'is_active': True, 'start_date': date(2015, 1, 1)} for employee_id in (1, 2, 3)])
+            connection.execute(Salary.__table__.insert(), [
+                {'employee_id': employee_id, 'amount': 1000 * employee_id, 'is_active': True,
+                 'start_date': date(2015, 1, 1)} for employee_id in (1, 2, 3)])
+            connection.execute(old_department.insert(), [
+                {'employee_id': 1, 'name': 'Sales', 'is_active': False, 'start_date': date(2015, 1, 1)},
+                {'employee_id': 1, 'name': 'Human Resources', 'is_active': True, 'start_date': date(2018, 1, 1)},
+                {'employee_id': 2, 'name': 'Sales', 'is_active': True, 'start_date': date(2016, 1, 1)}])
+            connection.execute(old_title.insert(), [
+                {'employee_id': 1, 'name': 'Manager', 'is_active': True, 'start_date': date(2015, 1, 1)},
+                {'employee_id': 2, 'name': 'Manager', 'is_active': True, 'start_date': date(2016, 1, 1)},
+                {'employee_id': 3, 'name': 'Clerk', 'is_active': False, 'start_date': date(2017, 1, 1)}])
+
+        patcher = mock.patch.object(migrations, 'engine', self.engine)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def roster(self, as_of=None):
+        return dict((employee['employee_id'], (employee['name'], employee['department'], employee['role']))
+                    for employee in employees.get(as_of=as_of, session=self.sessions())['employee_array'])
+
+    def test_names_move_into_the_reference_tables_once(self):
+        with mock.patch.object(migrations.logger, 'warning') as warning:
+            migrations.migrate()
+        warning.assert_any_call("Applied migration %s", 'normalize_department_and_title_names')
+
+        session = self.sessions()
+        self.assertEqual(sorted((ref.name, ref.code) for ref in session.query(DepartmentRef)),
+                         [('Human Resources', 'HumanResources'), ('Sales', 'Sales')])
+        self.assertEqual(sorted(ref.name for ref in session.query(TitleRef)), ['Clerk', 'Manager'])
+        departments = dict((ref.name, ref.id) for ref in session.query(DepartmentRef))
+        self.assertEqual([(row.employee_id, row.department_ref_id) for row in
+                          session.query(Department).order_by(Department.id)],
+                         [(1, departments['Sales']), (1, departments['Human Resources']), (2, departments['Sales'])])
+        self.assertEqual(session.query(Title).filter(Title.title_ref_id == None).count(), 0)
+        session.close()
+
+        live = inspect(self.engine)
+        for table in ('title', 'department'):
+            self.assertNotIn('name', [column['name'] for column in live.get_columns(table)])
+            self.assertNotIn('ix_%s_name_active' % table, [index['name'] for index in live.get_indexes(table)])
+            self.assertIn('ix_%s_ref_active' % table, [index['name'] for index in live.get_indexes(table)])
+
+        # What the API showed from the name columns
+        self.assertEqual(self.roster(), {1: ('Ann Lee', 'Human Resources', 'Manager'),
+                                         2: ('Bob Ray', 'Sales', 'Manager'),
+                                         3: ('Cat Kim', None, None)})
+        self.assertEqual(self.roster('2017-06-01')[1], ('Ann Lee', 'Sales', 'Manager'))
+
+        with mock.patch.object(migrations.logger, 'warning') as warning:
+            migrations.migrate()
+        self.assertFalse(warning.called, msg="The second run applied %s" % warning.call_args_list)
+        session = self.sessions()
+        self.assertEqual(session.query(DepartmentRef).count(), 2)
+        self.assertEqual(session.query(TitleRef).count(), 2)
+        session.close()
+        self.assertEqual(self.roster()[1], ('Ann Lee', 'Human Resources', 'Manager'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+
+from .sqlite_database import create_sessions, employee_payload
+
+from controllers import employees, offboard
+from databasesetup import Employee, EmployeeChange, Address, Title, Department, Salary
+from helpers.change_feed_helper import DELETE, DEACTIVATE
+
+
+class OffboardTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = create_sessions()
+        self.ids = []
+        for number, department in enumerate(('Sales', 'Sales', 'Sales', 'HR', 'HR')):
+            body, status = employees.post(employee_payload(fname='Employee%s' % number, department=department),
+                                          session=self.sessions())
+            self.assertEqual(status, 200, msg=body)
+            self.ids.append(body['employee_id'])
+        # A past salary, so each history table has an inactive row for the first employee
+        employees.patch({'employee_id': self.ids[0], 'salary': 100}, session=self.sessions())
+        self.session = self.sessions()
+
+    def tearDown(self):
+        self.session.close()
+
+    def history(self, employee_ids):
+        """
+        :return: sorted (table, employee_id, is_active) of every history row of the employees
+        """
+        return sorted((model.__tablename__, row.employee_id, row.is_active) for model in offboard.HISTORY_MODELS
+                      for row in self.session.query(model).filter(model.employee_id.in_(employee_ids)))
+
+    def changes(self, operation):
+        return [row.employee_id for row in self.session.query(EmployeeChange)
+                .filter(EmployeeChange.operation == operation).order_by(EmployeeChange.id)]
+
+    def versions(self):
+        return dict(self.session.query(Employee.id, Employee.version))
+
+    def test_delete_removes_the_history_rows_too(self):
+        kept_history = self.history(self.ids[3:])
+        report, status = offboard.post({'department': 'Sales', 'mode': 'delete'}, session=self.sessions())
+
+        self.assertEqual(status, 200)
+        self.assertEqual((report['matched'], report['changed'], report['chunks']), (3, 3, 1))
+        self.assertEqual(sorted(self.versions()), self.ids[3:])
+        self.assertEqual(self.history(self.ids[:3]), [])
+        self.assertEqual(self.history(self.ids[3:]), kept_history)
+        self.assertEqual(self.changes(DELETE), self.ids[:3])
+
+    def test_deactivate_only_changes_active_rows(self):
+        self.session.query(Employee).filter(Employee.id == self.ids[1]).update({'is_active': False})
+        self.session.commit()
+        before = self.versions()
+
+        report, status = offboard.post({'employee_ids': self.ids[:3]}, session=self.sessions())
+
+        self.assertEqual(status, 200)
+        self.assertEqual((report['mode'], report['matched'], report['changed']), ('deactivate', 3, 2),
+                         msg="Employees that were inactive already are matched but not changed")
+        versions = self.versions()
+        self.assertEqual([versions[e_id] - before[e_id] for e_id in self.ids], [1, 0, 1, 0, 0])
+        self.assertEqual(self.session.query(Employee).filter(Employee.is_active == True).count(), 2)
+        self.assertTrue(all(not is_active for _, _, is_active in self.history(self.ids[:3])))
+        self.assertTrue(all(is_active for _, _, is_active in self.history(self.ids[3:])))
+        self.assertEqual(self.session.query(Salary).filter(Salary.employee_id == self.ids[0]).count(), 2,
+                         msg="Deactivating keeps the history rows")
+        self.assertEqual(self.changes(DEACTIVATE), self.ids[:3])
+
+    def test_unknown_ids_are_reported(self):
+        report, status = offboard.post({'employee_ids': [self.ids[4], 9999, self.ids[3], 9998, self.ids[4]]},
+                                       session=self.sessions())
+
+        self.assertEqual(status, 200)
+        self.assertEqual(report['missing_ids'], [9998, 9999])
+        self.assertEqual((report['matched'], report['changed']), (2, 2))
+        self.assertEqual(self.changes(DEACTIVATE), sorted(self.ids[3:]))
+
+    def test_the_work_is_split_into_chunks(self):
+        report, status = offboard.post({'employee_ids': self.ids, 'mode': 'delete', 'chunk_size': 2},
+                                       session=self.sessions())
+
+        self.assertEqual(status, 200)
+        self.assertEqual((report['matched'], report['changed'], report['chunks']), (5, 5, 3))
+        self.assertEqual(self.session.query(Employee).count(), 0)
+        for model in (Address, Title, Department, Salary):
+            self.assertEqual(self.session.query(model).count(), 0)
+        self.assertEqual(self.changes(DELETE), self.ids, msg="One change row per employee, not per chunk")
+
+    def test_ids_or_a_department_have_to_be_given(self):
+        self.assertEqual(offboard.post({}, session=self.sessions())[1], 400)
+        self.assertEqual(offboard.post({'employee_ids': self.ids, 'department': 'HR'}, session=self.sessions())[1],
+                         400)
+
+
+if __name__ == '__main__':
+    unittest.main()
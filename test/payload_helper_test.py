@@ -0,0 +1,92 @@
+import datetime
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import connexion
+from connexion.resolver import Resolver
+
+from helpers import payload_helper
+from helpers.payload_helper import compile_schema, load_payload, CompiledBodyValidator, PayloadError, Payload
+
+POST = {'is_active': True, 'fname': 'Laura', 'lname': 'King', 'email': 'lxk3301@g.rit.edu',
+        'birth_date': '1992-02-12', 'address': '1 Lomb Memorial Drive, Rochester, New York 14623',
+        'department': 'Inventory', 'role': 'Developer', 'start_date': '2017-01-23'}
+
+
+class PayloadHelperTests(unittest.TestCase):
+
+    def test_dates_and_address_are_parsed_once(self):
+        payload = load_payload('EmployeePost', POST)
+        self.assertIsInstance(payload, Payload)
+        self.assertEqual(payload['birth_date'], datetime.date(1992, 2, 12))
+        self.assertEqual(payload['address']['zip'], '14623')
+        self.assertIs(payload.body, POST, msg="The body as sent is kept for the response")
+        self.assertIs(load_payload('EmployeePost', payload), payload)
+
+    def test_mismatches_are_errors(self):
+        for change, message in (({'fname': None}, "None is not of type 'string' - 'fname'"),
+                                ({'start_date': '2017-1-23'}, "'2017-1-23' is not a 'date' - 'start_date'"),
+                                ({'address': 'Rochester'}, "'Rochester' is not a 'address' - 'address'")):
+            body = dict(POST, **change)
+            self.assertEqual(load_payload('EmployeePost', body), ({'error_message': message}, 400))
+        body = dict(POST)
+        del body['email']
+        self.assertEqual(load_payload('EmployeePost', body)[0]['error_message'], "'email' is a required property")
+
+    def test_keywords(self):
+        check = compile_schema({'type': 'object', 'properties': {
+            'mode': {'type': 'string', 'enum': ['deactivate', 'delete']},
+            'ids': {'type': 'array', 'minItems': 1, 'items': {'type': 'integer', 'minimum': 1}},
+            'url': {'type': 'string', 'pattern': '^https?://', 'maxLength': 20}}})
+        self.assertEqual(check({'mode': 'delete', 'ids': [1, 2]}), {'mode': 'delete', 'ids': [1, 2]})
+        for body in ({'mode': 'archive'}, {'ids': []}, {'ids': [0]}, {'ids': [True]}, {'url': 'ftp://host'},
+                     {'url': 'https://a.long.host.name/'}):
+            self.assertRaises(PayloadError, check, body)
+
+    def test_unknown_keywords_are_left_to_jsonschema(self):
+        self.assertIsNone(compile_schema({'type': 'object', 'additionalProperties': False}))
+
+
+class CompiledBodyValidatorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.payloads = []
+
+        def post(body):
+            self.payloads.append(load_payload('Order', body))
+            return {'day': self.payloads[-1]['day'].isoformat()}
+
+        spec = {'swagger': '2.0', 'info': {'title': 'orders', 'version': '1'},
+                'paths': {'/orders': {'post': {
+                    'operationId': 'post',
+                    'parameters': [{'name': 'body', 'in': 'body', 'required': True,
+                                    'schema': {'$ref': '#/definitions/Order'}}],
+                    'responses': {'200': {'description': 'the order'}}}}},
+                'definitions': {'Order': {'type': 'object', 'required': ['day'],
+                                          'properties': {'day': {'type': 'string', 'format': 'date'}}}}}
+        app = connexion.App(__name__)
+        app.add_api(spec, resolver=Resolver(lambda operation_id: post),
+                    validator_map={'body': CompiledBodyValidator})
+        self.client = app.app.test_client()
+
+    def test_the_controller_gets_the_payload_the_validator_built(self):
+        with mock.patch.object(payload_helper, 'get_validator') as get_validator:
+            response = self.client.post('/orders', json={'day': '2018-05-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(get_validator.called, msg="The body is checked and parsed once per request")
+        self.assertEqual(self.payloads[0]['day'], datetime.date(2018, 5, 1))
+        self.assertEqual(self.payloads[0].body, {'day': '2018-05-01'})
+
+    def test_mismatches_are_answered_before_the_controller(self):
+        response = self.client.post('/orders', json={'day': '2018-5-1'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.payloads, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+from sqlalchemy import create_engine
+from hr.helpers.query_inspector_helper import normalize, inspect_queries, instrument_engine, QueryInspectionError
+
+
+class QueryInspectorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine('sqlite://')
+        instrument_engine(self.engine)
+        self.connection = self.engine.connect()
+        self.connection.execute('CREATE TABLE employee (id INTEGER PRIMARY KEY, name VARCHAR(25))')
+
+    def tearDown(self):
+        self.connection.close()
+
+    def test_normalize(self):
+        self.assertEqual(normalize("SELECT * FROM employee\n WHERE id = 5 AND name = 'O''Brien'"),
+                         'SELECT * FROM employee WHERE id = ? AND name = ?')
+        self.assertEqual(normalize('SELECT * FROM title_1 WHERE employee_id IN (?, ?, ?)'),
+                         normalize('SELECT * FROM title_1 WHERE employee_id IN (%s)'))
+
+    def test_repeated_shape_fails_in_strict_mode(self):
+        with self.assertRaises(QueryInspectionError) as raised:
+            with inspect_queries('n+1', repeat_threshold=3):
+                for employee_id in range(5):
+                    self.connection.execute('SELECT name FROM employee WHERE id = ?', employee_id)
+        self.assertIn('repeated 5 times', str(raised.exception))
+        self.assertIn('query_inspector_helper_test.py', str(raised.exception))
+
+    def test_set_based_query_passes(self):
+        with inspect_queries('set based', repeat_threshold=3) as inspection:
+            self.connection.execute('SELECT name FROM employee WHERE id IN (?, ?, ?, ?, ?)', *range(5))
+        self.assertEqual(inspection.findings(), [])
+
+    def test_slow_statement_is_reported(self):
+        with inspect_queries('slow', strict=False, slow_seconds=0.000001) as inspection:
+            self.connection.execute('SELECT name FROM employee')
+        self.assertEqual(len(inspection.findings()), 1)
+        self.assertIn('slow statement', inspection.findings()[0])
+
+    def test_zero_thresholds_flag_every_statement(self):
+        with inspect_queries('zero', strict=False, repeat_threshold=0, slow_seconds=0) as inspection:
+            self.connection.execute('SELECT name FROM employee')
+        findings = inspection.findings()
+        self.assertEqual(len(findings), 2)
+        self.assertIn('repeated 1 times', findings[0])
+        self.assertIn('slow statement', findings[1])
+
+    def test_failed_statements_are_not_recorded(self):
+        with inspect_queries('failed', strict=False) as inspection:
+            with self.assertRaises(Exception):
+                self.connection.execute('SELECT * FROM missing_table')
+            self.connection.execute('SELECT name FROM employee')
+        self.assertEqual([seen['count'] for seen in inspection.shapes.values()], [1])
+        self.assertFalse([key for key in self.connection.info if key.startswith('hr_')])
+
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from flask import Flask
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+import config
+from databasesetup import Base, EmployeeChange, EmployeeChangeCounter
+from helpers import replica_helper
+from helpers.change_feed_helper import record_changes, UPDATE
+from helpers.replica_helper import TOKEN_HEADER, TOKEN_COOKIE
+
+
+class ReplicaRoutingTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.primary = create_engine('sqlite:///' + os.path.join(self.directory, 'primary.db'))
+        self.replica = create_engine('sqlite:///' + os.path.join(self.directory, 'replica.db'))
+        for engine in (self.primary, self.replica):
+            Base.metadata.create_all(engine, tables=[EmployeeChange.__table__, EmployeeChangeCounter.__table__])
+
+        self.replica_urls = config.DATABASE_REPLICA_URLS
+        config.DATABASE_REPLICA_URLS = [str(self.replica.url)]
+        app = Flask(__name__)
+        replica_helper.init_app(app)
+        self.replicas = [self.replica]
+
+        @app.route('/write', methods=['POST'])
+        def write():
+            session = sessionmaker(bind=self.primary)()
+            record_changes(session, UPDATE, [1, 2])
+            session.commit()
+            session.close()
+            return 'written'
+
+        @app.route('/read')
+        def read():
+            engine = replica_helper.choose_engine(self.primary, self.replicas)
+            return 'replica' if engine is self.replica else 'primary'
+
+        self.client = app.test_client()
+
+    def tearDown(self):
+        config.DATABASE_REPLICA_URLS = self.replica_urls
+        self.primary.dispose()
+        self.replica.dispose()
+        shutil.rmtree(self.directory)
+
+    def replicate(self):
+        """ The simulated replication lag ends: the replica gets every change row the primary has
+        """
+        table = EmployeeChange.__table__
+        with self.primary.connect() as primary, self.replica.begin() as replica:
+            known = set(row.id for row in replica.execute(select([table.c.id])))
+            rows = [dict(row._mapping) for row in primary.execute(select([table])) if row.id not in known]
+            if rows:
+                replica.execute(table.insert(), rows)
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.client.get('/read').get_data(as_text=True), 'replica')
+
+    def test_a_client_reads_its_writes_until_the_replica_caught_up(self):
+        response = self.client.post('/write')
+        self.assertEqual(response.headers[TOKEN_HEADER], '2', msg="The token is the last change row written")
+        self.assertIsNotNone(self.client.get_cookie(TOKEN_COOKIE))
+
+        self.assertEqual(self.client.get('/read').get_data(as_text=True), 'primary')
+        other_client = self.client.application.test_client()
+        self.assertEqual(other_client.get('/read').get_data(as_text=True), 'replica')
+
+        self.replicate()
+        self.assertEqual(self.client.get('/read').get_data(as_text=True), 'replica')
+        self.assertIsNone(self.client.get_cookie(TOKEN_COOKIE), msg="A caught up token is forgotten")
+
+    def test_the_token_is_the_last_change_of_the_request(self):
+        session = sessionmaker(bind=self.primary)()
+        record_changes(session, UPDATE, [3])
+        session.commit()
+        session.close()
+        self.assertEqual(self.client.post('/write').headers[TOKEN_HEADER], '3')
+        self.assertEqual(self.client.post('/write').headers[TOKEN_HEADER], '5')
+
+    def test_the_token_can_be_sent_as_a_header(self):
+        self.client.post('/write')
+        self.client.delete_cookie(TOKEN_COOKIE)
+        other_client = self.client.application.test_client()
+        self.assertEqual(other_client.get('/read', headers={TOKEN_HEADER: '2'}).get_data(as_text=True), 'primary')
+        self.assertEqual(other_client.get('/read', headers={TOKEN_HEADER: '1'}).get_data(as_text=True), 'primary')
+        self.replicate()
+        self.assertEqual(other_client.get('/read', headers={TOKEN_HEADER: '2'}).get_data(as_text=True), 'replica')
+
+    def test_an_unreachable_replica_is_skipped(self):
+        self.replicas = [create_engine('sqlite:///' + os.path.join(self.directory, 'missing', 'replica.db'))]
+        self.client.post('/write')
+        self.assertEqual(self.client.get('/read').get_data(as_text=True), 'primary')
+
+    def test_reads_outside_requests_go_to_the_primary(self):
+        self.assertIs(replica_helper.choose_engine(self.primary, [self.replica]), self.primary)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from databasesetup import Base, Employee, RewardRule, RewardEvent, DEFAULT_REWARD_RULES
+from helpers import rewards_helper
+
+
+class RewardsHelperTests(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine('sqlite://', poolclass=StaticPool)
+        Base.metadata.create_all(engine, tables=[Employee.__table__, RewardRule.__table__, RewardEvent.__table__])
+        self.session = sessionmaker(bind=engine)()
+        self.session.execute(RewardRule.__table__.insert(), DEFAULT_REWARD_RULES)
+        self.session.execute(Employee.__table__.insert(), [
+            {'id': 1, 'first_name': 'A', 'last_name': 'A', 'phones': 0, 'orders': 0},
+            {'id': 2, 'first_name': 'B', 'last_name': 'B', 'phones': 4, 'orders': 9}])
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+
+    def sell(self, employee_id, model_ids, day):
+        rewards_helper.record_sale(self.session, employee_id, 1, list(enumerate(model_ids)),
+                                   datetime.combine(day, datetime.min.time()))
+
+    def test_default_rules_count_like_the_old_post(self):
+        self.sell(1, [1, 2, 3, 3], date(2018, 3, 1))
+        self.sell(1, [4], date(2018, 3, 2))
+        totals, changed = rewards_helper.store_totals(self.session)
+
+        self.assertEqual(totals[1], {'phones': 3, 'orders': 2})
+        # Employee 2 has no events, so their totals start over
+        self.assertEqual(totals[2], {'phones': 0, 'orders': 0})
+        self.assertEqual(sorted(changed), [1, 2])
+        self.assertEqual(self.session.query(Employee.phones, Employee.orders).filter(Employee.id == 1).one(), (3, 2))
+        self.assertEqual(rewards_helper.store_totals(self.session)[1], [])
+
+    def test_rules_count_inside_their_dates_and_periods_are_recomputed(self):
+        self.session.query(RewardRule).filter(RewardRule.event_type == 'phone') \
+            .update({RewardRule.ends_on: date(2018, 4, 1)})
+        self.session.add(RewardRule(name='Spring promotion', event_type='phone', model_ids='', counter='phones',
+                                    points=2, starts_on=date(2018, 4, 1), is_active=True))
+        self.sell(1, [2], date(2018, 3, 31))
+        self.sell(1, [2, 7], date(2018, 4, 1))
+
+        self.assertEqual(rewards_helper.compute_totals(self.session)[1], {'phones': 5, 'orders': 2})
+        self.assertEqual(rewards_helper.compute_totals(self.session, start=date(2018, 4, 1))[1],
+                         {'phones': 4, 'orders': 1})
+        self.assertEqual(rewards_helper.compute_totals(self.session, end=date(2018, 4, 1))[1],
+                         {'phones': 1, 'orders': 1})
+
+    def test_adjustments_count_without_rules(self):
+        self.session.execute(RewardEvent.__table__.insert(), [
+            {'employee_id': 2, 'event_type': 'adjustment', 'counter': 'phones', 'quantity': 4,
+             'occurred_at': datetime(2017, 1, 1)},
+            {'employee_id': 2, 'event_type': 'adjustment', 'counter': 'orders', 'quantity': 9,
+             'occurred_at': datetime(2017, 1, 1)}])
+        self.session.query(RewardRule).delete()
+
+        totals, changed = rewards_helper.store_totals(self.session, [2])
+        self.assertEqual((totals, changed), ({2: {'phones': 4, 'orders': 9}}, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import threading
+import unittest
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from helpers import search_helper
+from helpers.search_helper import SearchIndex
+
+
+class SearchIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add(1, 'Mary Smith', 'Mary.Smith@krutz.site', 'Sales', 'Developer')
+        self.index.add(2, 'Smitty Jones', 'Smitty.Jones@krutz.site', 'Accounting', 'Analyst')
+        self.index.add(3, 'John Blacksmith', 'John.Blacksmith@krutz.site', 'Sales', 'Manager')
+        self.index.add(4, 'Ann Lee', 'smith.fan@krutz.site', 'Inventory', 'Technician')
+
+    def test_whole_word_ranks_before_prefix_and_part(self):
+        self.assertEqual(self.index.search('smith', 0, 10), (3, [1, 4, 3]))
+        self.assertEqual(self.index.search('smit', 0, 10), (4, [1, 2, 4, 3]))
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.index.search('smi sales', 0, 10), (2, [1, 3]))
+        self.assertEqual(self.index.search('MARY accounting', 0, 10), (0, []))
+
+    def test_pages(self):
+        self.assertEqual(self.index.search('krutz', 1, 2), (4, [2, 3]))
+        self.assertEqual(self.index.search('krutz', 4, 2), (4, []))
+
+    def test_changed_and_removed_employees(self):
+        self.index.add(1, 'Mary Jones', 'Mary.Jones@krutz.site', 'Sales', 'Developer')
+        self.assertEqual(self.index.search('jones', 0, 10), (2, [1, 2]))
+        self.index.remove(2)
+        self.assertEqual(self.index.search('smitty', 0, 10), (0, []))
+        self.assertEqual(self.index.search('mitt', 0, 10), (0, []))
+
+
+class SearchRefreshTests(unittest.TestCase):
+
+    def setUp(self):
+        self.build = search_helper.build
+        old_index = SearchIndex()
+        old_index.add(1, 'Mary Smith', 'Mary.Smith@krutz.site', 'Sales', 'Developer')
+        search_helper._index = old_index
+
+    def tearDown(self):
+        search_helper.build = self.build
+        search_helper._index = None
+        search_helper._take_stale()
+
+    def test_searches_go_on_while_the_index_is_rebuilt(self):
+        reading, release = threading.Event(), threading.Event()
+        new_index = SearchIndex()
+        new_index.add(1, 'Mary Jones', 'Mary.Jones@krutz.site', 'Sales', 'Developer')
+
+        def slow_build(session):
+            reading.set()
+            release.wait(5)
+            return new_index
+        search_helper.build = slow_build
+
+        search_helper.mark_stale({None})
+        rebuilding = threading.Thread(target=search_helper.search, args=(None, 'mary'))
+        rebuilding.start()
+        self.assertTrue(reading.wait(5))
+
+        # The rebuilding thread is reading the database, the old index still answers
+        self.assertEqual(search_helper.search(None, 'smith'), (1, [1]))
+        release.set()
+        rebuilding.join(5)
+        self.assertEqual(search_helper.search(None, 'jones'), (1, [1]))
+
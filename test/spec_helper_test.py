@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import connexion
+from connexion.exceptions import InvalidSpecification
+
+import config
+from helpers import spec_helper
+
+SPEC = b"""swagger: '2.0'
+info:
+  version: "1.0"
+  title: "{{ title }}"
+paths:
+  /directory:
+    get:
+      operationId: os.getcwd
+      responses:
+        200:
+          description: The working directory
+"""
+
+
+class SpecHelperTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.spec_file = os.path.join(self.directory, 'api.yaml')
+        with open(self.spec_file, 'wb') as spec_file:
+            spec_file.write(SPEC)
+        cache_directory = config.SPEC_CACHE_DIR
+        config.SPEC_CACHE_DIR = os.path.join(self.directory, 'cache')
+        self.addCleanup(setattr, config, 'SPEC_CACHE_DIR', cache_directory)
+
+    def add_api(self):
+        app = connexion.App(__name__, specification_dir=self.directory)
+        spec_helper.add_api(app, 'api.yaml', arguments={'title': 'Test API'})
+        return app
+
+    def test_second_start_reads_the_cache(self):
+        self.add_api()
+        with mock.patch.object(spec_helper, 'parse', side_effect=AssertionError("parsed again")):
+            app = self.add_api()
+        self.assertEqual(app.app.test_client().get('/directory').status_code, 200)
+
+    def test_changed_file_is_parsed_again(self):
+        self.add_api()
+        with open(self.spec_file, 'ab') as spec_file:
+            spec_file.write(b"  /process:\n    get:\n      operationId: os.getpid\n      responses:\n"
+                            b"        200:\n          description: The process id\n")
+        app = self.add_api()
+        self.assertEqual(app.app.test_client().get('/process').status_code, 200)
+        self.assertEqual(len(os.listdir(config.SPEC_CACHE_DIR)), 2)
+
+    def test_invalid_spec_is_not_cached(self):
+        with open(self.spec_file, 'wb') as spec_file:
+            spec_file.write(SPEC.replace(b"responses:", b"answers:"))
+        self.assertRaises(InvalidSpecification, self.add_api)
+        self.assertFalse(os.path.isdir(config.SPEC_CACHE_DIR))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+""" An in-memory SQLite database with every table, for the tests that call the controllers with a session
+"""
+import os
+import tempfile
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from databasesetup import Base
+
+
+def create_sessions():
+    """
+    :return: sessionmaker of a new empty database, every session it makes shares the one connection
+    """
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    # Like databasesetup, so ondelete='CASCADE' is honoured
+    event.listen(engine, 'connect', lambda connection, record: connection.execute('PRAGMA foreign_keys=ON'))
+    Base.metadata.create_all(engine)
+    return sessionmaker(bind=engine)
+
+
+def employee_payload(**fields):
+    """
+    :param fields: fields that differ from the default employee, e.g. fname='Other'
+    :return: the body of a POST /employee
+    """
+    employee = {
+        'address': '1 test dr, rochester, ny 14623',
+        'birth_date': '1990-04-19',
+        'department': 'HR',
+        'fname': 'Post',
+        'is_active': True,
+        'lname': 'Employee',
+        'role': 'TEST',
+        'start_date': '2017-04-19',
+        'email': 'test@test.com'
+    }
+    employee.update(fields)
+    return employee
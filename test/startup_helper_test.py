@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+import config
+from helpers import startup_helper
+
+HR_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'hr')
+
+
+class StartupHelperTests(unittest.TestCase):
+
+    def test_slow_start_is_a_warning(self):
+        budget = config.STARTUP_BUDGET_SECONDS
+        config.STARTUP_BUDGET_SECONDS = -1
+        self.addCleanup(setattr, config, 'STARTUP_BUDGET_SECONDS', budget)
+        startup_helper.mark('test phase')
+        with self.assertLogs('helpers.startup_helper', 'WARNING') as logs:
+            startup_helper.report()
+        self.assertIn('test phase', logs.output[0])
+
+    def test_importing_the_models_does_not_connect(self):
+        directory = tempfile.mkdtemp()
+        environment = dict(os.environ, HR_LOG_FILE=os.path.join(directory, 'log.txt'),
+                           HR_DATABASE_URL='sqlite:///' + os.path.join(directory, 'missing', 'hr.db'))
+        process = subprocess.run([sys.executable, '-c', 'import databasesetup'], cwd=HR_DIRECTORY, env=environment,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+        self.assertEqual(process.returncode, 0, msg=process.stdout)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import os
+import shutil
+import tempfile
+import unittest
+from flask import Flask
+from hr.helpers import static_asset_helper
+
+
+class StaticAssetHelperTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        static_directory = os.path.join(self.directory, 'static', 'css')
+        page_directory = os.path.join(self.directory, 'html')
+        os.makedirs(static_directory)
+        os.makedirs(page_directory)
+        with open(os.path.join(static_directory, 'site.css'), 'w') as css:
+            css.write('body { margin: 0; }\n' * 200)
+        with open(os.path.join(page_directory, 'index.html'), 'w') as page:
+            page.write('<link href="/static/css/site.css" rel="stylesheet"><script src="/static/js/missing.js">')
+        static_asset_helper.load(os.path.join(self.directory, 'static'), page_directory)
+
+        app = Flask(__name__)
+        app.add_url_rule('/', 'index', lambda: static_asset_helper.send_page('index.html'))
+        app.add_url_rule(static_asset_helper.ASSET_PREFIX + '<path:filename>', 'assets', static_asset_helper.send_asset)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_page_refers_to_fingerprinted_assets(self):
+        url = static_asset_helper.asset_url('css/site.css')
+        self.assertRegex(url, r'^/assets/css/site\.[0-9a-f]{12}\.css$')
+        page = self.client.get('/')
+        self.assertIn(url, page.get_data(as_text=True))
+        self.assertIn('/static/js/missing.js', page.get_data(as_text=True))
+        self.assertEqual(page.headers['Cache-Control'], 'no-cache')
+
+    def test_fingerprinted_asset_is_cached_and_compressed(self):
+        url = static_asset_helper.asset_url('css/site.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('max-age=31536000', response.headers['Cache-Control'])
+
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertEqual(plain.get_data(as_text=True), 'body { margin: 0; }\n' * 200)
+
+    def test_matching_etag_is_not_modified(self):
+        url = static_asset_helper.asset_url('css/site.css')
+        etag = self.client.get(url).headers['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        self.assertEqual(self.client.get('/assets/css/unknown.css').status_code, 404)
+
+    def test_gzip_variant_has_its_own_etag(self):
+        url = static_asset_helper.asset_url('css/site.css')
+        plain = self.client.get(url)
+        gzipped = self.client.get(url, headers={'Accept-Encoding': 'gzip'})
+        self.assertNotEqual(plain.headers['ETag'], gzipped.headers['ETag'])
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': plain.headers['ETag'],
+                                                       'Accept-Encoding': 'gzip'}).status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': gzipped.headers['ETag'],
+                                                       'Accept-Encoding': 'gzip'}).status_code, 304)
+
+    def test_gzip_refused_with_zero_quality(self):
+        url = static_asset_helper.asset_url('css/site.css')
+        response = self.client.get(url, headers={'Accept-Encoding': 'gzip;q=0, identity'})
+        self.assertNotIn('Content-Encoding', response.headers)
@@ -0,0 +1,102 @@
+import unittest
+from unittest import mock
+
+from .sqlite_database import create_sessions, employee_payload
+
+from controllers import employees, stats
+from databasesetup import Department
+
+
+class StatisticsTests(unittest.TestCase):
+
+    def setUp(self):
+        stats.stats_cache.clear()
+        self.sessions = create_sessions()
+
+    def tearDown(self):
+        stats.stats_cache.clear()
+
+    def add(self, department, salary, is_active=True):
+        """ Posts an employee into the department and gives them the salary
+        :return: the new employee's id
+        """
+        name = 'Employee%s' % salary
+        body, status = employees.post(employee_payload(fname=department, lname=name, department=department,
+                                                       is_active=is_active), session=self.sessions())
+        self.assertEqual(status, 200, msg=body)
+        self.patch(body['employee_id'], salary)
+        return body['employee_id']
+
+    def patch(self, employee_id, salary):
+        response = employees.patch({'employee_id': employee_id, 'salary': salary}, session=self.sessions())
+        self.assertEqual(response[1], 200, msg=response[0])
+
+    def departments(self, percentiles=None):
+        return dict((entry['department'], entry) for entry in
+                    stats.departments(percentiles, session=self.sessions())['department_array'])
+
+    def test_median_of_an_odd_and_an_even_group(self):
+        for salary in (100, 200, 400):
+            self.add('Odd', salary)
+        self.add('Odd', 800, is_active=False)
+        for salary in (100, 200, 300, 1000):
+            self.add('Even', salary)
+
+        groups = self.departments()
+        odd, even = groups['Odd'], groups['Even']
+        self.assertEqual((odd['headcount'], odd['active'], odd['inactive']), (4, 3, 1))
+        self.assertEqual(odd['salary_sum'], 700, msg="Only active employees count towards the salaries")
+        self.assertEqual(odd['salary_median'], 200)
+        self.assertEqual(even['headcount'], 4)
+        self.assertEqual(even['salary_median'], 250, msg="The mean of the two middle salaries")
+        self.assertEqual(even['salary_mean'], 400)
+
+    def test_percentiles_are_nearest_ranks(self):
+        for salary in range(100, 1100, 100):
+            self.add('Ten', salary)
+        for salary in (100, 200, 400):
+            self.add('Three', salary)
+
+        groups = self.departments([10, 50, 90])
+        self.assertEqual(groups['Ten']['salary_percentiles'], {'p10': 100, 'p50': 500, 'p90': 900})
+        self.assertEqual(groups['Ten']['salary_median'], 550)
+        self.assertEqual(groups['Three']['salary_percentiles'], {'p10': 100, 'p50': 200, 'p90': 400})
+
+    def test_employees_without_a_current_department_are_grouped_last(self):
+        self.add('Staffed', 100)
+        self.add('Staffed', 300)
+        left = self.add('Staffed', 500)
+        session = self.sessions()
+        session.query(Department).filter(Department.employee_id == left).update({'is_active': False})
+        session.commit()
+        session.close()
+
+        groups = stats.departments(session=self.sessions())['department_array']
+        self.assertEqual([group['department'] for group in groups], ['Staffed', None])
+        self.assertEqual(groups[0]['salary_median'], 200)
+        self.assertEqual((groups[1]['headcount'], groups[1]['salary_sum'], groups[1]['salary_median']),
+                         (1, 500, 500))
+        self.assertEqual(groups[1]['salary_percentiles']['p90'], 500)
+
+    def test_a_salary_patch_clears_the_cached_statistics(self):
+        first = self.add('Cached', 100)
+        self.add('Cached', 300)
+        self.assertEqual(self.departments()['Cached']['salary_median'], 200)
+
+        self.patch(first, 500)
+        cached = self.departments()['Cached']
+        self.assertEqual(cached['salary_median'], 400)
+        self.assertEqual(cached['salary_sum'], 800)
+
+    def test_a_cached_result_still_closes_the_session(self):
+        self.add('Cached', 100)
+        self.departments()
+
+        session = self.sessions()
+        with mock.patch.object(session, 'close') as close:
+            self.assertEqual(stats.departments(session=session)['department_array'][0]['salary_median'], 100)
+        self.assertTrue(close.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
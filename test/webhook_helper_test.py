@@ -0,0 +1,136 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault('HR_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('HR_LOG_FILE', os.path.join(tempfile.gettempdir(), 'hr-test-log.txt'))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from databasesetup import Base, EmployeeChange, EmployeeChangeCounter, WebhookSubscription
+from helpers.change_feed_helper import record_changes, UPDATE
+from helpers.webhook_helper import Dispatcher, sign
+
+
+class StubReceiver(object):
+    """ A local subscriber that records the batches it is sent, after an optional delay or a number of failures
+    """
+
+    def __init__(self, delay=0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.batches = []
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                time.sleep(receiver.delay)
+                if receiver.failures:
+                    receiver.failures -= 1
+                    self.send_response(503)
+                else:
+                    receiver.batches.append((json.loads(body.decode('utf-8')), self.headers.get('X-HR-Signature'),
+                                             body))
+                    self.send_response(204)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%s/hook' % self.server.server_port
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class DispatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        engine = create_engine('sqlite:///' + os.path.join(self.directory, 'webhooks.db'))
+        Base.metadata.create_all(engine, tables=[EmployeeChange.__table__, EmployeeChangeCounter.__table__,
+                                                 WebhookSubscription.__table__])
+        self.session_factory = sessionmaker(bind=engine)
+        self.receivers = []
+        self.dispatcher = Dispatcher(self.session_factory, workers=2, batch_size=2, timeout_seconds=5, retries=0)
+
+    def tearDown(self):
+        self.dispatcher.stop()
+        for receiver in self.receivers:
+            receiver.close()
+        shutil.rmtree(self.directory)
+
+    def subscribe(self, receiver, secret=None):
+        self.receivers.append(receiver)
+        session = self.session_factory()
+        session.add(WebhookSubscription(url=receiver.url, secret=secret, is_active=True, last_change_id=0,
+                                        created_at=datetime.utcnow()))
+        session.commit()
+        session.close()
+
+    def change(self, *employee_ids):
+        session = self.session_factory()
+        record_changes(session, UPDATE, employee_ids)
+        session.commit()
+        session.close()
+
+    def cursors(self):
+        session = self.session_factory()
+        cursors = [row[0] for row in session.query(WebhookSubscription.last_change_id).order_by(WebhookSubscription.id)]
+        session.close()
+        return cursors
+
+    def test_changes_are_sent_in_batches(self):
+        receiver = StubReceiver()
+        self.subscribe(receiver, secret='s3cret')
+        self.change(1, 2, 3)
+
+        for future in self.dispatcher.dispatch():
+            self.assertEqual(future.result(), 3)
+        self.assertEqual([[c['employee_id'] for c in batch['change_array']] for batch, _, _ in receiver.batches],
+                         [[1, 2], [3]])
+        self.assertTrue(all(signature == sign('s3cret', body) for _, signature, body in receiver.batches))
+        self.assertEqual(self.cursors(), [3])
+        self.assertEqual(self.dispatcher.dispatch(), [], msg="A subscriber that has every change is left alone")
+
+    def test_a_slow_subscriber_does_not_hold_up_the_others(self):
+        slow, fast = StubReceiver(delay=1), StubReceiver()
+        self.subscribe(slow)
+        self.subscribe(fast)
+        self.change(1)
+
+        slow_future, fast_future = self.dispatcher.dispatch()
+        fast_future.result(timeout=0.5)
+        self.assertFalse(slow_future.done())
+        self.assertEqual(len(fast.batches), 1)
+        self.assertEqual(slow_future.result(), 1)
+
+    def test_a_failing_subscriber_backs_off_and_is_sent_the_changes_again(self):
+        receiver = StubReceiver(failures=1)
+        self.subscribe(receiver)
+        self.change(1)
+
+        self.assertEqual([future.result() for future in self.dispatcher.dispatch()], [0])
+        self.assertEqual(self.cursors(), [0])
+        self.assertEqual(self.dispatcher.dispatch(), [], msg="The subscriber should be backing off")
+
+        time.sleep(1.1)
+        self.assertEqual([future.result() for future in self.dispatcher.dispatch()], [1])
+        self.assertEqual(self.cursors(), [1])
+
+
+if __name__ == '__main__':
+    unittest.main()